@@ -6,6 +6,7 @@ from typing import List, Optional
 
 from telegram import Bot, ParseMode
 
+from app_logging.metrics import metrics
 from bot.constants import ADMIN_ID
 
 
@@ -73,6 +74,9 @@ class BotCachingHandler(logging.StreamHandler):
         self.telegram_bot = bot
         self.log_buffer_size = log_buffer_size
 
+        metrics.register_gauge('bot_log_buffer', lambda: {'used': len(self.log_buffer),
+                                                          'capacity': self.log_buffer_size})
+
     def emit(self, record: logging.LogRecord) -> None:
         """This methods is called, when the user called the ``logger.info()`` or higher level method."""
         try:
@@ -0,0 +1,117 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""This module contains the :class:`MetricsRegistry` class and the shared ``metrics`` instance."""
+
+import os
+import resource
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class MetricsRegistry:
+    """
+    The class stores runtime counters and gauges, published by the different parts of the bot.
+
+    Counters are grouped by the name and could be split by the key (e.g. ``chat_id``),
+    so the contention or the hit rate could be seen per chat.
+    Gauges are the callbacks, that are evaluated only when the snapshot is requested,
+    so publishing them costs nothing on the hot path.
+
+    Examples:
+        >>> from app_logging.metrics import metrics
+        >>>
+        >>> metrics.increment('queue_version_conflicts', key=-100123)
+        >>> metrics.register_gauge('uptime_seconds', lambda: 42)
+        >>> metrics.snapshot()
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Counter] = {}
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+
+    def increment(self, name: str, key: Optional[Hashable] = None, value: int = 1) -> None:
+        """
+        Increments the counter with the given ``name``.
+
+        Args:
+            name: the name of the counter.
+            key: optional key to split the counter by (e.g. ``chat_id``).
+                The total value is always stored under the ``None`` key.
+            value: the value to add to the counter.
+        """
+        with self._lock:
+            counter = self._counters.get(name)
+            if counter is None:
+                counter = self._counters[name] = Counter()
+            counter[None] += value
+            if key is not None:
+                counter[key] += value
+
+    def get(self, name: str, key: Optional[Hashable] = None) -> int:
+        """Returns the value of the counter, or the total value, if the ``key`` is not specified."""
+        counter = self._counters.get(name)
+        return counter[key] if counter is not None else 0
+
+    def register_gauge(self, name: str, callback: Callable[[], Any]) -> None:
+        """
+        Registers the callback, which value will be added to the snapshot.
+
+        Note:
+            The callback with the same name replaces the previously registered one.
+        """
+        with self._lock:
+            self._gauges[name] = callback
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns:
+            the :obj:`dict` with the total values of all counters and the current values of all gauges.
+            Counters split by the keys are stored as ``{'total': ..., 'by_key': {...}}``.
+        """
+        with self._lock:
+            counters = {name: Counter(counter) for name, counter in self._counters.items()}
+            gauges = dict(self._gauges)
+
+        result: Dict[str, Any] = {}
+        for name, counter in counters.items():
+            total = counter.pop(None, 0)
+            result[name] = {'total': total, 'by_key': dict(counter)} if counter else total
+        for name, callback in gauges.items():
+            try:
+                result[name] = callback()
+            except Exception as e:
+                result[name] = f'<error: {e}>'
+        return result
+
+
+metrics = MetricsRegistry()
+"""The registry shared by the whole app."""
+
+_started_at = time.monotonic()
+
+
+def _process_stats() -> Dict[str, Any]:
+    """The memory, the threads and the uptime of the current process."""
+    try:
+        # The second field is the resident set size in pages (Linux only)
+        with open('/proc/self/statm') as statm:
+            rss = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # The peak value in KiB on Linux, in bytes on macOS, is better than nothing
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {
+        'pid': os.getpid(),
+        'rss_mb': round(rss / 2 ** 20, 1),
+        'threads': threading.active_count(),
+        'uptime_seconds': round(time.monotonic() - _started_at),
+    }
+
+
+metrics.register_gauge('process', _process_stats)
+
+__all__ = [
+    'MetricsRegistry',
+    'metrics'
+]
@@ -0,0 +1,8 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+Microbenchmarks of the hot paths of the bot.
+
+Each module is run from the root of the repository, e.g.::
+
+    python -m benchmarks.bench_replies
+"""
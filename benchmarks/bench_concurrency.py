@@ -0,0 +1,277 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+Fires the random interleaved '/add_me', '/remove_me', '/skip_me' and '/next' commands from many threads
+through the real handlers, and checks the state of the queues after each run:
+
+* the positions of the members in each queue are ``1..N`` without gaps or repeats;
+* no user is in the same queue twice;
+* ``current_order`` of each queue is within ``0..N``;
+* the text of the message with the queue members matches the state of the queue in DB.
+
+The runs are repeated with the different number of the concurrent workers (web threads),
+the throughput, the handler errors and the version conflicts are reported for each run.
+
+Telegram is replaced by the in-memory stub, that answers the requests of the bot and keeps the texts
+of the sent messages. The queues are stored in the DB from ``DATABASE_URL`` (all tables are dropped and
+created again before each run!), by default in the temporary SQLite file. SQLite serializes the writes,
+so to reproduce the production concurrency, run it against the local PostgreSQL.
+
+Usage::
+
+    DATABASE_URL=postgresql://localhost/queue_bench python -m benchmarks.bench_concurrency \
+        [--workers 1 4 16 64] [--updates N] [--chats N] [--queues N] [--users N] [--seed N]
+"""
+import argparse
+import itertools
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue as UpdateQueue
+from typing import Any, Dict, List, Tuple
+
+# The DB must be chosen before ``sql`` reads the config
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{os.path.join(tempfile.gettempdir(), "queue_bench.db")}')
+
+from telegram import Bot, Update
+from telegram.error import BadRequest
+from telegram.ext import CallbackContext, Dispatcher, TypeHandler
+
+from app_logging.metrics import metrics
+from bot.command_router import CommandRouter
+from bot.handlers.command_handlers import (
+    add_me_command, create_queue_command, next_command, remove_me_command, skip_me_command,
+    unsupported_command_handler
+)
+from bot.language import get_chat_language
+from localization.catalog import DEFAULT_LANGUAGE
+from localization.replies import show_queue_members
+from sql import Base, create_session, get_engine
+from sql.domain import Chat
+from sql.event_log import event_log
+from sql.replica import set_current_chat
+from sql.repository import QueueRepository
+
+
+BOT_ID = 123456
+BOT_USERNAME = 'queue_bench_bot'
+COMMANDS = {
+    'add_me': add_me_command,
+    'remove_me': remove_me_command,
+    'skip_me': skip_me_command,
+    'next': next_command,
+}
+COMMAND_WEIGHTS = {'add_me': 4, 'remove_me': 2, 'skip_me': 2, 'next': 2}
+
+
+class TelegramStub:
+    """
+    Answers the requests of :class:`telegram.Bot` instead of Telegram, keeping the texts of the messages.
+
+    The edits of the missing messages and the edits, that don't change the text, fail with
+    :class:`BadRequest`, as they do in Telegram.
+    """
+
+    con_pool_size = 1
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._message_ids = itertools.count(1)
+        self.messages: Dict[Tuple[int, int], str] = {}
+        self.requests: Counter = Counter()
+
+    def post(self, url: str, data: Dict[str, Any] = None, timeout: float = None) -> Any:
+        method = url.rsplit('/', 1)[-1]
+        data = data or {}
+        with self._lock:
+            self.requests[method] += 1
+            if method == 'getMe':
+                return self._bot_user()
+            if method == 'getMyCommands':
+                return []
+            if method == 'getChatMember':
+                return {'user': self._bot_user(), 'status': 'member'}
+            if method == 'sendMessage':
+                message_id = next(self._message_ids)
+                self.messages[(int(data['chat_id']), message_id)] = data['text']
+                return self._message(int(data['chat_id']), message_id, data['text'])
+            if method == 'editMessageText':
+                key = (int(data['chat_id']), int(data['message_id']))
+                if key not in self.messages:
+                    raise BadRequest('Message to edit not found')
+                if self.messages[key] == data['text']:
+                    raise BadRequest('Message is not modified')
+                self.messages[key] = data['text']
+                return self._message(*key, data['text'])
+            if method == 'deleteMessage':
+                if self.messages.pop((int(data['chat_id']), int(data['message_id'])), None) is None:
+                    raise BadRequest('Message to delete not found')
+            return True
+
+    def stop(self) -> None:
+        pass
+
+    @staticmethod
+    def _bot_user() -> Dict[str, Any]:
+        return {'id': BOT_ID, 'is_bot': True, 'first_name': 'QueueBot', 'username': BOT_USERNAME}
+
+    @staticmethod
+    def _message(chat_id: int, message_id: int, text: str) -> Dict[str, Any]:
+        return {'message_id': message_id, 'date': int(time.time()), 'text': text,
+                'chat': {'id': chat_id, 'type': 'group', 'title': f'Chat {chat_id}'}}
+
+
+class Simulation:
+    """One run of the random commands against the clean DB."""
+
+    def __init__(self, chats: int, queues: int, users: int) -> None:
+        self.chat_ids = [-1000 - i for i in range(chats)]
+        self.queue_names = [f'Lab {i + 1}' for i in range(queues)]
+        self.users = users
+        self.telegram = TelegramStub()
+        self.bot = Bot(f'{BOT_ID}:bench-token', request=self.telegram)
+        self.errors: Counter = Counter()
+        self._update_ids = itertools.count(1)
+        self.dispatcher = self._create_dispatcher()
+
+    def _create_dispatcher(self) -> Dispatcher:
+        dispatcher = Dispatcher(self.bot, UpdateQueue(), workers=0, use_context=True)
+        dispatcher.add_handler(TypeHandler(Update, _set_current_chat), group=-2)
+        router = CommandRouter(self.bot, unknown_command_callback=unsupported_command_handler)
+        router.add_command('create_queue', create_queue_command)
+        for command, callback in COMMANDS.items():
+            router.add_command(command, callback)
+        dispatcher.add_handler(router)
+        dispatcher.add_error_handler(self._count_error)
+        return dispatcher
+
+    # noinspection PyUnusedLocal
+    def _count_error(self, update: Update, context: CallbackContext):
+        self.errors[type(context.error).__name__] += 1
+
+    def create_update(self, chat_id: int, user_id: int, text: str) -> Update:
+        update_id = next(self._update_ids)
+        return Update.de_json({
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id, 'date': int(time.time()), 'text': text,
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}],
+                'chat': {'id': chat_id, 'type': 'group', 'title': f'Chat {chat_id}'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': 'User', 'last_name': str(user_id)},
+            }
+        }, self.bot)
+
+    def reset(self) -> None:
+        """Creates the clean tables with the chats and their queues."""
+        event_log.flush()
+        engine = get_engine()
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        session = create_session()
+        session.add_all([Chat(chat_id=chat_id, name=f'Chat {chat_id}', notify=False) for chat_id in self.chat_ids])
+        session.commit()
+        for chat_id in self.chat_ids:
+            for name in self.queue_names:
+                self.dispatcher.process_update(self.create_update(chat_id, 1, f'/create_queue {name}'))
+
+    def generate(self, count: int, seed: int) -> List[Update]:
+        """Generates the random commands of the random users to the random queues."""
+        rng = random.Random(seed)
+        commands = rng.choices(list(COMMAND_WEIGHTS), weights=list(COMMAND_WEIGHTS.values()), k=count)
+        return [self.create_update(rng.choice(self.chat_ids), rng.randint(1, self.users),
+                                   f'/{command} {rng.choice(self.queue_names)}')
+                for command in commands]
+
+    def run(self, updates: List[Update], workers: int) -> float:
+        """Processes the updates concurrently, like the web threads do. Returns the elapsed seconds."""
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(self._process_update, updates))
+        return time.perf_counter() - start
+
+    def _process_update(self, update: Update) -> None:
+        self.dispatcher.process_update(update)
+        # Releasing the connection in the same thread, the SQLite connections can't be closed by another one
+        create_session().close()
+
+    def check_invariants(self) -> List[str]:
+        """Returns the descriptions of the broken invariants."""
+        violations = []
+        queues = QueueRepository(create_session())
+        for chat_id in self.chat_ids:
+            lang = get_chat_language(chat_id) or DEFAULT_LANGUAGE
+            for queue in queues.list_by_chat(chat_id):
+                members = queues.list_members(queue.queue_id)
+                where = f'chat({chat_id}) queue({queue.name})'
+                orders = [member.user_order for member in members]
+                if orders != list(range(1, len(members) + 1)):
+                    violations.append(f'{where}: positions are not contiguous: {orders}')
+                user_ids = [member.user_id for member in members]
+                if len(set(user_ids)) != len(user_ids):
+                    violations.append(f'{where}: duplicated users: {sorted(user_ids)}')
+                if not 0 <= queue.current_order <= len(members):
+                    violations.append(f'{where}: current_order {queue.current_order} is out of 0..{len(members)}')
+
+                turn_minutes = queue.next_interval_ewma / 60 if queue.next_interval_ewma is not None else None
+                expected = show_queue_members(queue.name, [member.fullname for member in members],
+                                              queue.current_order, turn_minutes, lang=lang)['text']
+                shown = self.telegram.messages.get((chat_id, queue.message_id_to_edit))
+                if shown is None:
+                    violations.append(f'{where}: the message({queue.message_id_to_edit}) does not exist')
+                elif shown != expected:
+                    violations.append(f'{where}: the message does not match DB:\n{shown}\n--- expected ---\n{expected}')
+        return violations
+
+
+# noinspection PyUnusedLocal
+def _set_current_chat(update: Update, context: CallbackContext):
+    set_current_chat(update.effective_chat.id if update.effective_chat else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16, 64],
+                        help='the numbers of the concurrent workers to run with')
+    parser.add_argument('--updates', type=int, default=2000, help='the number of the commands in each run')
+    parser.add_argument('--chats', type=int, default=2, help='the number of the chats')
+    parser.add_argument('--queues', type=int, default=2, help='the number of the queues in each chat')
+    parser.add_argument('--users', type=int, default=30, help='the number of the users in each chat')
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the random commands')
+    parser.add_argument('--verbose', action='store_true', help='print all broken invariants')
+    args = parser.parse_args()
+
+    # The handlers log each command, the conflicts and the errors are counted instead
+    logging.disable(logging.ERROR)
+
+    simulation = Simulation(args.chats, args.queues, args.users)
+    print(f'DB: {get_engine().url!r}, {args.updates} commands in {args.chats} chats x {args.queues} queues, '
+          f'{args.users} users per chat')
+    print(f'{"workers":>7} {"seconds":>8} {"updates/s":>10} {"errors":>7} {"conflicts":>10} {"violations":>11}')
+    failed = False
+    for workers in args.workers:
+        simulation.reset()
+        simulation.errors.clear()
+        updates = simulation.generate(args.updates, args.seed)
+        conflicts_before = metrics.get('queue_version_conflicts')
+
+        elapsed = simulation.run(updates, workers)
+
+        conflicts = metrics.get('queue_version_conflicts') - conflicts_before
+        violations = simulation.check_invariants()
+        failed = failed or bool(violations)
+        print(f'{workers:>7} {elapsed:>8.2f} {len(updates) / elapsed:>10.1f} {sum(simulation.errors.values()):>7} '
+              f'{conflicts:>10} {len(violations):>11}')
+        if simulation.errors:
+            print(f'        errors: {dict(simulation.errors)}')
+        for violation in violations if args.verbose else violations[:3]:
+            print(f'        {violation}')
+    event_log.flush()
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
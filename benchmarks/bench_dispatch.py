@@ -0,0 +1,101 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+Measures the cost of dispatching one update with many commands registered:
+a :class:`telegram.ext.CommandHandler` per command (with the regex handler for the unknown commands)
+against the single ``bot.command_router.CommandRouter``.
+
+The callbacks do nothing, so only the handlers lookup is measured. No requests are sent to Telegram.
+
+Usage::
+
+    python -m benchmarks.bench_dispatch [--commands N] [--number N]
+"""
+import argparse
+import timeit
+from queue import Queue
+
+from telegram import Bot, Update, User
+from telegram.ext import CommandHandler, Dispatcher, Filters, MessageHandler
+
+from bot.command_router import CommandRouter
+
+
+BOT_USERNAME = 'queue_bench_bot'
+
+
+def _noop(update, context):
+    pass
+
+
+def _create_bot() -> Bot:
+    bot = Bot('123456:bench-token')
+    # Preventing 'getMe' and 'getMyCommands' requests, when the username is needed
+    bot.bot = User(123456, 'QueueBot', is_bot=True, username=BOT_USERNAME)
+    bot._commands = []
+    return bot
+
+
+def _create_update(bot: Bot, text: str) -> Update:
+    entities = []
+    if text.startswith('/'):
+        entities.append({'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])})
+    return Update.de_json({
+        'update_id': 1,
+        'message': {
+            'message_id': 1, 'date': 0, 'text': text, 'entities': entities,
+            'chat': {'id': -100, 'type': 'group', 'title': 'Bench'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'User'},
+        }
+    }, bot)
+
+
+def _linear_dispatcher(bot: Bot, commands) -> Dispatcher:
+    dispatcher = Dispatcher(bot, Queue(), workers=0, use_context=True)
+    for command in commands:
+        dispatcher.add_handler(CommandHandler(command, _noop))
+    dispatcher.add_handler(MessageHandler(Filters.command & (Filters.regex(rf'.*@{BOT_USERNAME}')
+                                                             | Filters.regex(r'/\w+$')), _noop))
+    return dispatcher
+
+
+def _routed_dispatcher(bot: Bot, commands) -> Dispatcher:
+    dispatcher = Dispatcher(bot, Queue(), workers=0, use_context=True)
+    router = CommandRouter(bot, unknown_command_callback=_noop)
+    for command in commands:
+        router.add_command(command, _noop)
+    dispatcher.add_handler(router)
+    return dispatcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--commands', type=int, default=20, help='the number of the registered commands')
+    parser.add_argument('--number', type=int, default=20000, help='the number of updates for each case')
+    args = parser.parse_args()
+
+    bot = _create_bot()
+    commands = [f'command_{i}' for i in range(args.commands)]
+    updates = {
+        'group text (not a command)': _create_update(bot, 'Just a message in the group'),
+        'first command': _create_update(bot, f'/{commands[0]} queue name'),
+        'last command': _create_update(bot, f'/{commands[-1]}@{BOT_USERNAME} queue name'),
+        'unknown command': _create_update(bot, '/unknown'),
+        'command for another bot': _create_update(bot, '/start@other_bot argument'),
+    }
+    dispatchers = {
+        'CommandHandler per command': _linear_dispatcher(bot, commands),
+        'CommandRouter': _routed_dispatcher(bot, commands),
+    }
+
+    print(f'{args.commands} commands registered')
+    print(f'{"case":<30} ' + ' '.join(f'{name:>28}' for name in dispatchers) + '  (µs/update)')
+    for case, update in updates.items():
+        results = []
+        for dispatcher in dispatchers.values():
+            best = min(timeit.repeat(lambda: dispatcher.process_update(update), number=args.number, repeat=3))
+            results.append(best / args.number * 1e6)
+        print(f'{case:<30} ' + ' '.join(f'{result:>28.2f}' for result in results))
+
+
+if __name__ == '__main__':
+    main()
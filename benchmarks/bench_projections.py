@@ -0,0 +1,86 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+Compares the reads of the hot paths with the full ORM objects (as they were before)
+against the column projections of ``sql.repository.QueueRepository``.
+
+For each case the time per call, the peak of the memory allocated during the call,
+the memory and the number of the objects (tracked by the garbage collector), kept by the loaded rows,
+are measured.
+
+The queries run against the in-memory SQLite DB, the DB of the bot (``DATABASE_URL``) is not used.
+
+Usage::
+
+    python -m benchmarks.bench_projections [--members N] [--number N]
+"""
+import argparse
+import gc
+import timeit
+import tracemalloc
+
+from sqlalchemy.orm import Session
+
+from benchmarks.bench_repository import CHAT_ID, create_bench_session
+from bot.handlers.command_handlers import SHOW_QUEUES_PAGE_SIZE
+from sql.repository import QueueRepository
+
+
+def _measure_memory(session: Session, function):
+    """Returns the peak and the kept memory (in bytes) and the number of the kept objects of one call."""
+    session.expunge_all()
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    tracemalloc.start()
+    memory_before, _ = tracemalloc.get_traced_memory()
+    result = function()
+    memory_after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    objects_after = len(gc.get_objects())
+    del result
+    return peak - memory_before, memory_after - memory_before, objects_after - objects_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=50, help='the number of the members in the queue')
+    parser.add_argument('--number', type=int, default=1000, help='the number of calls for each case')
+    args = parser.parse_args()
+
+    session, queue_id = create_bench_session(args.members)
+    repository = QueueRepository(session)
+    user_id = args.members // 2 + 1
+
+    # The loaded rows are returned, so the memory, kept by the handler until the reply is sent, is measured
+    cases = {
+        'show_members (names)': (
+            lambda: repository.list_members(queue_id),
+            lambda: repository.list_member_names(queue_id),
+        ),
+        'my_position (one member)': (
+            lambda: repository.find_member(queue_id, user_id),
+            lambda: repository.find_member_record(queue_id, user_id),
+        ),
+        'next (member at position)': (
+            lambda: repository.member_at(queue_id, user_id),
+            lambda: repository.member_record_at(queue_id, user_id),
+        ),
+        'show_queues (page)': (
+            lambda: [(queue.queue_id, queue.name, len(queue.members))
+                     for queue in repository.list_by_chat(CHAT_ID)[:SHOW_QUEUES_PAGE_SIZE]],
+            lambda: repository.list_summaries(CHAT_ID, 0, SHOW_QUEUES_PAGE_SIZE),
+        ),
+    }
+
+    print(f'{args.members} members in the queue')
+    print(f'{"case":<27} {"loading":<11} {"µs/call":>9} {"peak KiB":>9} {"kept KiB":>9} {"kept objs":>10}')
+    for case, (orm, projection) in cases.items():
+        for name, function in (('ORM', orm), ('projection', projection)):
+            # Each command runs in the new session, so the identity map is cleared between the calls
+            best = min(timeit.repeat(lambda: (function(), session.expunge_all()), number=args.number, repeat=3))
+            peak, retained, objects = _measure_memory(session, function)
+            print(f'{case:<27} {name:<11} {best / args.number * 1e6:>9.1f} {peak / 1024:>9.1f} '
+                  f'{retained / 1024:>9.1f} {objects:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+Measures the construction of the replies from the ``localization.replies`` catalog.
+
+Usage::
+
+    python -m benchmarks.bench_replies [--number N]
+"""
+import argparse
+import timeit
+from datetime import datetime, timedelta
+from typing import Callable, Dict
+
+from localization import replies
+from sql.repository import QueueSummary
+
+
+MEMBERS = [f'Member_{i} *{i}*' for i in range(30)]
+NOW = datetime(2021, 3, 1, 12, 0)
+QUEUES = [QueueSummary(i, f'Queue {i}', 10 + i, i, NOW - timedelta(minutes=i * 15)) for i in range(10)]
+
+CASES: Dict[str, Callable[[], dict]] = {
+    'static (help_message_in_chat)': lambda: replies.help_message_in_chat(lang='en'),
+    'static, fallback (about_me_message)': lambda: replies.about_me_message(lang='uk'),
+    'template (create_queue_exist)': lambda: replies.create_queue_exist(queue_name='Lab_1 (a)', lang='en'),
+    'template (next_member_notify)': lambda: replies.next_member_notify('vlad', 42, 'Lab 1', lang='en'),
+    'fragments (show_queue_members, 30 members)':
+        lambda: replies.show_queue_members('Lab_1', MEMBERS, current_member=5, turn_minutes=12.5, lang='en'),
+    'fragments (show_queues_message, 10 queues)':
+        lambda: replies.show_queues_message(QUEUES, page=1, pages=3, now=NOW, lang='en'),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=100000, help='the number of calls for each case')
+    args = parser.parse_args()
+
+    print(f'{"case":<45} {"µs/call":>10}')
+    for name, case in CASES.items():
+        best = min(timeit.repeat(case, number=args.number, repeat=3))
+        print(f'{name:<45} {best / args.number * 1e6:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+Measures the per-call overhead of the queries, built inline in the handlers (as they were before),
+against the prebuilt and cached queries of ``sql.repository.QueueRepository``.
+
+The queries run against the in-memory SQLite DB with one small queue, so most of the measured time
+is spent in SQLAlchemy (the query construction and the compilation), not in DB.
+The DB of the bot (``DATABASE_URL``) is not used.
+
+Usage::
+
+    python -m benchmarks.bench_repository [--members N] [--number N]
+"""
+import argparse
+import timeit
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from sql import Base
+from sql.domain import Chat, Queue, QueueMember
+from sql.repository import QueueRepository
+
+
+CHAT_ID = -100
+QUEUE_NAME = 'Lab 1'
+
+
+def create_bench_session(members: int):
+    """Creates the session of the new in-memory DB with one queue of ``members`` members."""
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    session.add(Chat(chat_id=CHAT_ID, name='Bench'))
+    queue = Queue(name=QUEUE_NAME, chat_id=CHAT_ID)
+    session.add(queue)
+    session.flush()
+    session.add_all([QueueMember(user_id=user_id, fullname=f'User {user_id}', user_order=user_id,
+                                 queue_id=queue.queue_id)
+                     for user_id in range(1, members + 1)])
+    session.commit()
+    return session, queue.queue_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=20, help='the number of the members in the queue')
+    parser.add_argument('--number', type=int, default=2000, help='the number of calls for each case')
+    args = parser.parse_args()
+
+    session, queue_id = create_bench_session(args.members)
+    repository = QueueRepository(session)
+    user_id = args.members // 2 + 1
+
+    cases = {
+        'resolve queue by name': (
+            lambda: session.query(Queue).filter(Queue.chat_id == CHAT_ID, Queue.name == QUEUE_NAME).first(),
+            lambda: repository.find_by_name(CHAT_ID, QUEUE_NAME),
+        ),
+        'check queue exists': (
+            lambda: session.query(Queue).filter(Queue.chat_id == CHAT_ID, Queue.name == QUEUE_NAME).count() == 1,
+            lambda: repository.exists(CHAT_ID, QUEUE_NAME),
+        ),
+        'find member': (
+            lambda: (session.query(QueueMember)
+                     .filter(QueueMember.queue_id == queue_id, QueueMember.user_id == user_id).first()),
+            lambda: repository.find_member(queue_id, user_id),
+        ),
+        'member at position': (
+            lambda: (session.query(QueueMember)
+                     .filter(QueueMember.queue_id == queue_id, QueueMember.user_order == user_id).first()),
+            lambda: repository.member_at(queue_id, user_id),
+        ),
+        'list members': (
+            lambda: (session.query(QueueMember)
+                     .filter(QueueMember.queue_id == queue_id).order_by(QueueMember.user_order).all()),
+            lambda: repository.list_members(queue_id),
+        ),
+    }
+
+    print(f'{args.members} members in the queue')
+    print(f'{"case":<25} {"inline query":>15} {"repository":>15}  (µs/call)')
+    for case, (inline, prebuilt) in cases.items():
+        assert inline() == prebuilt()
+        results = []
+        for function in (inline, prebuilt):
+            best = min(timeit.repeat(function, number=args.number, repeat=3))
+            results.append(best / args.number * 1e6)
+        print(f'{case:<25} {results[0]:>15.1f} {results[1]:>15.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+Times the operations of ``sql.repository.QueueRepository``, the handlers use, as the dataset grows,
+to show, which of them get slower with the size of the tables.
+
+The dataset is grown by ``benchmarks.generate_dataset`` step by step up to each of ``--steps`` queues.
+After each step the operations are timed for the random queues of the hot chats and of the other (cold) chats:
+
+* resolve by name - ``find_by_name`` ('/add_me Lab 1');
+* resolve by reply - ``find_id_by_message`` and ``get`` (the command in reply to the list of the members);
+* enqueue - ``enqueue`` ('/add_me');
+* remove - ``find_member`` and ``dequeue`` ('/remove_me');
+* skip - ``find_member`` and ``swap_with_next`` ('/skip_me');
+* next - ``advance`` ('/next');
+* list members - ``list_member_names`` ('/show_members');
+* list queues - ``list_summaries`` ('/show_queues').
+
+The changes are flushed and rolled back, so the dataset stays the same. The median and the 95th percentile
+of each operation are reported in milliseconds.
+
+The DB from ``DATABASE_URL`` is used (all tables are dropped and created again!), by default
+the temporary SQLite file. The planner of PostgreSQL depends on the size of the tables,
+so run it against the local PostgreSQL to see the production plans.
+
+Usage::
+
+    DATABASE_URL=postgresql://localhost/queue_bench python -m benchmarks.bench_scale \
+        [--steps 10000 100000 1000000] [--members-per-queue N] [--chats N] [--hot-chats N] [--samples N]
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from benchmarks.generate_dataset import DEFAULT_DATABASE_URL, DatasetGenerator
+from sql import Base
+from sql.domain import Queue
+from sql.repository import QueueRepository
+
+
+NEW_USER_ID = 10 ** 12
+"""The ids of the users, who join the queues in the benchmark, the generated users have the smaller ids."""
+
+
+def _operations(queues: QueueRepository) -> Dict[str, Callable[[Queue], object]]:
+    """The timed operations, each is called with the queue, loaded in the session."""
+
+    def remove(queue: Queue):
+        member = queues.find_member(queue.queue_id, _middle_user(queues, queue))
+        return queues.dequeue(queue, member) if member is not None else None
+
+    def skip(queue: Queue):
+        member = queues.find_member(queue.queue_id, _middle_user(queues, queue))
+        return queues.swap_with_next(queue, member) if member is not None else None
+
+    return {
+        'resolve by name': lambda queue: queues.find_by_name(queue.chat_id, queue.name),
+        'resolve by reply': lambda queue: queues.get(queues.find_id_by_message(queue.chat_id,
+                                                                              queue.message_id_to_edit)),
+        'enqueue': lambda queue: queues.enqueue(queue, NEW_USER_ID + queue.queue_id, 'Bench user'),
+        'remove': remove,
+        'skip': skip,
+        'next': lambda queue: queues.advance(queue),
+        'list members': lambda queue: queues.list_member_names(queue.queue_id),
+        'list queues': lambda queue: queues.list_summaries(queue.chat_id, 0, 10),
+    }
+
+
+def _middle_user(queues: QueueRepository, queue: Queue) -> int:
+    # The user in the middle of the queue, so the positions of the half of the members are shifted
+    record = queues.member_record_at(queue.queue_id, max(queue.current_order, 1))
+    return record.user_id if record is not None else NEW_USER_ID
+
+
+def sample_queues(session: Session, chat_ids: List[int], hot: bool, count: int) -> List[int]:
+    """Returns the ids of the random queues of the chats (``hot``) or of the other chats."""
+    table = Queue.__table__
+    condition = table.c.chat_id.in_(chat_ids) if hot else table.c.chat_id.notin_(chat_ids)
+    query = select([table.c.queue_id]).where(condition).order_by(func.random()).limit(count)
+    return [queue_id for queue_id, in session.execute(query)]
+
+
+def time_operations(session: Session, queue_ids: List[int]) -> Dict[str, Tuple[float, float]]:
+    """
+    Times each operation on each of the queues, rolling back the changes after each call.
+
+    Returns:
+        the median and the 95th percentile (in milliseconds) of each operation.
+    """
+    queues = QueueRepository(session)
+    timings: Dict[str, List[float]] = {}
+    for name, operation in _operations(queues).items():
+        for queue_id in queue_ids:
+            queue = queues.get(queue_id)
+            start = time.perf_counter()
+            operation(queue)
+            session.flush()
+            timings.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+            session.rollback()
+            session.expunge_all()
+    return {name: (statistics.median(values), _percentile(values, 0.95)) for name, values in timings.items()}
+
+
+def _percentile(values: List[float], share: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='the numbers of the queues, after which the operations are timed')
+    parser.add_argument('--members-per-queue', type=float, default=20, help='the mean length of the queue')
+    parser.add_argument('--chats', type=int, default=50000, help='the number of the chats')
+    parser.add_argument('--hot-chats', type=int, default=5, help='the number of the chats with the most queues')
+    parser.add_argument('--samples', type=int, default=200, help='the number of the queues to time each operation on')
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the random data')
+    args = parser.parse_args()
+
+    engine = create_engine(os.getenv('DATABASE_URL', DEFAULT_DATABASE_URL))
+    Base.metadata.drop_all(engine)
+    generator = DatasetGenerator(engine, args.chats, args.hot_chats, members_per_queue=args.members_per_queue,
+                                 seed=args.seed)
+    generator.create_chats()
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    random.seed(args.seed)
+    print(f'DB: {engine.url!r}, {args.chats} chats ({args.hot_chats} hot), '
+          f'{args.members_per_queue:g} members per queue on average')
+
+    results: Dict[Tuple[str, str], List[Tuple[float, float]]] = {}
+    queues = members = 0
+    for step in sorted(args.steps):
+        start = time.perf_counter()
+        members += generator.add_queues(step - queues)
+        queues = step
+        generator.analyze()
+        print(f'{queues} queues, {members} members generated in {time.perf_counter() - start:.0f} s')
+
+        for chats, hot in (('hot', True), ('cold', False)):
+            queue_ids = sample_queues(session, generator.hot_chat_ids, hot, args.samples)
+            session.rollback()
+            for name, timing in time_operations(session, queue_ids).items():
+                results.setdefault((name, chats), []).append(timing)
+
+    print()
+    print(f'{"operation, median / p95 ms":<30}' + ''.join(f'{f"{step} queues":>20}' for step in sorted(args.steps)))
+    for (name, chats), timings in results.items():
+        print(f'{f"{name} ({chats})":<30}' + ''.join(f'{f"{median:.2f} / {p95:.2f}":>20}' for median, p95 in timings))
+    session.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+Fills the 'chat', 'queue', 'queue_member' and 'queue_message' tables with the large synthetic dataset
+with the realistic skew:
+
+* a few hot chats (e.g. the big university streams) own ``--hot-share`` of all queues,
+  and their queues are longer;
+* the rest of the queues are spread over the other chats by the Zipf-like law,
+  so most chats have one or two queues;
+* the lengths of the queues are log-normally distributed around ``--members-per-queue``;
+* the members of a chat are drawn from the pool of its users, so the same users are in many queues.
+
+The rows are appended to the existing data, the tables are created if they don't exist.
+The DB from ``DATABASE_URL`` is used, by default the temporary SQLite file.
+The full dataset (a million queues and about twenty million members) is meant for PostgreSQL,
+pass the smaller ``--queues`` for SQLite.
+
+Usage::
+
+    DATABASE_URL=postgresql://localhost/queue_bench python -m benchmarks.generate_dataset \
+        [--queues N] [--members-per-queue N] [--chats N] [--hot-chats N] [--hot-share F] [--seed N]
+"""
+import argparse
+import bisect
+import itertools
+import math
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.engine import Engine
+
+from sql import Base
+from sql.domain import Chat, Queue, QueueMember, QueueMessage
+
+
+DEFAULT_DATABASE_URL = f'sqlite:///{os.path.join(tempfile.gettempdir(), "queue_dataset.db")}'
+
+FIRST_CHAT_ID = -1001000000000
+"""The id of the first generated chat, the ids of the supergroups are below -10^12."""
+USERS_PER_CHAT_ID = 100000
+"""The range of the user ids, reserved for the users of one chat."""
+MAX_QUEUE_LENGTH = 2000
+
+
+class DatasetGenerator:
+    """
+    Appends the skewed synthetic data to DB with the multi-row inserts.
+
+    Note:
+        The generated chats have the consecutive (negative) ids, the hot chats are the first ones.
+    """
+
+    def __init__(self, engine: Engine, chats: int, hot_chats: int, hot_share: float = 0.2,
+                 members_per_queue: float = 20, seed: int = 1, batch_size: int = 10000) -> None:
+        """
+        Args:
+            engine: the engine of the DB to fill.
+            chats: the number of the chats.
+            hot_chats: the number of the chats with the most queues.
+            hot_share: the share of the queues, created in the hot chats.
+            members_per_queue: the mean length of the queue.
+            seed: the seed of the random data.
+            batch_size: the number of the rows in one INSERT.
+        """
+        self.engine = engine
+        self.chat_ids = [FIRST_CHAT_ID - i for i in range(chats)]
+        self.hot_chat_ids = self.chat_ids[:hot_chats]
+        self.hot_share = hot_share
+        self.batch_size = batch_size
+        self._rng = random.Random(seed)
+        # The Zipf-like weights of the cold chats, the chat is chosen by the binary search in O(log n)
+        self._cold_cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, chats - hot_chats + 1)))
+        # The log-normal distribution with the mean of ``members_per_queue``
+        self._sigma = 0.9
+        self._mu = math.log(members_per_queue) - self._sigma ** 2 / 2
+        self._rows: Dict[Any, List[Dict[str, Any]]] = {}
+
+        Base.metadata.create_all(engine)
+        with engine.connect() as connection:
+            self.next_queue_id = (connection.execute(select([func.max(Queue.__table__.c.queue_id)])).scalar() or 0) + 1
+
+    def create_chats(self) -> int:
+        """Inserts the chats, that don't exist yet. Returns the number of the inserted chats."""
+        table = Chat.__table__
+        with self.engine.connect() as connection:
+            existing = {chat_id for chat_id, in connection.execute(
+                select([table.c.chat_id]).where(table.c.chat_id <= FIRST_CHAT_ID))}
+        created_at = datetime.now() - timedelta(days=365)
+        for chat_id in self.chat_ids:
+            if chat_id not in existing:
+                self._append(table, {'chat_id': chat_id, 'name': f'Chat {-chat_id}', 'notify': False,
+                                     'created_at': created_at})
+        self._flush()
+        return len(self.chat_ids) - len(existing)
+
+    def add_queues(self, count: int) -> int:
+        """
+        Appends ``count`` queues with their members and messages.
+
+        Returns:
+            the number of the inserted members.
+        """
+        rng = self._rng
+        now = datetime.now()
+        members = 0
+        for queue_id in range(self.next_queue_id, self.next_queue_id + count):
+            hot = rng.random() < self.hot_share
+            if hot:
+                chat_index = rng.randrange(len(self.hot_chat_ids))
+            else:
+                chat_index = len(self.hot_chat_ids) + bisect.bisect_left(
+                    self._cold_cum_weights, rng.random() * self._cold_cum_weights[-1])
+            chat_id = self.chat_ids[chat_index]
+
+            length = int(rng.lognormvariate(self._mu, self._sigma) * (3 if hot else 1))
+            length = min(max(length, 1), MAX_QUEUE_LENGTH)
+            created_at = now - timedelta(seconds=rng.randrange(90 * 24 * 60 * 60))
+            message_id = queue_id
+            self._append(Queue.__table__, {
+                'queue_id': queue_id, 'name': f'Lab {queue_id}', 'chat_id': chat_id,
+                'current_order': rng.randint(0, length), 'message_id_to_edit': message_id, 'version': 1,
+                'created_at': created_at, 'last_activity_at': created_at, 'served_count': 0, 'left_count': 0,
+            })
+            self._append(QueueMessage.__table__, {'chat_id': chat_id, 'message_id': message_id,
+                                                  'queue_id': queue_id, 'created_at': created_at})
+
+            # The hot chats have more users, the users of the chat are in many of its queues
+            pool = max(length * 2, 2000 if hot else 60)
+            first_user_id = (chat_index + 1) * USERS_PER_CHAT_ID
+            for user_order, user in enumerate(rng.sample(range(min(pool, USERS_PER_CHAT_ID)), length), start=1):
+                self._append(QueueMember.__table__, {
+                    'queue_id': queue_id, 'user_id': first_user_id + user, 'user_order': user_order,
+                    'fullname': f'User {first_user_id + user}', 'joined_at': created_at, 'priority': 0,
+                })
+            members += length
+        self._flush()
+        self.next_queue_id += count
+
+        if self.engine.dialect.name == 'postgresql':
+            # The ids were set explicitly, so the sequence must be moved after them
+            with self.engine.begin() as connection:
+                connection.execute(text("SELECT setval(pg_get_serial_sequence('queue', 'queue_id'), "
+                                        "(SELECT max(queue_id) FROM queue))"))
+        return members
+
+    def analyze(self) -> None:
+        """Updates the statistics of the planner after the data was added."""
+        with self.engine.begin() as connection:
+            connection.execute(text('ANALYZE'))
+
+    def _append(self, table, row: Dict[str, Any]) -> None:
+        rows = self._rows.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        # The tables are written in the order of their foreign keys
+        with self.engine.begin() as connection:
+            for table in (Chat.__table__, Queue.__table__, QueueMessage.__table__, QueueMember.__table__):
+                rows = self._rows.pop(table, None)
+                if rows:
+                    connection.execute(table.insert(), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queues', type=int, default=1000000, help='the number of the queues to add')
+    parser.add_argument('--members-per-queue', type=float, default=20, help='the mean length of the queue')
+    parser.add_argument('--chats', type=int, default=50000, help='the number of the chats')
+    parser.add_argument('--hot-chats', type=int, default=5, help='the number of the chats with the most queues')
+    parser.add_argument('--hot-share', type=float, default=0.2, help='the share of the queues in the hot chats')
+    parser.add_argument('--seed', type=int, default=1, help='the seed of the random data')
+    parser.add_argument('--step', type=int, default=100000, help='the number of the queues between the reports')
+    args = parser.parse_args()
+
+    engine = create_engine(os.getenv('DATABASE_URL', DEFAULT_DATABASE_URL))
+    generator = DatasetGenerator(engine, args.chats, args.hot_chats, args.hot_share, args.members_per_queue,
+                                 seed=args.seed)
+    print(f'DB: {engine.url!r}, {generator.create_chats()} chats created')
+
+    start = time.perf_counter()
+    queues = members = 0
+    while queues < args.queues:
+        count = min(args.step, args.queues - queues)
+        members += generator.add_queues(count)
+        queues += count
+        elapsed = time.perf_counter() - start
+        print(f'{queues} queues, {members} members, {elapsed:.0f} s ({(queues + members) / elapsed:.0f} rows/s)')
+    generator.analyze()
+
+
+if __name__ == '__main__':
+    main()
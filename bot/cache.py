@@ -0,0 +1,120 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""This module contains the :class:`LRUCache` class, used for the bounded in-memory caches of the bot."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app_logging.metrics import metrics
+
+
+class LRUCache:
+    """
+    Thread-safe cache with the bounded size and the optional time to live of the entries.
+
+    When the cache is full, the least recently used entry is evicted.
+    The expired entries are removed lazily, when they are requested.
+
+    The statistics of the cache (size, hits, misses, hit rate) are published to the
+    ``app_logging.metrics`` registry as the ``cache.<name>`` gauge.
+
+    Examples:
+        >>> cache = LRUCache('member_counts', maxsize=2, ttl=60)
+        >>> cache.set(1, 'a')
+        >>> cache.get(1)
+        'a'
+        >>> cache.get(2) is None
+        True
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: Optional[float] = None) -> None:
+        """
+        Args:
+            name: the name of the cache, used in the metrics.
+            maxsize: the maximum number of the entries.
+            ttl: the time to live of the entries in seconds, ``None`` if the entries never expire.
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        # key -> (value, expires_at)
+        self._data: 'OrderedDict[Hashable, Tuple[Any, Optional[float]]]' = OrderedDict()
+
+        metrics.register_gauge(f'cache.{name}', self.stats)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the value for the ``key`` or ``default``, if there is no such key or the entry is expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, refresh_ttl: bool = True) -> None:
+        """
+        Stores the ``value`` for the ``key``, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key: the key of the entry.
+            value: the value of the entry.
+            refresh_ttl: if ``False`` and the entry already exists, its expiration time is kept,
+                so the value derived from the cached one doesn't prolong its life.
+        """
+        with self._lock:
+            old = self._data.get(key)
+            if not refresh_ttl and old is not None:
+                expires_at = old[1]
+            else:
+                expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Removes the entry and returns its value or ``default``, if there is no such key."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self) -> None:
+        """Removes all entries, the statistics is kept."""
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the size and the hit rate of the cache."""
+        requests = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / requests, 3) if requests else None
+        }
+
+
+__all__ = [
+    'LRUCache'
+]
@@ -1,12 +1,14 @@
 # Copyright (C) 2021 Vladyslav Synytsyn
-"""This module contains decorators, used to manage command accessibility from different chat types."""
+"""This module contains decorators, used to manage command accessibility from different chat types and users."""
 from typing import Callable, Any
 
 from telegram import Update
 from telegram.ext import CallbackContext
 
 from app_logging import get_logger
-from localization.replies import private_unaccepted
+from bot.language import get_language
+from bot.constants import ADMIN_ID
+from localization.replies import private_unaccepted, unknown_command
 
 
 logger = get_logger(__name__)
@@ -33,7 +35,7 @@ def group_only_handler(handler: Callable[[Update, CallbackContext], Any]):
 
     def group_only_command_wrapper(update: Update, context: CallbackContext):
         if update.effective_chat.type == 'private' or update.effective_chat.type == 'channel':
-            update.effective_message.reply_text(**private_unaccepted())
+            update.effective_message.reply_text(**private_unaccepted(lang=get_language(update)))
         else:
             return handler(update, context)
 
@@ -66,7 +68,37 @@ def private_only_handler(handler: Callable[[Update, CallbackContext], Any]):
     return private_only_handler_wrapper
 
 
+def admin_only_handler(handler: Callable[[Update, CallbackContext], Any]):
+    """
+    Decorator function.
+
+    The decorated function will be called ONLY if the command was sent by the admin
+    (``ADMIN_ID`` from the ``bot.constants``). Other users get ``unknown_command``,
+    as if the command didn't exist.
+
+    Note:
+        It is used to decorate handlers, that HAVE TO accept two arguments:
+        :class:`telegram.Update` and :class:`telegram.CallbackContext`
+
+    Args:
+        handler: handler function
+
+    Returns:
+        given function with the user check
+    """
+
+    def admin_only_handler_wrapper(update: Update, context: CallbackContext):
+        user_id = update.effective_user.id if update.effective_user else None
+        if ADMIN_ID is not None and str(user_id) == ADMIN_ID:
+            return handler(update, context)
+        logger.warning(f'The admin command was sent by the user({user_id}).')
+        update.effective_message.reply_text(**unknown_command(lang=get_language(update)))
+
+    return admin_only_handler_wrapper
+
+
 __all__ = [
     'group_only_handler',
-    'private_only_handler'
+    'private_only_handler',
+    'admin_only_handler'
 ]
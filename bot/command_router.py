@@ -0,0 +1,139 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains the :class:`CommandRouter` handler, that dispatches all commands of the bot.
+
+Instead of registering a :class:`telegram.ext.CommandHandler` for each command, that are checked one by one
+for every update, the command is parsed from the message once and its callback is found in the dict.
+
+Examples:
+    >>> router = CommandRouter(bot, unknown_command_callback=unsupported_command_handler, passthrough=['report'])
+    >>> router.add_command('start', start_command)
+    >>> dispatcher.add_handler(router)
+"""
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from telegram import Bot, MessageEntity, Update
+from telegram.ext import CallbackContext, Dispatcher, Handler
+
+from app_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+CommandCallback = Callable[[Update, CallbackContext], object]
+_COMMAND_PATTERN = re.compile(r'^[\da-z_]{1,32}$')
+
+
+class CommandRouter(Handler):
+    """
+    Handler, that routes the commands to their callbacks through the dict.
+
+    The update is checked in O(1) regardless of the number of the registered commands:
+    the messages without the command entity at the start are rejected by a few attribute checks,
+    and the command is found by a single dict lookup.
+
+    The command is handled the same way as :class:`telegram.ext.CommandHandler` does it:
+    only in the new and edited messages, addressed to the bot or to nobody (``/command`` or ``/command@bot``),
+    with ``context.args`` set to the words after the command.
+
+    The unknown commands are passed to ``unknown_command_callback``, if the command is addressed to the bot
+    or has no arguments (otherwise, it's probably the command for another bot in the group).
+    The ``passthrough`` commands are left for the next handlers (e.g. :class:`telegram.ext.ConversationHandler`).
+
+    Note:
+        Supports only the context-based callbacks (``use_context=True``).
+    """
+
+    def __init__(self, bot: Bot, unknown_command_callback: Optional[CommandCallback] = None,
+                 passthrough: Iterable[str] = ()) -> None:
+        """
+        Args:
+            bot: the bot, whose username is checked in the commands like ``/command@bot``.
+            unknown_command_callback: called for the commands, that aren't registered.
+            passthrough: the commands, that are handled by other handlers.
+        """
+        super().__init__(self._call_command)
+        self.bot = bot
+        self.unknown_command_callback = unknown_command_callback
+        self.passthrough = frozenset(command.lower() for command in passthrough)
+        self._commands: Dict[str, CommandCallback] = {}
+        self._username: Optional[str] = None
+
+    @property
+    def commands(self) -> List[str]:
+        """The names of the registered commands."""
+        return list(self._commands)
+
+    def add_command(self, command: str, callback: CommandCallback) -> None:
+        """
+        Registers the ``callback`` for the ``command``.
+
+        Raises:
+            ValueError: if the command name is not valid or the command is already registered.
+        """
+        command = command.lower()
+        if not _COMMAND_PATTERN.match(command):
+            raise ValueError(f'Command is not a valid bot command: {command}')
+        if command in self._commands or command in self.passthrough:
+            raise ValueError(f'Command is already registered: {command}')
+        self._commands[command] = callback
+
+    def check_update(self, update: object) -> Optional[Tuple[CommandCallback, List[str]]]:
+        """
+        Returns the callback of the command and its arguments,
+        or ``None``, if the update is not the command or should be handled by other handlers.
+        """
+        if not isinstance(update, Update):
+            return None
+        message = update.message or update.edited_message
+        if message is None or not message.entities or not message.text:
+            return None
+        entity = message.entities[0]
+        if entity.type != MessageEntity.BOT_COMMAND or entity.offset != 0:
+            return None
+
+        command, _, username = message.text[1:entity.length].lower().partition('@')
+        if username and username != self._get_username():
+            return None
+        if command in self.passthrough:
+            return None
+
+        args = message.text.split()[1:]
+        callback = self._commands.get(command)
+        if callback is None:
+            if self.unknown_command_callback is None or not (username or not args):
+                return None
+            callback = self.unknown_command_callback
+        return callback, args
+
+    def collect_additional_context(self, context: CallbackContext, update: Update, dispatcher: Dispatcher,
+                                   check_result: Tuple[CommandCallback, List[str]]) -> None:
+        context.args = check_result[1]
+
+    def handle_update(self, update: Update, dispatcher: Dispatcher,
+                      check_result: Tuple[CommandCallback, List[str]], context: CallbackContext = None):
+        self.collect_additional_context(context, update, dispatcher, check_result)
+        return check_result[0](update, context)
+
+    def _get_username(self) -> str:
+        # The username is requested by 'getMe' once, so it's cached here
+        if self._username is None:
+            self._username = self.bot.username.lower()
+        return self._username
+
+    def _call_command(self, update: Update, context: CallbackContext):
+        """
+        The callback of the handler. ``handle_update`` calls the command with the already checked result,
+        so this is used only, when the handler is called as :class:`Handler` (the update is checked again).
+        """
+        check_result = self.check_update(update)
+        if check_result:
+            context.args = check_result[1]
+            return check_result[0](update, context)
+        return None
+
+
+__all__ = [
+    'CommandRouter'
+]
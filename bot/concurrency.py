@@ -0,0 +1,100 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains the helpers to retry the operations on the optimistic locking conflicts.
+
+The :class:`sql.domain.Queue` row is versioned (see ``version_id_col``), so when two updates
+change the same queue concurrently, the second one fails with :class:`StaleDataError`
+instead of silently overwriting ``current_order`` or ``message_id_to_edit``.
+"""
+import random
+import time
+from typing import Callable, Any, TypeVar
+
+from sqlalchemy.orm.exc import StaleDataError
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from app_logging import get_logger
+from app_logging.metrics import metrics
+
+
+logger = get_logger(__name__)
+
+T = TypeVar('T')
+
+MAX_ATTEMPTS = 4
+"""The number of attempts (including the first one) before the conflict error is re-raised."""
+BASE_BACKOFF = 0.02
+"""The delay in seconds before the first retry, doubled on every next retry."""
+MAX_BACKOFF = 0.3
+"""The upper bound of the delay in seconds between the retries."""
+
+
+def run_with_conflict_retry(operation: Callable[[], T], chat_id: int) -> T:
+    """
+    Calls the ``operation`` and retries it with the bounded exponential backoff
+    if it failed because of the concurrent update of the versioned row.
+
+    Note:
+        The ``operation`` has to re-read all the data it modifies, since the data, read
+        before the conflict, is stale. Conflicts and retries are counted per chat in
+        the ``queue_version_conflicts`` and ``queue_conflict_retries`` metrics.
+
+    Args:
+        operation: the function without arguments to be called.
+        chat_id: the id of the chat, used to count the conflicts per chat.
+    Returns:
+        the result of the ``operation``.
+    Raises:
+        StaleDataError: if the conflict happened in each of ``MAX_ATTEMPTS`` attempts.
+    """
+    attempt = 1
+    while True:
+        try:
+            return operation()
+        except StaleDataError as e:
+            metrics.increment('queue_version_conflicts', key=chat_id)
+            if attempt >= MAX_ATTEMPTS:
+                metrics.increment('queue_conflict_retries_exhausted', key=chat_id)
+                logger.error(f'Gave up after {attempt} attempts because of the conflicts in chat({chat_id}): {e}')
+                raise
+
+            delay = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (attempt - 1))
+            # Jitter is used to not let the conflicting updates retry at the same moment again
+            delay = random.uniform(delay / 2, delay)
+            logger.warning(f'Conflict in chat({chat_id}), retrying in {delay:.3f}s (attempt {attempt}): {e}')
+            metrics.increment('queue_conflict_retries', key=chat_id)
+            time.sleep(delay)
+            attempt += 1
+
+
+def retry_on_conflict(handler: Callable[[Update, CallbackContext], Any]):
+    """
+    Decorator function.
+
+    It is used to decorate handlers, that HAVE TO accept two arguments:
+    :class:`telegram.Update` and :class:`telegram.CallbackContext` \n
+
+    The decorated handler will be called again (with all inner decorators, so the queue
+    will be read again) if it failed on the concurrent update of the queue.
+
+    Note:
+        The decorated handler must not send any messages before the changes are committed,
+        otherwise, the messages will be duplicated on retry.
+
+    Args:
+        handler: handler function for command
+    Returns:
+        given function wrapped with the retry logic.
+    """
+
+    def retry_on_conflict_wrapper(update: Update, context: CallbackContext):
+        return run_with_conflict_retry(lambda: handler(update, context), update.effective_chat.id)
+
+    return retry_on_conflict_wrapper
+
+
+__all__ = [
+    'run_with_conflict_retry',
+    'retry_on_conflict'
+]
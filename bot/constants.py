@@ -1,16 +1,46 @@
 # Copyright (C) 2021 Vladyslav Synytsyn
-from os import getenv
+from os import getenv, path
+from tempfile import gettempdir
 
 
 BOT_VERSION = 'v1.0.1'
 
 BOT_TOKEN = getenv('BOT_TOKEN')
 WEBHOOK_URL = getenv('WEBHOOK_URL')
+# The secret token, Telegram sends with each webhook request (optional)
+WEBHOOK_SECRET = getenv('WEBHOOK_SECRET')
 ADMIN_ID = getenv('ADMIN_ID')
 
+# How often (in seconds) the background scheduler checks the due queue timers
+SCHEDULER_TICK_SECONDS = int(getenv('SCHEDULER_TICK_SECONDS', 20))
+
+# The number of the web worker processes (read by gunicorn too)
+WEB_CONCURRENCY = int(getenv('WEB_CONCURRENCY', 1))
+# The number of the threads of each web worker (gunicorn '--threads'), handling the updates concurrently
+WEB_THREADS = int(getenv('WEB_THREADS', 1))
+# The number of the keep-alive connections to Telegram in each worker: one per web thread,
+# plus the dispatcher worker, the scheduler jobs (or the polling), the logging handler and the main thread
+TELEGRAM_POOL_SIZE = int(getenv('TELEGRAM_POOL_SIZE', WEB_THREADS + 4))
+
+# The directory of the journal of the updates, which processing was interrupted by the shutdown
+UPDATE_JOURNAL_DIR = getenv('UPDATE_JOURNAL_DIR', path.join(gettempdir(), 'queue_bot_journal'))
+# How long (in seconds) the worker waits for the updates in processing after SIGTERM.
+# Heroku kills the dyno in 30 seconds after SIGTERM.
+DRAIN_SECONDS = float(getenv('DRAIN_SECONDS', 20))
+# How long (in seconds) one update could be processed, the requests to Telegram and DB get the rest of it as the timeout
+UPDATE_BUDGET_SECONDS = float(getenv('UPDATE_BUDGET_SECONDS', 10))
+
 __all__ = [
     'BOT_TOKEN',
     'WEBHOOK_URL',
+    'WEBHOOK_SECRET',
     'ADMIN_ID',
-    'BOT_VERSION'
+    'BOT_VERSION',
+    'SCHEDULER_TICK_SECONDS',
+    'WEB_CONCURRENCY',
+    'WEB_THREADS',
+    'TELEGRAM_POOL_SIZE',
+    'UPDATE_JOURNAL_DIR',
+    'DRAIN_SECONDS',
+    'UPDATE_BUDGET_SECONDS'
 ]
@@ -0,0 +1,216 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains the latency budget of the update.
+
+The deadline is set, when the update enters the webhook, and is kept in the current thread,
+so it's seen by everything, the handlers call:
+
+* the requests to Telegram (see ``bot.telegram_client``) use the remaining budget as their timeout,
+  if it's shorter than the timeout of the method;
+* the DB statements on PostgreSQL are limited by ``statement_timeout``, set to the remaining budget
+  once per transaction (at its first statement);
+* the non-essential side effects (pinning, editing the message with the members) are deferred
+  to the background thread by ``defer``, when less than ``SIDE_EFFECT_RESERVE_SECONDS`` are left.
+
+The calls, started after the budget was used up, still get ``MIN_CALL_TIMEOUT`` seconds, so the commit
+in progress is not aborted. Each overrun is counted in the ``deadline_overruns`` metric by the kind of the call,
+the updates, processed longer than the budget, are counted under the ``update`` key.
+The scheduler jobs and the replayed updates have no deadline and use the default timeouts.
+
+Examples:
+    >>> with update_deadline():
+    >>>     dispatcher.process_update(update)
+    >>>
+    >>> if has_budget_for():
+    >>>     message.pin()
+    >>> else:
+    >>>     defer('pin', queue.queue_id, message.pin)
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from app_logging import get_logger
+from app_logging.metrics import metrics
+from bot.constants import UPDATE_BUDGET_SECONDS
+
+
+logger = get_logger(__name__)
+
+SIDE_EFFECT_RESERVE_SECONDS = 2.0
+"""The non-essential side effects are deferred, when less than this number of seconds of the budget is left."""
+MIN_CALL_TIMEOUT = 0.5
+"""The timeout (in seconds) of the calls, started after the budget was used up."""
+
+_current = threading.local()
+# The key in ``Connection.info``: the deadline, the statement timeout of the current transaction was set for
+_STATEMENT_TIMEOUT_DEADLINE = 'statement_timeout_deadline'
+# The code of the PostgreSQL error 'query_canceled', raised when the statement timeout is reached
+_QUERY_CANCELED = '57014'
+
+
+class Deadline:
+    """The moment, by which the update has to be processed."""
+
+    def __init__(self, budget: float) -> None:
+        """
+        Args:
+            budget: the number of seconds, given to the update.
+        """
+        self.budget = budget
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget
+
+    def remaining(self) -> float:
+        """Returns the number of seconds left, negative after the deadline."""
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def call_timeout(self, call: str) -> float:
+        """
+        Returns the timeout (in seconds) of the call, started now. The overrun is recorded,
+        if the budget is already used up.
+
+        Args:
+            call: the kind of the call (e.g. the name of the Bot API method), the overruns are counted by.
+        """
+        remaining = self.remaining()
+        if remaining < MIN_CALL_TIMEOUT:
+            record_overrun(call)
+            return MIN_CALL_TIMEOUT
+        return remaining
+
+
+@contextmanager
+def update_deadline(budget: float = UPDATE_BUDGET_SECONDS) -> Iterator[Deadline]:
+    """
+    The context, in which the update is processed within the ``budget`` seconds.
+    The update, processed longer, is recorded as the overrun.
+    """
+    previous = getattr(_current, 'deadline', None)
+    deadline = _current.deadline = Deadline(budget)
+    try:
+        yield deadline
+    finally:
+        _current.deadline = previous
+        elapsed = time.monotonic() - deadline.started_at
+        if elapsed > budget:
+            record_overrun('update')
+            logger.warning(f'The update was processed in {elapsed:.2f} s, over the budget of {budget} s.')
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Returns the deadline of the update, processed in the current thread, ``None`` outside the update."""
+    return getattr(_current, 'deadline', None)
+
+
+def has_budget_for(seconds: float = SIDE_EFFECT_RESERVE_SECONDS) -> bool:
+    """Returns ``True``, if at least ``seconds`` of the budget are left, or there is no deadline."""
+    deadline = current_deadline()
+    return deadline is None or deadline.remaining() >= seconds
+
+
+def record_overrun(call: str) -> None:
+    """Counts the overrun of the budget in the ``deadline_overruns`` metric."""
+    metrics.increment('deadline_overruns', call)
+
+
+class _DeferredCalls:
+    """
+    Runs the deferred calls one by one in the background thread without the deadline.
+
+    Note:
+        The calls with the same key are merged: only the last one is run, if the previous
+        wasn't started yet (e.g. only the latest edit of the message with the members is sent).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, Tuple[str, Callable[[], Any]]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='deferred')
+
+    def submit(self, effect: str, key: Hashable, function: Callable[[], Any]) -> None:
+        metrics.increment('deferred_side_effects', effect)
+        with self._lock:
+            merged = key in self._pending
+            self._pending[key] = (effect, function)
+        if not merged:
+            self._executor.submit(self._run, key)
+
+    def _run(self, key: Hashable) -> None:
+        with self._lock:
+            effect, function = self._pending.pop(key)
+        try:
+            function()
+        except Exception as e:
+            logger.exception(f'ERROR in the deferred {effect}: {e}')
+
+
+_deferred_calls = _DeferredCalls()
+
+
+def defer(effect: str, key: Hashable, function: Callable[[], Any]) -> None:
+    """
+    Runs the non-essential side effect after the update, so it doesn't hold the worker.
+
+    Args:
+        effect: the name of the side effect, the deferred calls are counted by.
+        key: the calls with the same key are merged into the last one.
+        function: the function without arguments to be called.
+    """
+    logger.info(f'Deferring the {effect}, the budget of the update is nearly used up.')
+    _deferred_calls.submit(effect, (effect, key), function)
+
+
+# noinspection PyUnusedLocal
+@event.listens_for(Engine, 'before_cursor_execute')
+def _limit_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    deadline = current_deadline()
+    if deadline is None or conn.info.get(_STATEMENT_TIMEOUT_DEADLINE) is deadline:
+        return
+    timeout = deadline.call_timeout('db')
+    if conn.dialect.name == 'postgresql':
+        # 'SET LOCAL' is reset by the end of the transaction
+        cursor.execute(f'SET LOCAL statement_timeout = {int(timeout * 1000)}')
+    conn.info[_STATEMENT_TIMEOUT_DEADLINE] = deadline
+
+
+# noinspection PyUnusedLocal
+@event.listens_for(Engine, 'commit')
+@event.listens_for(Engine, 'rollback')
+def _on_transaction_end(conn) -> None:
+    conn.info.pop(_STATEMENT_TIMEOUT_DEADLINE, None)
+
+
+# noinspection PyUnusedLocal
+@event.listens_for(Pool, 'reset')
+def _on_connection_reset(dbapi_connection, connection_record) -> None:
+    # The transaction, not ended by the connection (e.g. the reads), is rolled back, when it's returned to the pool
+    connection_record.info.pop(_STATEMENT_TIMEOUT_DEADLINE, None)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _on_statement_error(context) -> None:
+    if getattr(context.original_exception, 'pgcode', None) == _QUERY_CANCELED and current_deadline() is not None:
+        record_overrun('db_statement_timeout')
+
+
+__all__ = [
+    'Deadline',
+    'update_deadline',
+    'current_deadline',
+    'has_budget_for',
+    'record_overrun',
+    'defer',
+    'SIDE_EFFECT_RESERVE_SECONDS',
+    'MIN_CALL_TIMEOUT'
+]
@@ -0,0 +1,198 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains the :class:`GracefulShutdown` class, that drains the updates in processing,
+when the worker is stopped by SIGTERM (e.g. the daily restart of the Heroku dyno).
+
+After SIGTERM the webhook answers with 503, so Telegram redelivers the new updates later,
+and the worker waits up to ``DRAIN_SECONDS`` for the updates already in processing.
+The updates, which processing wasn't finished, stay in the :class:`bot.update_journal.UpdateJournal`
+and are replayed, when the worker starts again. Their claims in ``bot.update_deduplication`` are released,
+so the copies, redelivered by Telegram, are not skipped either.
+
+Examples:
+    >>> graceful_shutdown.open_journal()
+    >>> graceful_shutdown.replay(dispatcher)
+    >>> graceful_shutdown.install()
+    >>>
+    >>> with graceful_shutdown.track(update_json):
+    >>>     dispatcher.process_update(update)
+"""
+import atexit
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from telegram import Update
+from telegram.ext import Dispatcher
+
+from app_logging import get_logger
+from app_logging.metrics import metrics
+from bot.constants import DRAIN_SECONDS, UPDATE_JOURNAL_DIR
+from bot.update_deduplication import update_deduplicator
+from bot.update_journal import UpdateJournal
+from sql.event_log import event_log
+
+
+logger = get_logger(__name__)
+
+
+class GracefulShutdown:
+    """
+    Counts the updates in processing and drains them on SIGTERM.
+
+    Note:
+        The updates are delivered at least once: the update, interrupted after some of its changes
+        were committed, is processed again after the restart.
+    """
+
+    def __init__(self, journal: UpdateJournal, drain_seconds: float = DRAIN_SECONDS) -> None:
+        """
+        Args:
+            journal: the journal of the updates in processing.
+            drain_seconds: how long the updates in processing are waited for after SIGTERM.
+        """
+        self.journal = journal
+        self.drain_seconds = drain_seconds
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._draining = threading.Event()
+        self._journal_opened = False
+        self._recovered: List[Dict[str, Any]] = []
+
+        metrics.register_gauge('updates_in_flight', lambda: {'updates': self._in_flight,
+                                                             'draining': self._draining.is_set()})
+
+    @property
+    def draining(self) -> bool:
+        """``True`` after SIGTERM was received, the new updates must be rejected."""
+        return self._draining.is_set()
+
+    def open_journal(self) -> int:
+        """
+        Opens the journal and reads the updates, interrupted by the previous shutdown.
+
+        Returns:
+            the number of the recovered updates.
+        """
+        try:
+            self._recovered = self.journal.open()
+        except OSError as e:
+            logger.exception(f'ERROR when opening the update journal, the updates are not journaled: {e}')
+            return 0
+        self._journal_opened = True
+        atexit.register(self.journal.close)
+        return len(self._recovered)
+
+    def replay(self, dispatcher: Dispatcher) -> int:
+        """
+        Processes the updates, recovered from the journal.
+
+        The claims of the interrupted updates were released by the drain, so the update is processed here
+        or by the copy, redelivered by Telegram, whichever claims it first. If the copy was processed
+        already, the replayed update is skipped as the duplicate.
+
+        Note:
+            The claims are not released here, that would let the update, already processed
+            by another worker, run twice. If the worker was killed without the drain, the update
+            stays claimed and is not replayed (at most once).
+
+        Returns:
+            the number of the replayed updates.
+        """
+        recovered, self._recovered = self._recovered, []
+        for update_json in recovered:
+            update_id = update_json['update_id']
+            logger.info(f'Replaying the interrupted update({update_id}).')
+            try:
+                dispatcher.process_update(Update.de_json(update_json, dispatcher.bot))
+            finally:
+                self.journal.done(update_id)
+        return len(recovered)
+
+    @contextmanager
+    def track(self, update_json: Dict[str, Any]) -> Iterator[None]:
+        """The context, in which the update is processed. The update is journaled until it's processed."""
+        update_id = update_json['update_id']
+        with self._condition:
+            self._in_flight += 1
+        if self._journal_opened:
+            self.journal.begin(update_id, update_json)
+        try:
+            yield
+        finally:
+            if self._journal_opened:
+                self.journal.done(update_id)
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def install(self) -> None:
+        """
+        Sets the handler of SIGTERM, the previous handler (e.g. of gunicorn worker) is called after it.
+
+        Note:
+            The signal handlers can be set only in the main thread, otherwise nothing is done.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            logger.warning('The graceful shutdown is not installed outside the main thread.')
+            return
+        previous_handler = signal.getsignal(signal.SIGTERM)
+
+        def handle_sigterm(signum, frame):
+            self.start_drain()
+            if callable(previous_handler):
+                previous_handler(signum, frame)
+            elif previous_handler == signal.SIG_DFL:
+                raise SystemExit(128 + signum)
+
+        signal.signal(signal.SIGTERM, handle_sigterm)
+
+    def start_drain(self) -> None:
+        """Starts rejecting the new updates and drains the updates in processing in the background."""
+        if self._draining.is_set():
+            return
+        self._draining.set()
+        logger.info(f'Shutting down, {self._in_flight} updates are in processing.')
+        # Not the daemon, so the interpreter waits for the drain before exiting
+        threading.Thread(target=self.drain, name='graceful_shutdown', daemon=False).start()
+
+    def drain(self, timeout: Optional[float] = None) -> List[int]:
+        """
+        Waits for the updates in processing, flushes the buffered events and closes the journal.
+
+        Args:
+            timeout: how long to wait, ``drain_seconds`` by default.
+        Returns:
+            the ids of the updates, which processing wasn't finished in time.
+        """
+        deadline = time.monotonic() + (self.drain_seconds if timeout is None else timeout)
+        with self._condition:
+            while self._in_flight > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+        unfinished = self.journal.pending if self._journal_opened else []
+        for update_id in unfinished:
+            # The redelivered copy must be processed, if the journal doesn't survive the restart
+            update_deduplicator.release(update_id)
+        if unfinished:
+            logger.warning(f'{len(unfinished)} updates were not processed in time, they are kept in the journal.')
+
+        event_log.flush()
+        if self._journal_opened:
+            self.journal.close()
+        logger.info('The updates are drained.')
+        return unfinished
+
+
+graceful_shutdown = GracefulShutdown(UpdateJournal(UPDATE_JOURNAL_DIR))
+"""The graceful shutdown of the worker."""
+
+__all__ = [
+    'GracefulShutdown',
+    'graceful_shutdown'
+]
@@ -0,0 +1,110 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""This module contains the functions that handle the commands available only to the admin of the bot."""
+
+import html
+import io
+import logging
+from typing import Any, List
+
+from telegram import Update, ParseMode
+from telegram.constants import MAX_MESSAGE_LENGTH
+from telegram.ext import CallbackContext
+
+import app_logging
+from app_logging.handler_logging import log_command
+from app_logging.metrics import metrics
+from bot.chat_type_accepted import admin_only_handler
+from bot.profiler import update_profiler
+
+
+# Registering logger here
+logger: logging.Logger = app_logging.get_logger(__name__)
+
+PROFILE_DEFAULT_UPDATES = 100
+"""The number of the updates, profiled by the '/profile' command without arguments."""
+PROFILE_DEFAULT_SECONDS = 60
+"""The maximum duration (in seconds) of the profiling, started by the '/profile' command without arguments."""
+PROFILE_MAX_UPDATES = 10000
+PROFILE_MAX_SECONDS = 60 * 60
+DIAG_TOP_KEYS = 5
+"""The number of the largest keys, shown for the counters split by the keys (e.g. by the chats)."""
+
+_profile_usage = ('Usage: /profile [<updates>] [<seconds>s] — profiles the next updates and sends the report.\n'
+                  '/profile stop — stops the profiling and sends the report now.\n'
+                  f'Default: {PROFILE_DEFAULT_UPDATES} updates or {PROFILE_DEFAULT_SECONDS}s.')
+
+
+@log_command('profile')
+@admin_only_handler
+def profile_command(update: Update, context: CallbackContext):
+    """
+    Handler for '/profile [<updates>] [<seconds>s]' and '/profile stop' commands.
+
+    Profiles the processing of the next updates (see ``bot.profiler``), the report is sent to the admin,
+    when the number of the updates or the time is reached.
+    """
+    if context.args == ['stop']:
+        if not update_profiler.stop():
+            update.effective_message.reply_text('The profiler is not running.')
+        return
+
+    max_updates, max_seconds = PROFILE_DEFAULT_UPDATES, PROFILE_DEFAULT_SECONDS
+    for arg in context.args:
+        if arg.isdigit():
+            max_updates = int(arg)
+        elif arg.endswith('s') and arg[:-1].isdigit():
+            max_seconds = int(arg[:-1])
+        else:
+            update.effective_message.reply_text(_profile_usage)
+            return
+    if not 0 < max_updates <= PROFILE_MAX_UPDATES or not 0 < max_seconds <= PROFILE_MAX_SECONDS:
+        update.effective_message.reply_text(_profile_usage)
+        return
+
+    # The report is sent to the private chat with the admin, even if the command was sent in the group
+    if update_profiler.start(context.dispatcher, update.effective_user.id, max_updates, max_seconds):
+        update.effective_message.reply_text(f'Profiling the next {max_updates} updates or {max_seconds}s.')
+    else:
+        update.effective_message.reply_text('The profiler is already running, use /profile stop to stop it.')
+
+
+@log_command('diag')
+@admin_only_handler
+def diag_command(update: Update, context: CallbackContext):
+    """
+    Handler for '/diag' command.
+
+    Sends the current values of all metrics and gauges, published to the ``app_logging.metrics`` registry
+    (the DB pool and sessions, the updates in flight, the Telegram connection pool, the caches,
+    the buffer of the log records, the memory, the threads and the uptime of the process).
+    """
+    text = '\n'.join(_format_metrics(metrics.snapshot()))
+    message = f'<pre>{html.escape(text)}</pre>'
+    if len(message) <= MAX_MESSAGE_LENGTH:
+        update.effective_message.reply_text(message, parse_mode=ParseMode.HTML)
+    else:
+        update.effective_message.reply_document(io.BytesIO(text.encode()), filename='diag.txt')
+
+
+def _format_metrics(values: Any, indent: int = 0) -> List[str]:
+    """Formats the snapshot of the metrics as the indented lines, sorted by the names."""
+    lines = []
+    for name, value in sorted(values.items(), key=lambda item: str(item[0])):
+        prefix = ' ' * indent + f'{name}:'
+        if isinstance(value, dict) and 'by_key' in value:
+            # The counter split by the keys, only the largest keys are shown
+            top = sorted(value['by_key'].items(), key=lambda item: item[1], reverse=True)[:DIAG_TOP_KEYS]
+            lines.append(f'{prefix} {value["total"]} ({len(value["by_key"])} keys)')
+            lines.extend(' ' * (indent + 2) + f'{key}: {count}' for key, count in top)
+        elif isinstance(value, dict):
+            lines.append(prefix)
+            lines.extend(_format_metrics(value, indent + 2))
+        else:
+            lines.append(f'{prefix} {value}')
+    return lines
+
+
+__all__ = [
+    'profile_command',
+    'diag_command'
+]
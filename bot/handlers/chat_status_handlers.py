@@ -2,20 +2,33 @@
 """This module contains the functions that handle joining and leaving from the chat."""
 
 import logging
+from typing import Optional
 
 from sqlalchemy.exc import IntegrityError
-from telegram import Update, User
+from telegram import Update, User, Chat as TelegramChat
 from telegram.error import Unauthorized
 from telegram.ext import CallbackContext
 
 import app_logging
+from app_logging.metrics import metrics
+from bot.cache import LRUCache
+from bot.language import forget_chat_language
 from sql import create_session
 from sql.domain import *
+from sql.repository import ChatRepository
 
 
 # Registering logger here
 logger: logging.Logger = app_logging.get_logger(__name__)
 
+MEMBER_COUNT_TTL = 6 * 60 * 60
+"""How long (in seconds) the number of the chat members, received from Telegram, is trusted."""
+ALONE_SUSPECT_THRESHOLD = 2
+"""If the cached number of the members is not greater than this value, it is checked by Telegram API."""
+
+# chat_id -> the number of the members, tracked by the join/leave events
+_member_counts = LRUCache('member_counts', maxsize=10000, ttl=MEMBER_COUNT_TTL)
+
 
 def __save_chat_to_db(chat_id: int, chat_title: str):
     """
@@ -75,6 +88,11 @@ def new_group_member_handler(update: Update, context: CallbackContext):
     if is_me:
         logger.info(f'Joined to chat with id({chat_id}).')
         __save_chat_to_db(chat_id, update.effective_chat.title)
+    else:
+        members_count = _member_counts.get(chat_id)
+        if members_count is not None:
+            _member_counts.set(chat_id, members_count + len(update.effective_message.new_chat_members),
+                               refresh_ttl=False)
 
 
 def left_group_member_handler(update: Update, context: CallbackContext):
@@ -94,12 +112,12 @@ def left_group_member_handler(update: Update, context: CallbackContext):
     is_me = update.effective_message.left_chat_member.id == context.bot.id
     chat_id = update.effective_chat.id
 
-    # If the bot was kicked from the chat, he can't get the number of the members left
-    try:
-        members_left = update.effective_chat.get_members_count()
-    except Unauthorized as e:
-        logger.warning(f'Cannot get the number of the members left int chat({chat_id}): {e}')
+    if is_me:
+        # If the bot was kicked from the chat, he can't get the number of the members left
+        _member_counts.pop(chat_id)
         members_left = None
+    else:
+        members_left = __get_members_left(update.effective_chat)
 
     logger.info(f"left member: "
                 f"\n\tis_me: {is_me}"
@@ -114,8 +132,10 @@ def left_group_member_handler(update: Update, context: CallbackContext):
         else:
             logger.info(f"Removed from chat_id {chat_id}")
 
+        _member_counts.pop(chat_id)
+        forget_chat_language(chat_id)
         session = create_session()
-        chat = session.query(Chat).filter(Chat.chat_id == chat_id).first()
+        chat = ChatRepository(session).get(chat_id)
         if chat is None:
             logger.warning(f"Expected the chat(id={chat_id}) was in DB, but it wasn't found.")
             return
@@ -125,6 +145,36 @@ def left_group_member_handler(update: Update, context: CallbackContext):
             logger.info(f"Chat removed from DB ({chat.chat_id})")
 
 
+def __get_members_left(chat: TelegramChat) -> Optional[int]:
+    """
+    Returns the number of the members left in the chat after someone has left it.
+
+    The number is tracked in the ``_member_counts`` cache by the join/leave events.
+    Telegram API is called only when the cached value is missing or expired,
+    or when it suggests that the bot may be alone in the chat.
+
+    Returns:
+        the number of the members or ``None``, if it cannot be received.
+    """
+    members_left = _member_counts.get(chat.id)
+    if members_left is not None:
+        members_left -= 1
+        if members_left > ALONE_SUSPECT_THRESHOLD:
+            _member_counts.set(chat.id, members_left, refresh_ttl=False)
+            return members_left
+
+    try:
+        members_left = chat.get_members_count()
+        metrics.increment('member_count_api_calls')
+    except Unauthorized as e:
+        logger.warning(f'Cannot get the number of the members left int chat({chat.id}): {e}')
+        _member_counts.pop(chat.id)
+        return None
+
+    _member_counts.set(chat.id, members_left)
+    return members_left
+
+
 # noinspection PyUnusedLocal
 def group_migrated_handler(update: Update, context: CallbackContext):
     """
@@ -155,13 +205,16 @@ def group_migrated_handler(update: Update, context: CallbackContext):
                     f'to supergroup(id={update.effective_chat.id})')
 
         session = create_session()
-        chat = session.query(Chat).filter(Chat.chat_id == update.effective_message.migrate_from_chat_id).first()
+        chat = ChatRepository(session).get(update.effective_message.migrate_from_chat_id)
         if chat is None:
             __save_chat_to_db(update.effective_chat.id, update.effective_chat.title)
         else:
             chat.chat_id = update.effective_chat.id
             session.commit()
             logger.info(f'Updated chat_id for chat({update.effective_chat.id})')
+        _member_counts.pop(update.effective_message.migrate_from_chat_id)
+        forget_chat_language(update.effective_message.migrate_from_chat_id)
+        forget_chat_language(update.effective_chat.id)
 
 
 __all__ = [
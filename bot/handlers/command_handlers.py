@@ -2,18 +2,24 @@
 """This module contains the functions that handle all commands supported by the bot."""
 
 import logging
+from datetime import datetime, timedelta
+from functools import partial
 from typing import Optional, List, Callable, Any
 
-from sqlalchemy import text
-from sqlalchemy.orm import joinedload
-from sqlalchemy.sql.elements import TextClause
-from telegram import Update
+from sqlalchemy.orm.exc import StaleDataError
+from telegram import Update, ChatMember, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.error import BadRequest
 from telegram.ext import CallbackContext
 
 import app_logging
 from app_logging.handler_logging import log_command
 from bot.chat_type_accepted import group_only_handler
+from bot.concurrency import retry_on_conflict, run_with_conflict_retry
+from bot.deadline import defer, has_budget_for
+from bot.membership_batcher import MembershipBatcher
+from bot.queue_messages import find_queue_by_message, remember_message
+from bot.language import get_language, get_chat_language
+from localization.catalog import DEFAULT_LANGUAGE
 from localization.replies import (
     start_message_private, start_message_chat,
     unknown_command, unimplemented_command,
@@ -23,17 +29,41 @@ from localization.replies import (
     unexpected_error, delete_queue_empty_name, queue_not_exist, deleted_queue_message, show_queues_message_empty,
     show_queues_message, command_empty_queue_name, show_queue_members, already_in_the_queue, no_rights_to_pin_message,
     not_in_the_queue_yet, cannot_skip, next_reached_queue_end, next_member_notify, reply_to_wrong_message_message,
-    no_rights_to_unpin_message, notify_all_disabled_message, notify_all_enabled_message
+    no_rights_to_unpin_message, notify_all_disabled_message, notify_all_enabled_message,
+    auto_next_usage, auto_next_enabled_message, auto_next_disabled_message,
+    my_position_message, my_position_reached, priority_usage, priority_set_message, priority_set_for_member_message,
+    priority_admins_only, priority_member_not_in_queue
 )
 from sql import create_session
+from sql.replica import create_read_session
+from sql.repository import QueueRepository, ChatRepository, MemberRecord
 from sql.domain import *
+from sql.event_log import event_log
 
 
 # Registering logger here
 logger: logging.Logger = app_logging.get_logger(__name__)
 
-
-def __insert_queue_from_context(on_no_queue_log: str, on_not_exist_log: str, on_no_queue_reply: dict):
+AUTO_NEXT_MAX_MINUTES = 24 * 60
+"""The maximum number of minutes, that could be set in the '/auto_next' command."""
+MAX_PRIORITY = 9
+"""The maximum priority of the member, that could be set in the '/priority' command."""
+REMINDER_LEAD_MINUTES = 5
+"""How many minutes before moving the queue automatically the next member is reminded."""
+STATISTICS_EWMA_ALPHA = 0.3
+"""The weight of the latest value in the exponentially weighted means of the queue statistics."""
+MAX_TURN_INTERVAL = 2 * 60 * 60
+"""The longer interval (in seconds) between the '/next' calls is a break, not a turn, and is ignored."""
+SHOW_QUEUES_PAGE_SIZE = 10
+"""The number of queues on one page of the '/show_queues' message."""
+SHOW_QUEUES_CALLBACK_PREFIX = 'show_queues:'
+"""The prefix of the callback data of the page buttons, followed by the number of the page."""
+SHOW_QUEUES_CALLBACK_PATTERN = rf'^{SHOW_QUEUES_CALLBACK_PREFIX}\d+$'
+"""The pattern of the callback data, handled by ``show_queues_page_callback``."""
+
+
+def __insert_queue_from_context(on_no_queue_log: str, on_not_exist_log: str, on_no_queue_reply: Callable[..., dict],
+                                read_only: bool = False):
     """
     Decorator function.
 
@@ -41,7 +71,7 @@ def __insert_queue_from_context(on_no_queue_log: str, on_not_exist_log: str, on_
     or using the name specified in the command args.
 
     * If the user replied to the message not generated for the queue
-    (stored as ``message_id_to_edit`` in the :class:`Queue` class),
+    (see ``bot.queue_messages``),
     the bot will reply with ``reply_to_wrong_message_message``.
 
     * If the user specified nonexistent name in command args,
@@ -56,8 +86,10 @@ def __insert_queue_from_context(on_no_queue_log: str, on_not_exist_log: str, on_
 
     :param on_no_queue_log: given message will be logged, if the <b>third</b> condition is met
     :param on_not_exist_log: given message will be logged, if the <b>second</b> condition is met
-    :param on_no_queue_reply: if the third condition is met, the bot will reply with this message.
-    Have to be in the format, used in ``replies`` module.
+    :param on_no_queue_reply: if the third condition is met, the bot will reply with the message,
+    returned by this function. Have to be the function from ``replies`` module, accepting the ``lang`` argument.
+    :param read_only: if ``True``, the queue is read from the replica (see ``sql.replica``),
+    so the decorated function must not change it in DB.
 
     See Also:
         bot.localization.replies
@@ -67,41 +99,34 @@ def __insert_queue_from_context(on_no_queue_log: str, on_not_exist_log: str, on_
             command_handler_function: Callable[[Update, CallbackContext, Queue], Any]):
         def insert_queue_from_context_wrapper(update: Update, context: CallbackContext):
             chat_id = update.effective_chat.id
+            lang = get_language(update)
             queue: Optional[Queue] = None
 
-            session = create_session()
+            queues = QueueRepository(create_read_session(chat_id) if read_only else create_session())
             # Trying to get the queue from message_id, that user replied to.
             if update.effective_message.reply_to_message:
                 replied_message_id = update.effective_message.reply_to_message.message_id
                 logger.info(f'Replied to message({replied_message_id})')
-                queue = (session
-                         .query(Queue)
-                         .filter(Queue.chat_id == chat_id, Queue.message_id_to_edit == replied_message_id)
-                         .options(joinedload(Queue.members))
-                         .first())
+                queue = find_queue_by_message(queues, chat_id, replied_message_id)
                 # User replied to the wrong message (not with members) or to deleted queue.
                 if not queue:
                     logger.info('Replied to wrong message or to the deleted queue.')
-                    update.effective_message.reply_text(**reply_to_wrong_message_message())
+                    update.effective_message.reply_text(**reply_to_wrong_message_message(lang=lang))
 
             # User didn't reply to the message or replied to the wrong message.
             # Checks if there name specified in command arguments.
             queue_name = ' '.join(context.args)
             if context.args and not queue:
-                queue = (session
-                         .query(Queue)
-                         .filter(Queue.chat_id == chat_id, Queue.name == queue_name)
-                         .options(joinedload(Queue.members))
-                         .first())
+                queue = queues.find_by_name(chat_id, queue_name)
             if queue:
                 return command_handler_function(update, context, queue)
             # The name was specified but queue with this name wasn't found in DB
             elif not queue and context.args:
                 logger.info(on_not_exist_log)
-                update.effective_message.reply_text(**queue_not_exist(queue_name=queue_name))
+                update.effective_message.reply_text(**queue_not_exist(queue_name=queue_name, lang=lang))
             else:
                 logger.info(on_no_queue_log)
-                update.effective_message.reply_text(**on_no_queue_reply)
+                update.effective_message.reply_text(**on_no_queue_reply(lang=lang))
 
         return insert_queue_from_context_wrapper
 
@@ -116,16 +141,18 @@ def start_command(update: Update, context: CallbackContext):
     and ``bot.constants.start_message_chat`` in groups, public chats, ets.
     """
     chat_type = update.message.chat.type
+    lang = get_language(update)
     if chat_type == 'private':
         logger.info(f'Started private chat with user:\n\t{update.effective_user}')
         update.effective_message.reply_text(
-            **start_message_private(fullname=update.message.from_user.full_name)
+            **start_message_private(fullname=update.message.from_user.full_name, lang=lang)
         )
     else:
         logger.info(f'Start command in group: \n\t{update.effective_chat}')
         update.effective_message.reply_text(
             **start_message_chat(fullname=update.message.from_user.full_name,
-                                 user_id=update.message.from_user.id)
+                                 user_id=update.message.from_user.id,
+                                 lang=lang)
         )
 
 
@@ -135,39 +162,42 @@ def create_queue_command(update: Update, context: CallbackContext):
     """Handler for '/create_queue <queue_name>' command"""
 
     chat_id = update.effective_chat.id
+    lang = get_language(update)
     queue_name = ' '.join(context.args)
     if not queue_name:
         logger.info("Creation a queue with empty name.")
-        update.effective_chat.send_message(**create_queue_empty_name())
+        update.effective_chat.send_message(**create_queue_empty_name(lang=lang))
     else:
         session = create_session()
-        count = session.query(Queue).filter(Queue.chat_id == chat_id, Queue.name == queue_name).count()
-        if count == 1:
+        if QueueRepository(session).exists(chat_id, queue_name):
             logger.info("Creating a queue with an existing name")
             update.effective_chat.send_message(
-                **create_queue_exist(queue_name=queue_name)
+                **create_queue_exist(queue_name=queue_name, lang=lang)
             )
         else:
             queue = Queue(name=queue_name, chat_id=chat_id)
-            message = update.effective_chat.send_message(**show_queue_members(queue_name))
+            message = update.effective_chat.send_message(**show_queue_members(queue_name, lang=__chat_language(chat_id)))
             try:
                 queue.message_id_to_edit = message.message_id
 
                 session.add(queue)
+                session.flush()
+                remember_message(chat_id, message.message_id, queue.queue_id, session=session)
                 session.commit()
                 logger.info(f"New queue created: \n\t{queue}")
-
-                # Checking if the bot has rights to pin the message.
-                if context.bot.get_chat_member(chat_id, context.bot.id).can_pin_messages:
-                    if queue.chat.notify:
-                        message.pin()
-                # If the message should be pinned, but the bot hasn't got rights.
-                elif queue.chat.notify:
-                    update.effective_chat.send_message(**no_rights_to_pin_message())
+                event_log.record(queue.queue_id, chat_id, update.effective_user.id, QueueEvent.CREATED)
+
+                if queue.chat.notify:
+                    pin = partial(__pin_queue_message, message, lang, context.bot)
+                    # Pinning could wait, when the budget of the update is nearly used up
+                    if has_budget_for():
+                        pin()
+                    else:
+                        defer('pin', queue.queue_id, pin)
             except Exception as e:
                 logger.exception(f"ERROR when creating queue: \n\t{queue} "
                                  f"with message: \n{e}")
-                update.effective_chat.send_message(**unexpected_error())
+                update.effective_chat.send_message(**unexpected_error(lang=lang))
                 message.delete()
 
 
@@ -177,31 +207,51 @@ def delete_queue_command(update: Update, context: CallbackContext):
     """Handler for '/delete_queue <queue_name>' command"""
 
     chat_id = update.effective_chat.id
+    lang = get_language(update)
     queue_name = ' '.join(context.args)
     if not queue_name:
         logger.info("Deletion a queue with empty name.")
-        update.effective_chat.send_message(**delete_queue_empty_name())
+        update.effective_chat.send_message(**delete_queue_empty_name(lang=lang))
     else:
         session = create_session()
-        queue: Queue = session.query(Queue).filter(Queue.chat_id == chat_id, Queue.name == queue_name).first()
+        queue: Queue = QueueRepository(session).find_by_name(chat_id, queue_name)
         if queue is None:
             logger.info("Deletion nonexistent queue.")
-            update.effective_chat.send_message(**queue_not_exist(queue_name=queue_name))
+            update.effective_chat.send_message(**queue_not_exist(queue_name=queue_name, lang=lang))
         else:
             session.delete(queue)
             session.commit()
             logger.info(f"Deleted queue: \n\t{queue}")
-            update.effective_chat.send_message(**deleted_queue_message())
-
-            if context.bot.get_chat_member(chat_id, context.bot.id).can_pin_messages:
-                try:
-                    context.bot.unpin_chat_message(chat_id, message_id=queue.message_id_to_edit)
-                except BadRequest as e:
-                    logger.warning(f"ERROR when tried to unpin "
-                                   f"message({queue.message_id_to_edit}) in queue({queue.queue_id}):\n\t"
-                                   f"{e}")
+            event_log.record(queue.queue_id, chat_id, update.effective_user.id, QueueEvent.DELETED)
+            update.effective_chat.send_message(**deleted_queue_message(lang=lang))
+
+            unpin = partial(__unpin_queue_message, queue, chat_id, lang, context.bot)
+            if has_budget_for():
+                unpin()
             else:
-                update.effective_chat.send_message(**no_rights_to_unpin_message())
+                defer('unpin', queue.queue_id, unpin)
+
+
+def __pin_queue_message(message, lang: str, bot):
+    chat_id = message.chat_id
+    # Checking if the bot has rights to pin the message.
+    if bot.get_chat_member(chat_id, bot.id).can_pin_messages:
+        message.pin()
+    # If the message should be pinned, but the bot hasn't got rights.
+    else:
+        bot.send_message(chat_id=chat_id, **no_rights_to_pin_message(lang=lang))
+
+
+def __unpin_queue_message(queue: Queue, chat_id: int, lang: str, bot):
+    if bot.get_chat_member(chat_id, bot.id).can_pin_messages:
+        try:
+            bot.unpin_chat_message(chat_id, message_id=queue.message_id_to_edit)
+        except BadRequest as e:
+            logger.warning(f"ERROR when tried to unpin "
+                           f"message({queue.message_id_to_edit}) in queue({queue.queue_id}):\n\t"
+                           f"{e}")
+    else:
+        bot.send_message(chat_id=chat_id, **no_rights_to_unpin_message(lang=lang))
 
 
 @log_command('show_queues')
@@ -210,13 +260,27 @@ def show_queues_command(update: Update, context: CallbackContext):
     """Handler for '/show_queues' command"""
 
     chat_id = update.effective_chat.id
-    session = create_session()
-    queues = session.query(Queue).filter(Queue.chat_id == chat_id).all()
-    if not queues:
-        update.effective_chat.send_message(**show_queues_message_empty())
+    lang = get_language(update)
+    reply = __show_queues_page(chat_id, 0, lang)
+    if reply is None:
+        update.effective_chat.send_message(**show_queues_message_empty(lang=lang))
     else:
-        queue_names = [queue.name for queue in queues]
-        update.effective_chat.send_message(**show_queues_message(queue_names))
+        update.effective_chat.send_message(**reply)
+
+
+@log_command('show_queues_page')
+def show_queues_page_callback(update: Update, context: CallbackContext):
+    """Handler for the buttons of the '/show_queues' message, that switch the pages."""
+    query = update.callback_query
+    lang = get_language(update)
+    page = int(query.data[len(SHOW_QUEUES_CALLBACK_PREFIX):])
+    reply = __show_queues_page(update.effective_chat.id, page, lang)
+    try:
+        query.edit_message_text(**(reply if reply is not None else show_queues_message_empty(lang=lang)))
+    except BadRequest as e:
+        # The button of the current page was pressed again, or the message was deleted
+        logger.info(f'Cannot switch the page of the queues list: {e}')
+    query.answer()
 
 
 @log_command('add_me')
@@ -224,40 +288,29 @@ def show_queues_command(update: Update, context: CallbackContext):
 @__insert_queue_from_context(
     on_no_queue_log='Adding to queue with empty name',
     on_not_exist_log='Adding to nonexistent queue.',
-    on_no_queue_reply=command_empty_queue_name(command_name='add_me')
+    on_no_queue_reply=partial(command_empty_queue_name, command_name='add_me')
 )
 def add_me_command(update: Update, context: CallbackContext, queue: Queue):
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
+    lang = get_language(update)
 
-    session = create_session()
-    member = (session
-              .query(QueueMember)
-              .filter(QueueMember.queue_id == queue.queue_id,
-                      QueueMember.user_id == user_id).first())
-    if member is not None:
+    # The concurrent joins to the queue are committed together
+    result = __membership_batcher.join(queue, user_id, update.effective_user.full_name)
+    if result.queue is None:
+        update.effective_message.reply_text(**queue_not_exist(queue_name=queue.name, lang=lang))
+        return
+    if result.member is None:
         logger.info("Already in the queue.")
-        update.effective_message.reply_text(**already_in_the_queue())
+        update.effective_message.reply_text(**already_in_the_queue(lang=lang))
         return
 
-    last_member: QueueMember = (
-        session
-            .query(QueueMember)
-            .filter(QueueMember.queue_id == queue.queue_id)
-            .order_by(QueueMember.user_order.desc())
-            .first()
-    )
-    if last_member is None:
-        user_order = 1
-    else:
-        user_order = last_member.user_order + 1
-    member = QueueMember(user_id=user_id, fullname=update.effective_user.full_name,
-                         user_order=user_order, queue_id=queue.queue_id)
-    session.add(member)
-    session.commit()
-    logger.info(f"Added member to queue: \n\t{member}")
+    logger.info(f"Added member to queue: \n\t{result.member}")
+    event_log.record(queue.queue_id, chat_id, user_id, QueueEvent.JOINED)
 
-    __edit_queue_members_message(queue, chat_id, context.bot)
+    # The message shows all members of the batch, so it's edited only once
+    if result.edit_message:
+        __edit_queue_members_message(result.queue, chat_id, context.bot)
 
 
 @log_command('remove_me')
@@ -265,120 +318,100 @@ def add_me_command(update: Update, context: CallbackContext, queue: Queue):
 @__insert_queue_from_context(
     on_no_queue_log='Removing from queue with empty name',
     on_not_exist_log='Removing from nonexistent queue',
-    on_no_queue_reply=command_empty_queue_name(command_name='remove_me')
+    on_no_queue_reply=partial(command_empty_queue_name, command_name='remove_me')
 )
 def remove_me_command(update: Update, context: CallbackContext, queue):
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
+    lang = get_language(update)
 
-    session = create_session()
-    member: QueueMember = (session
-                           .query(QueueMember)
-                           .filter(QueueMember.queue_id == queue.queue_id, QueueMember.user_id == user_id)
-                           .first())
-    if member is None:
+    # Moving up the members after the removed one (and the current position, if he was at or before it)
+    result = __membership_batcher.leave(queue, user_id)
+    if result.queue is None:
+        update.effective_message.reply_text(**queue_not_exist(queue_name=queue.name, lang=lang))
+    elif result.member is None:
         logger.info('Not yet in the queue')
-        update.effective_message.reply_text(**not_in_the_queue_yet())
+        update.effective_message.reply_text(**not_in_the_queue_yet(lang=lang))
     else:
-        # If it was the last member return turn to the previous one
-        last_member: QueueMember = (
-            session
-                .query(QueueMember)
-                .filter(QueueMember.queue_id == queue.queue_id)
-                .order_by(QueueMember.user_order.desc())
-                .first()
-        )
-        if queue.current_order == last_member.user_order:
-            queue.current_order = queue.current_order - 1
-            session.add(queue)
-            logger.info(f'Updated current_order in queue: \n\t{queue}')
-
-        session.delete(member)
-        # Updating user_order in queue_members table
-        # to move down all users with user_order greater than the value of deleted user
-        update_stmt: TextClause = text('UPDATE queue_member '
-                                       'SET user_order = user_order - 1 '
-                                       'WHERE user_order > :deleted_user_order;')
-        session.execute(update_stmt, {'deleted_user_order': member.user_order})
-
-        session.commit()
-
         logger.info(f'User removed from queue (queue_id={queue.queue_id})')
-        logger.info(f'Updated user_order in queue({queue.queue_id}) for users(order>{member.user_order})')
+        event_log.record(queue.queue_id, chat_id, user_id, QueueEvent.LEFT)
+        logger.info(f'Updated user_order in queue({queue.queue_id}) for users(order>{result.member.user_order})')
 
-        __edit_queue_members_message(queue, chat_id, context.bot)
+        if result.edit_message:
+            __edit_queue_members_message(result.queue, chat_id, context.bot)
 
 
 @log_command('skip_me')
 @group_only_handler
+@retry_on_conflict
 @__insert_queue_from_context(
     on_no_queue_log='Skipping with empty name',
     on_not_exist_log='Skipping turn from the nonexistent queue.',
-    on_no_queue_reply=command_empty_queue_name('skip_me')
+    on_no_queue_reply=partial(command_empty_queue_name, command_name='skip_me')
 )
 def skip_me_command(update: Update, context: CallbackContext, queue):
     chat_id = update.effective_chat.id
+    lang = get_language(update)
     session = create_session()
+    queues = QueueRepository(session)
 
-    member: QueueMember = (
-        session
-            .query(QueueMember)
-            .filter(QueueMember.queue_id == queue.queue_id,
-                    QueueMember.user_id == update.effective_user.id)
-            .first())
+    # The member is read after the queue is locked, so nobody shifts him until the commit
+    queue = queues.lock(queue)
+    member: QueueMember = queues.find_member(queue.queue_id, update.effective_user.id)
     if member is None:
+        session.rollback()
         logger.info('Not yet in the queue')
-        update.effective_message.reply_text(**not_in_the_queue_yet())
+        update.effective_message.reply_text(**not_in_the_queue_yet(lang=lang))
     else:
-        next_member: QueueMember = (
-            session
-                .query(QueueMember)
-                .filter(QueueMember.queue_id == queue.queue_id, QueueMember.user_order == member.user_order + 1)
-                .first()
-        )
+        next_member: QueueMember = queues.swap_with_next(queue, member)
         if next_member is not None:
-            member.user_order = member.user_order + 1
-            next_member.user_order = next_member.user_order - 1
-            session.add_all([member, next_member])
+            __touch_queue(session, queue)
             session.commit()
             logger.info(f'Skip queue_member({member.user_id}) in the queue({queue.queue_id})')
+            event_log.record(queue.queue_id, chat_id, member.user_id, QueueEvent.SKIPPED)
 
             __edit_queue_members_message(queue, chat_id, context.bot)
         else:
+            session.rollback()
             logging.info(f'Cancel skipping because of no other members in queue({queue.queue_id})')
-            update.effective_message.reply_text(**cannot_skip())
+            update.effective_message.reply_text(**cannot_skip(lang=lang))
 
 
 @log_command('next')
 @group_only_handler
+@retry_on_conflict
 @__insert_queue_from_context(
     on_no_queue_log='Requested "next" with the empty queue name.',
     on_not_exist_log='Requested "next" with an nonexistent queue name.',
-    on_no_queue_reply=command_empty_queue_name('next')
+    on_no_queue_reply=partial(command_empty_queue_name, command_name='next')
 )
 def next_command(update: Update, context: CallbackContext, queue):
-    order = queue.current_order + 1
-    queue.current_order = order
+    advance_queue(queue, update.effective_chat.id, context.bot)
 
-    session = create_session()
-    member: QueueMember = (
-        session
-            .query(QueueMember)
-            .filter(QueueMember.queue_id == queue.queue_id, QueueMember.user_order == queue.current_order)
-            .first()
-    )
+
+@log_command('my_position')
+@group_only_handler
+@__insert_queue_from_context(
+    on_no_queue_log='Requested "my_position" command with the empty queue name',
+    on_not_exist_log='Requested "my_position" with an nonexistent queue name.',
+    on_no_queue_reply=partial(command_empty_queue_name, command_name='my_position'),
+    read_only=True
+)
+def my_position_command(update: Update, context: CallbackContext, queue):
+    """Handler for '/my_position <queue_name>' command. Estimates the waiting time from the queue statistics."""
+    lang = get_language(update)
+    member: MemberRecord = (QueueRepository(create_read_session(update.effective_chat.id))
+                            .find_member_record(queue.queue_id, update.effective_user.id))
     if member is None:
-        logger.info(f"Reached the end of the queue({queue.queue_id})")
-        update.effective_chat.send_message(**next_reached_queue_end())
+        logger.info('Not yet in the queue')
+        update.effective_message.reply_text(**not_in_the_queue_yet(lang=lang))
+    elif member.user_order <= queue.current_order:
+        update.effective_message.reply_text(**my_position_reached(queue.name, lang=lang))
     else:
-        logging.info(f'Next member: {member}')
-        update.effective_chat.send_message(**next_member_notify(member.fullname, member.user_id, queue.name))
-
-        session.merge(queue)
-        session.commit()
-        logger.info(f'Updated current_order: \n\t{queue}')
-
-        __edit_queue_members_message(queue, update.effective_chat.id, context.bot)
+        members_ahead = member.user_order - queue.current_order - 1
+        turn_minutes = __turn_minutes(queue)
+        eta_minutes = (members_ahead + 1) * turn_minutes if turn_minutes is not None else None
+        update.effective_message.reply_text(**my_position_message(queue.name, members_ahead, eta_minutes, lang=lang))
 
 
 @log_command('show_members')
@@ -386,27 +419,164 @@ def next_command(update: Update, context: CallbackContext, queue):
 @__insert_queue_from_context(
     on_no_queue_log='Requested "show_members" command with the empty queue name',
     on_not_exist_log='Requested "show_members" with an nonexistent queue name.',
-    on_no_queue_reply=command_empty_queue_name('show_members')
+    on_no_queue_reply=partial(command_empty_queue_name, command_name='show_members'),
+    read_only=True
 )
 def show_members_command(update: Update, context: CallbackContext, queue):
     __show_members(update.effective_chat.id, queue, context.bot)
 
 
+@log_command('auto_next')
+@group_only_handler
+def auto_next_command(update: Update, context: CallbackContext):
+    """
+    Handler for '/auto_next <minutes> <queue_name>' command.
+
+    Sets the number of minutes without activity, after which the queue will be moved to the next member
+    by the ``bot.scheduler``. The zero value disables the timer.
+    """
+    lang = get_language(update)
+    if not context.args or not context.args[0].isdigit() or int(context.args[0]) > AUTO_NEXT_MAX_MINUTES:
+        logger.info('Requested "auto_next" with the wrong number of minutes.')
+        update.effective_message.reply_text(**auto_next_usage(lang=lang))
+        return
+
+    minutes = int(context.args[0])
+    # The rest of the arguments is the queue name
+    context.args = context.args[1:]
+
+    def set_auto_next(_update: Update, _context: CallbackContext, queue: Queue):
+        def save_auto_next():
+            session = create_session()
+            stored_queue: Queue = QueueRepository(session).get(queue.queue_id)
+            stored_queue.auto_next_minutes = minutes or None
+            __schedule_queue_timer(stored_queue)
+            session.commit()
+            return stored_queue
+
+        stored = run_with_conflict_retry(save_auto_next, _update.effective_chat.id)
+        logger.info(f'Changed auto_next to {minutes} minutes in queue:\n\t{stored}')
+        if minutes:
+            _update.effective_message.reply_text(**auto_next_enabled_message(stored.name, minutes, lang=lang))
+        else:
+            _update.effective_message.reply_text(**auto_next_disabled_message(stored.name, lang=lang))
+
+    __insert_queue_from_context(
+        on_no_queue_log='Requested "auto_next" with the empty queue name.',
+        on_not_exist_log='Requested "auto_next" with an nonexistent queue name.',
+        on_no_queue_reply=auto_next_usage
+    )(set_auto_next)(update, context)
+
+
+@log_command('priority')
+@group_only_handler
+def priority_command(update: Update, context: CallbackContext):
+    """
+    Handler for '/priority <level> [user id] <queue_name>' command.
+
+    Moves the member, who is waiting for the turn, to the lane of the given priority:
+    after the members with the same or higher priority, before the members with the lower one.
+
+    Only the admins of the chat could set the priority. The admin chooses the member by replying
+    to his message or by his user id. Anyone could return himself to the usual order with the level 0.
+    """
+    chat_id = update.effective_chat.id
+    lang = get_language(update)
+    if not context.args or not context.args[0].isdigit() or int(context.args[0]) > MAX_PRIORITY:
+        logger.info('Requested "priority" with the wrong level.')
+        update.effective_message.reply_text(**priority_usage(MAX_PRIORITY, lang=lang))
+        return
+
+    priority = int(context.args[0])
+    # The rest of the arguments is the queue name, optionally preceded by the user id
+    context.args = context.args[1:]
+    target_id = update.effective_user.id
+    replied_message = update.effective_message.reply_to_message
+    # The reply to the message of the member (not to the message with the queue) chooses the member
+    replied_to_member = replied_message is not None and replied_message.from_user is not None \
+        and replied_message.from_user.id != context.bot.id
+    if replied_to_member:
+        target_id = replied_message.from_user.id
+    elif len(context.args) > 1 and context.args[0].isdigit() \
+            and QueueRepository(create_session()).exists(chat_id, ' '.join(context.args[1:])):
+        target_id = int(context.args[0])
+        context.args = context.args[1:]
+
+    is_self = target_id == update.effective_user.id
+    if not (is_self and priority == 0) and \
+            context.bot.get_chat_member(chat_id, update.effective_user.id).status not in (ChatMember.ADMINISTRATOR,
+                                                                                        ChatMember.CREATOR):
+        logger.info('Requested "priority" by not an admin.')
+        update.effective_message.reply_text(**priority_admins_only(lang=lang))
+        return
+
+    def set_priority(_update: Update, _context: CallbackContext, queue: Queue):
+        session = create_session()
+        queues = QueueRepository(session)
+        queue = queues.lock(queue)
+        member: QueueMember = queues.find_member(queue.queue_id, target_id)
+        if member is None or member.user_order <= queue.current_order:
+            # Nothing is changed, the lock of the queue is released
+            session.rollback()
+        if member is None:
+            logger.info('Not yet in the queue')
+            _update.effective_message.reply_text(**(not_in_the_queue_yet(lang=lang) if is_self
+                                                    else priority_member_not_in_queue(lang=lang)))
+        elif member.user_order <= queue.current_order:
+            _update.effective_message.reply_text(**(my_position_reached(queue.name, lang=lang) if is_self
+                                                    else priority_member_not_in_queue(lang=lang)))
+        else:
+            member = queues.set_priority(queue, member, priority)
+            __touch_queue(session, queue)
+            session.commit()
+            logger.info(f'Changed priority of the queue_member({member.user_id}) in the queue({queue.queue_id}) '
+                        f'to {priority}')
+
+            members_ahead = member.user_order - queue.current_order - 1
+            if is_self:
+                reply = priority_set_message(queue.name, priority, members_ahead, lang=lang)
+            else:
+                reply = priority_set_for_member_message(member.fullname, queue.name, priority, members_ahead,
+                                                        lang=lang)
+            _update.effective_message.reply_text(**reply)
+            __edit_queue_members_message(queue, chat_id, _context.bot)
+
+    def set_priority_in_named_queue(_update: Update, _context: CallbackContext):
+        queue_name = ' '.join(_context.args)
+        queue = QueueRepository(create_session()).find_by_name(chat_id, queue_name) if queue_name else None
+        if queue is not None:
+            set_priority(_update, _context, queue)
+        elif queue_name:
+            logger.info('Requested "priority" with an nonexistent queue name.')
+            _update.effective_message.reply_text(**queue_not_exist(queue_name=queue_name, lang=lang))
+        else:
+            logger.info('Requested "priority" with the empty queue name.')
+            _update.effective_message.reply_text(**priority_usage(MAX_PRIORITY, lang=lang))
+
+    # The queue is read again, if it was changed concurrently
+    retry_on_conflict(set_priority_in_named_queue if replied_to_member else __insert_queue_from_context(
+        on_no_queue_log='Requested "priority" with the empty queue name.',
+        on_not_exist_log='Requested "priority" with an nonexistent queue name.',
+        on_no_queue_reply=partial(priority_usage, MAX_PRIORITY)
+    )(set_priority))(update, context)
+
+
 @log_command('notify_all')
 @group_only_handler
 def notify_all_command(update: Update, context: CallbackContext):
     chat_id = update.effective_chat.id
+    lang = get_language(update)
     session = create_session()
-    chat: Chat = session.query(Chat).filter(Chat.chat_id == chat_id).first()
+    chat: Chat = ChatRepository(session).get(chat_id)
     if chat:
         if chat.notify:
             chat.notify = False
             session.commit()
-            update.effective_chat.send_message(**notify_all_disabled_message())
+            update.effective_chat.send_message(**notify_all_disabled_message(lang=lang))
         else:
             chat.notify = True
             session.commit()
-            update.effective_chat.send_message(**notify_all_enabled_message())
+            update.effective_chat.send_message(**notify_all_enabled_message(lang=lang))
         logger.info(f'Changed notify setting to {chat.notify} in chat({chat_id})')
     else:
         logging.error(f'Error fetching chat by chat_id({chat_id}) in active chat. '
@@ -417,37 +587,191 @@ def notify_all_command(update: Update, context: CallbackContext):
 @log_command('help')
 def help_command(update: Update, context: CallbackContext):
     """Handler for '/help' command"""
+    lang = get_language(update)
     if update.effective_chat.type == 'private':
-        update.effective_message.reply_text(**help_message_private())
+        update.effective_message.reply_text(**help_message_private(lang=lang))
     else:
-        update.effective_message.reply_text(**help_message_in_chat())
+        update.effective_message.reply_text(**help_message_in_chat(lang=lang))
 
 
 # noinspection PyUnusedLocal
 @log_command('about_me')
 def about_me_command(update: Update, context: CallbackContext):
     """Handler for '/info' command"""
-    update.effective_message.reply_text(**about_me_message())
+    lang = get_language(update)
+    update.effective_message.reply_text(**about_me_message(lang=lang))
 
 
 # noinspection PyUnusedLocal
 @log_command('unsupported_command')
 def unsupported_command_handler(update: Update, context: CallbackContext):
     """Handler for any command, which doesn't exist in the bot."""
-    update.effective_message.reply_text(**unknown_command())
+    lang = get_language(update)
+    update.effective_message.reply_text(**unknown_command(lang=lang))
 
 
 # noinspection PyUnusedLocal
 @log_command()
 def unimplemented_command_handler(update: Update, context: CallbackContext):
-    update.message.reply_text(**unimplemented_command())
+    lang = get_language(update)
+    update.message.reply_text(**unimplemented_command(lang=lang))
+
+
+def advance_queue(queue: Queue, chat_id: int, bot, notify_end: bool = True) -> bool:
+    """
+    Moves the queue to the next member, notifies him and edits the message with the queue.
+
+    It is used by the '/next' command and by the ``bot.scheduler``, when the queue timer is due.
+
+    Args:
+        queue: the queue to move.
+        chat_id: the id of the chat with the queue.
+        bot: the bot to send the messages with.
+        notify_end: whether to send ``next_reached_queue_end`` if there are no more members.
+    Returns:
+        ``True`` if the queue was moved, ``False`` if the end of the queue was reached.
+    """
+    lang = __chat_language(chat_id)
+
+    session = create_session()
+    queue, member = QueueRepository(session).advance(queue)
+    if member is None:
+        logger.info(f"Reached the end of the queue({queue.queue_id})")
+        if notify_end:
+            bot.send_message(chat_id=chat_id, **next_reached_queue_end(lang=lang))
+        return False
+
+    logging.info(f'Next member: {member}')
+    # Committing before notifying, so nobody is notified if the queue was changed concurrently
+    queue.last_activity_at = datetime.now()
+    __update_queue_statistics(queue, member, queue.last_activity_at)
+    __schedule_queue_timer(queue)
+    session.commit()
+    logger.info(f'Updated current_order: \n\t{queue}')
+    event_log.record(queue.queue_id, chat_id, member.user_id, QueueEvent.NEXT)
+
+    notification = bot.send_message(chat_id=chat_id,
+                                    **next_member_notify(member.fullname, member.user_id, queue.name, lang=lang))
+    # The member could reply to the notification, e.g. with '/remove_me'
+    if notification:
+        remember_message(chat_id, notification.message_id, queue.queue_id)
+
+    __edit_queue_members_message(queue, chat_id, bot)
+    return True
+
+
+def __show_queues_page(chat_id: int, page: int, lang: str) -> Optional[dict]:
+    """
+    Builds the page of the '/show_queues' message with the buttons to switch the pages.
+
+    Returns:
+        the arguments of the message, or ``None``, if there are no queues in the chat.
+        If the page doesn't exist anymore (e.g. the queues were deleted), the first page is returned.
+    """
+    queues = QueueRepository(create_read_session(chat_id))
+    summaries, total = queues.list_summaries(chat_id, page * SHOW_QUEUES_PAGE_SIZE, SHOW_QUEUES_PAGE_SIZE)
+    if not summaries and page > 0:
+        page = 0
+        summaries, total = queues.list_summaries(chat_id, 0, SHOW_QUEUES_PAGE_SIZE)
+    if not summaries:
+        return None
+
+    pages = -(-total // SHOW_QUEUES_PAGE_SIZE)
+    reply = show_queues_message(summaries, page, pages, lang=lang)
+    if pages > 1:
+        buttons = []
+        if page > 0:
+            buttons.append(InlineKeyboardButton('◀️', callback_data=f'{SHOW_QUEUES_CALLBACK_PREFIX}{page - 1}'))
+        if page < pages - 1:
+            buttons.append(InlineKeyboardButton('▶️', callback_data=f'{SHOW_QUEUES_CALLBACK_PREFIX}{page + 1}'))
+        reply['reply_markup'] = InlineKeyboardMarkup([buttons])
+    return reply
+
+
+def __chat_language(chat_id: int) -> str:
+    """Returns the language of the messages for the whole chat, like the messages with the queue members."""
+    return get_chat_language(chat_id) or DEFAULT_LANGUAGE
+
+
+def __queue_timer_due_times(auto_next_minutes: Optional[int]):
+    """Returns the due time of the queue timer and of the reminder counting from now (``None`` if disabled)."""
+    if not auto_next_minutes:
+        return None, None
+    next_due_at = datetime.now() + timedelta(minutes=auto_next_minutes)
+    # There is no sense to remind about the turn, if the whole timer is shorter than the reminder
+    reminder_due_at = (next_due_at - timedelta(minutes=REMINDER_LEAD_MINUTES)
+                       if auto_next_minutes > REMINDER_LEAD_MINUTES else None)
+    return next_due_at, reminder_due_at
+
+
+def __schedule_queue_timer(queue: Queue):
+    """Sets the due time of the queue timer (and the reminder), if the timer is enabled."""
+    queue.next_due_at, queue.reminder_due_at = __queue_timer_due_times(queue.auto_next_minutes)
+
+
+def __touch_queue(session, queue: Queue, **values):
+    """
+    Marks the activity in the queue: updates ``last_activity_at`` and restarts the queue timer, if enabled.
+
+    Note:
+        Executed as a separate UPDATE statement, so the version of the queue isn't changed
+        and the concurrent changes of ``current_order`` are not reported as conflicts.
+
+    Args:
+        session: the session to execute the statement in.
+        queue: the queue to update.
+        values: other columns to update in the same statement.
+    """
+    values['last_activity_at'] = datetime.now()
+    if queue.auto_next_minutes:
+        values['next_due_at'], values['reminder_due_at'] = __queue_timer_due_times(queue.auto_next_minutes)
+    session.execute(Queue.__table__.update()
+                    .where(Queue.__table__.c.queue_id == queue.queue_id)
+                    .values(**values))
+
+
+def __touch_queue_after_batch(session, queue: Queue, left_before_turn: int):
+    """Marks the activity in the queue after the batch of the joins and leaves, counting the left members."""
+    if left_before_turn:
+        __touch_queue(session, queue, left_count=Queue.__table__.c.left_count + left_before_turn)
+    else:
+        __touch_queue(session, queue)
+
+
+__membership_batcher = MembershipBatcher(__touch_queue_after_batch)
+
+
+def __ewma(mean: Optional[float], value: float) -> float:
+    return value if mean is None else STATISTICS_EWMA_ALPHA * value + (1 - STATISTICS_EWMA_ALPHA) * mean
+
+
+def __update_queue_statistics(queue: Queue, served_member: MemberRecord, now: datetime):
+    """
+    Updates the running statistics of the queue in O(1), when the turn of the ``served_member`` has come.
+
+    The statistics is used to estimate the waiting time without scanning the history of the queue.
+    """
+    if queue.last_next_at is not None:
+        interval = (now - queue.last_next_at).total_seconds()
+        if interval <= MAX_TURN_INTERVAL:
+            queue.next_interval_ewma = __ewma(queue.next_interval_ewma, interval)
+    queue.last_next_at = now
+    queue.served_count = (queue.served_count or 0) + 1
+    if served_member.joined_at is not None:
+        queue.wait_time_ewma = __ewma(queue.wait_time_ewma, (now - served_member.joined_at).total_seconds())
+
+
+def __turn_minutes(queue: Queue) -> Optional[float]:
+    """Returns the estimated duration of one turn in minutes, ``None`` if it is unknown yet."""
+    return queue.next_interval_ewma / 60 if queue.next_interval_ewma is not None else None
 
 
 def __show_members(chat_id: int, queue: Queue, bot):
     member_names = __get_queue_members(queue)
     message = bot.send_message(
         chat_id=chat_id,
-        **show_queue_members(queue.name, member_names, queue.current_order)
+        **show_queue_members(queue.name, member_names, queue.current_order, __turn_minutes(queue),
+                             lang=__chat_language(chat_id))
     )
     if message:
         try:
@@ -456,33 +780,45 @@ def __show_members(chat_id: int, queue: Queue, bot):
             logger.exception(f'Error when deleting the previously sent message: {e}')
         queue.message_id_to_edit = message.message_id
 
-        session = create_session()
-        session.add(queue)
-        session.commit()
+        def save_message_id():
+            # The queue is read again, so the retry after the conflict doesn't overwrite the concurrent changes
+            session = create_session()
+            stored_queue: Queue = QueueRepository(session).get(queue.queue_id)
+            if stored_queue is not None:
+                stored_queue.message_id_to_edit = message.message_id
+                remember_message(chat_id, message.message_id, stored_queue.queue_id, session=session)
+                session.commit()
+            return stored_queue
 
-        logger.info(f'Updated message_to_edit_id in queue:\n\t{queue}')
+        # The changes of the queue are already committed, so the conflict must not reach the retry of the handler,
+        # that would apply them again. The new message just isn't edited then.
+        try:
+            stored = run_with_conflict_retry(save_message_id, chat_id)
+        except StaleDataError as e:
+            logger.error(f'Could not save message_to_edit_id={message.message_id} '
+                         f'of the queue({queue.queue_id}): {e}')
+        else:
+            logger.info(f'Updated message_to_edit_id in queue:\n\t{stored}')
 
 
 def __get_queue_members(queue: Queue) -> List[str]:
-    session = create_session()
-    members = (session
-               .query(QueueMember)
-               .filter(QueueMember.queue_id == queue.queue_id)
-               .order_by(QueueMember.user_order)
-               .all()
-               )
-    member_names = [member.fullname for member in members]
-    return member_names
+    # Right after the change of the queue the members are read from the primary DB (read-your-writes)
+    return QueueRepository(create_read_session(queue.chat_id)).list_member_names(queue.queue_id)
 
 
 def __edit_queue_members_message(queue: Queue, chat_id: int, bot):
+    if not has_budget_for():
+        # The message is edited after the update, the latest state of the queue is shown then
+        defer('edit', queue.queue_id, partial(__edit_stored_queue_members_message, queue.queue_id, chat_id, bot))
+        return
     member_names = __get_queue_members(queue)
 
     try:
         bot.edit_message_text(
             chat_id=chat_id,
             message_id=queue.message_id_to_edit,
-            **show_queue_members(queue.name, member_names, queue.current_order)
+            **show_queue_members(queue.name, member_names, queue.current_order, __turn_minutes(queue),
+                                 lang=__chat_language(chat_id))
         )
     except BadRequest as e:
         logger.exception(f'ERROR when editing the message({queue.message_id_to_edit}) for queue({queue.queue_id}): \n\t'
@@ -493,17 +829,33 @@ def __edit_queue_members_message(queue: Queue, chat_id: int, bot):
     logger.info(f'Edited message: chat_id={chat_id}, message_id={queue.message_id_to_edit}')
 
 
+def __edit_stored_queue_members_message(queue_id: int, chat_id: int, bot):
+    try:
+        queue = QueueRepository(create_session()).get(queue_id)
+        if queue is not None:
+            __edit_queue_members_message(queue, chat_id, bot)
+    finally:
+        # Called in the thread of the deferred calls, so its connection is released right away
+        create_session().close()
+
+
 __all__ = [
     'start_command',
     'create_queue_command',
     'delete_queue_command',
     'show_queues_command',
+    'show_queues_page_callback',
+    'SHOW_QUEUES_CALLBACK_PATTERN',
     'add_me_command',
     'remove_me_command',
     'skip_me_command',
     'next_command',
     'show_members_command',
+    'my_position_command',
     'notify_all_command',
+    'auto_next_command',
+    'priority_command',
+    'advance_queue',
     'help_command',
     'about_me_command',
     'unsupported_command_handler',
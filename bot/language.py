@@ -0,0 +1,101 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module chooses the language of the replies for the incoming update.
+
+The language set for the chat has the priority, then the language of the user's Telegram client is used.
+If neither of them is supported, the replies are sent in the ``DEFAULT_LANGUAGE``.
+
+Examples:
+    >>> update.effective_message.reply_text(**help_message_in_chat(lang=get_language(update)))
+"""
+from typing import Optional
+
+from sqlalchemy.orm import Session
+from telegram import Update
+
+from app_logging import get_logger
+from bot.cache import LRUCache
+from localization.catalog import DEFAULT_LANGUAGE
+from localization.replies import get_supported_languages
+from sql import get_engine
+from sql.domain import Chat
+
+
+logger = get_logger(__name__)
+
+CHAT_LANGUAGE_TTL = 60 * 60
+"""How long (in seconds) the language of the chat, read from DB, is cached."""
+
+# chat_id -> the language of the chat, or '' if it wasn't set
+_chat_languages = LRUCache('chat_languages', maxsize=10000, ttl=CHAT_LANGUAGE_TTL)
+
+
+def get_language(update: Update) -> str:
+    """
+    Returns the language of the replies for the ``update``.
+
+    Args:
+        update: the incoming update.
+    Returns:
+        the code of the supported language.
+    """
+    supported = get_supported_languages()
+    chat = update.effective_chat
+    if chat is not None and chat.type != 'private':
+        chat_language = get_chat_language(chat.id)
+        if chat_language is not None:
+            return chat_language
+
+    user = update.effective_user
+    if user is not None and user.language_code:
+        # Telegram sends the IETF tags, like 'en-US'
+        user_language = user.language_code.split('-')[0].lower()
+        if user_language in supported:
+            return user_language
+    return DEFAULT_LANGUAGE
+
+
+def get_chat_language(chat_id: int) -> Optional[str]:
+    """Returns the language set for the chat, or ``None``, if it wasn't set or isn't supported."""
+    language = _chat_languages.get(chat_id)
+    if language is None:
+        # The own short-lived session, so the scoped session of the caller isn't closed
+        session = Session(bind=get_engine())
+        try:
+            language = session.query(Chat.language).filter(Chat.chat_id == chat_id).scalar() or ''
+        finally:
+            session.close()
+        _chat_languages.set(chat_id, language)
+    return language if language in get_supported_languages() else None
+
+
+def set_chat_language(chat_id: int, language: Optional[str]) -> None:
+    """
+    Saves the language of the chat to DB and to the cache.
+
+    Args:
+        chat_id: the id of the chat.
+        language: the code of the language, or ``None`` to use the language of the users.
+    """
+    session = Session(bind=get_engine())
+    try:
+        session.query(Chat).filter(Chat.chat_id == chat_id).update({Chat.language: language},
+                                                                   synchronize_session=False)
+        session.commit()
+    finally:
+        session.close()
+    _chat_languages.set(chat_id, language or '')
+    logger.info(f'Language of the chat({chat_id}) is set to {language}.')
+
+
+def forget_chat_language(chat_id: int) -> None:
+    """Removes the language of the chat from the cache, e.g. when the chat was deleted or migrated."""
+    _chat_languages.pop(chat_id)
+
+
+__all__ = [
+    'get_language',
+    'get_chat_language',
+    'set_chat_language',
+    'forget_chat_language'
+]
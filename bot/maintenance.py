@@ -0,0 +1,161 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains the :class:`StaleDataCollector` class, that removes the abandoned chats and queues.
+
+The chats stay in DB forever, if the bot was removed from the group while it was down,
+or the ``left_chat_member`` update was lost. The queues, nobody has touched for months, only slow down
+the queries. Both are removed in the small batches, so the long locks are never held.
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import exists, and_, text
+from telegram import Bot
+from telegram.error import Unauthorized, BadRequest, TelegramError
+
+from app_logging import get_logger
+from app_logging.metrics import metrics
+from sql import create_session
+from sql.domain import *
+
+
+logger = get_logger(__name__)
+
+STALE_QUEUE_DAYS = 90
+"""The queues without any activity for this number of days are deleted."""
+STALE_CHAT_DAYS = 30
+"""The chats without active queues for this number of days are checked for the bot membership."""
+
+# The random number to not let several workers run the collection at the same time
+_ADVISORY_LOCK_ID = 7301542
+
+
+class StaleDataCollector:
+    """
+    Finds and deletes the stale queues and the chats, the bot is not a member of anymore.
+
+    Note:
+        Deleting the chat removes its queues and their members by the ``ON DELETE CASCADE`` foreign keys.
+    """
+
+    def __init__(self, bot: Bot, batch_size: int = 50, max_chat_checks: int = 200,
+                 api_calls_per_second: float = 5) -> None:
+        """
+        Args:
+            bot: the bot used to check its membership in the chats.
+            batch_size: the number of the rows deleted in one transaction.
+            max_chat_checks: the maximum number of the chats checked by Telegram API in one run.
+            api_calls_per_second: the rate limit for Telegram API calls.
+        """
+        self.bot = bot
+        self.batch_size = batch_size
+        self.max_chat_checks = max_chat_checks
+        self._api_call_interval = 1 / api_calls_per_second
+        self._last_api_call = 0.0
+        # The chats, the bot is still a member of, are skipped on the next run
+        self._chat_cursor = None
+
+    def run(self) -> Dict[str, int]:
+        """
+        Deletes the stale queues and chats. Called by the ``bot.scheduler`` periodically.
+
+        Returns:
+            the report with the number of the deleted queues and chats and the number of checked chats.
+        """
+        report = {'deleted_queues': 0, 'checked_chats': 0, 'deleted_chats': 0}
+        engine = create_session().bind
+        # The lock is held on the separate connection, since the sessions below are closed after each batch
+        lock_connection = engine.connect() if engine.dialect.name == 'postgresql' else None
+        try:
+            if lock_connection is not None and not lock_connection.execute(
+                    text('SELECT pg_try_advisory_lock(:id)'), id=_ADVISORY_LOCK_ID).scalar():
+                logger.info('Stale data collection is already running in another worker.')
+                lock_connection.close()
+                lock_connection = None
+                return report
+
+            report['deleted_queues'] = self._delete_stale_queues()
+            report['checked_chats'], report['deleted_chats'] = self._delete_stale_chats()
+        except Exception as e:
+            logger.exception(f'ERROR when collecting the stale data: {e}')
+        finally:
+            if lock_connection is not None:
+                lock_connection.execute(text('SELECT pg_advisory_unlock(:id)'), id=_ADVISORY_LOCK_ID)
+                lock_connection.close()
+
+        metrics.increment('gc_deleted_queues', value=report['deleted_queues'])
+        metrics.increment('gc_deleted_chats', value=report['deleted_chats'])
+        logger.info(f'Stale data collection finished: {report}')
+        return report
+
+    def _delete_stale_queues(self) -> int:
+        cutoff = datetime.now() - timedelta(days=STALE_QUEUE_DAYS)
+        deleted = 0
+        while True:
+            session = create_session()
+            queue_ids: List[int] = [row.queue_id for row in (
+                session
+                    .query(Queue.queue_id)
+                    .filter(Queue.last_activity_at < cutoff)
+                    .limit(self.batch_size)
+                    .all()
+            )]
+            if not queue_ids:
+                return deleted
+
+            session.execute(QueueMember.__table__.delete().where(QueueMember.__table__.c.queue_id.in_(queue_ids)))
+            session.execute(Queue.__table__.delete().where(Queue.__table__.c.queue_id.in_(queue_ids)))
+            session.commit()
+            deleted += len(queue_ids)
+            logger.info(f'Deleted stale queues: {queue_ids}')
+
+    def _delete_stale_chats(self):
+        cutoff = datetime.now() - timedelta(days=STALE_CHAT_DAYS)
+        session = create_session()
+        has_active_queues = exists().where(and_(Queue.chat_id == Chat.chat_id, Queue.last_activity_at >= cutoff))
+        query = session.query(Chat.chat_id).filter(Chat.created_at < cutoff, ~has_active_queues)
+        if self._chat_cursor is not None:
+            query = query.filter(Chat.chat_id > self._chat_cursor)
+        chat_ids: List[int] = [row.chat_id for row in query.order_by(Chat.chat_id).limit(self.max_chat_checks).all()]
+        # Starting from the beginning on the next run, when all candidates were checked
+        self._chat_cursor = chat_ids[-1] if len(chat_ids) == self.max_chat_checks else None
+        # Not keeping the transaction open while waiting for Telegram API
+        session.close()
+
+        to_delete = [chat_id for chat_id in chat_ids if not self._is_bot_member(chat_id)]
+        for i in range(0, len(to_delete), self.batch_size):
+            batch = to_delete[i:i + self.batch_size]
+            session = create_session()
+            session.execute(Chat.__table__.delete().where(Chat.__table__.c.chat_id.in_(batch)))
+            session.commit()
+            logger.info(f'Deleted chats, the bot is not a member of: {batch}')
+
+        return len(chat_ids), len(to_delete)
+
+    def _is_bot_member(self, chat_id: int) -> bool:
+        """
+        Checks by Telegram API, if the bot is still in the chat.
+
+        Note:
+            If the membership cannot be checked because of the unexpected error, the chat is considered active.
+        """
+        wait = self._last_api_call + self._api_call_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_api_call = time.monotonic()
+
+        try:
+            member = self.bot.get_chat_member(chat_id, self.bot.id)
+            return member.status not in ('left', 'kicked')
+        except (Unauthorized, BadRequest) as e:
+            logger.info(f'The bot is not a member of the chat({chat_id}): {e}')
+            return False
+        except TelegramError as e:
+            logger.warning(f'Cannot check the membership in the chat({chat_id}): {e}')
+            return True
+
+
+__all__ = [
+    'StaleDataCollector'
+]
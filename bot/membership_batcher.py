@@ -0,0 +1,193 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains the :class:`MembershipBatcher` class, that commits the concurrent '/add_me'
+and '/remove_me' requests to the same queue in one transaction (group commit).
+
+When the queue is announced, dozens of users join it within a second. The request to the queue,
+that has no batch in flight, is written at once without waiting. The requests to the same queue, received
+by other threads while the batch is being written, are collected into the next batch, that is written right
+after it. So the lone requests aren't delayed, and the batches grow only under the load. The requests are applied in the order they were received: each run of the
+consecutive joins is written with one multi-row INSERT with the consecutive positions, the leaves are applied
+one by one, the activity of the queue is updated once and everything is committed once.
+Each request gets its own result.
+
+Examples:
+    >>> batcher = MembershipBatcher(touch_queue)
+    >>> result = batcher.join(queue, user_id, 'John Smith')
+    >>> if result.member is None:
+    >>>     update.effective_message.reply_text(**already_in_the_queue(lang=lang))
+"""
+import itertools
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from app_logging import get_logger
+from app_logging.metrics import metrics
+from bot.concurrency import run_with_conflict_retry
+from sql import get_engine
+from sql.domain import Queue, QueueMember
+from sql.repository import QueueRepository
+
+
+logger = get_logger(__name__)
+
+MAX_BATCH_SIZE = 100
+"""The number of the requests in one batch, the next requests to the queue start the new batch."""
+
+
+class MembershipResult(NamedTuple):
+    """The result of the request to join or to leave the queue."""
+    member: Optional[QueueMember]
+    """The added (or removed) member, ``None`` if the user is already (or not) in the queue."""
+    queue: Optional[Queue]
+    """The queue after the batch was committed, ``None`` if it was deleted."""
+    edit_message: bool
+    """``True`` for the one request of the batch, that has to update the message with the members."""
+
+
+class _Request:
+    __slots__ = ('user_id', 'fullname', 'joins', 'result')
+
+    def __init__(self, user_id: int, fullname: Optional[str], joins: bool) -> None:
+        self.user_id = user_id
+        self.fullname = fullname
+        self.joins = joins
+        self.result: Optional[MembershipResult] = None
+
+
+class _Batch:
+    def __init__(self, queue: Queue) -> None:
+        self.queue_id = queue.queue_id
+        self.chat_id = queue.chat_id
+        self.requests: List[_Request] = []
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+        # The previous batch of the queue, the batches of one queue are written one after another
+        self.previous: Optional['_Batch'] = None
+
+
+class MembershipBatcher:
+    """
+    Groups the concurrent membership changes of the same queue into one transaction.
+
+    Note:
+        The batch is written by the thread of its first request, so the handlers of other queues
+        are not delayed. The batches of the same queue are written one after another in the process,
+        and the queue is locked by each of them in DB (see ``QueueRepository.lock``), so they are serialized
+        with the other processes too. If the queue was changed concurrently (see ``bot.concurrency``),
+        the whole batch is retried.
+    """
+
+    def __init__(self, touch_queue: Callable[[Session, Queue, int], None],
+                 max_batch_size: int = MAX_BATCH_SIZE) -> None:
+        """
+        Args:
+            touch_queue: called once per batch before the commit with the session, the queue and
+                the number of the members, who left without waiting for their turn, to mark the activity.
+            max_batch_size: the maximum number of the requests in one batch.
+        """
+        self.touch_queue = touch_queue
+        self.max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+        self._batches: Dict[int, _Batch] = {}
+        self._last_batches: Dict[int, _Batch] = {}
+
+    def join(self, queue: Queue, user_id: int, fullname: str) -> MembershipResult:
+        """Adds the user to the end of the queue, ``member`` is ``None`` if the user is already in it."""
+        return self._submit(queue, _Request(user_id, fullname, joins=True))
+
+    def leave(self, queue: Queue, user_id: int) -> MembershipResult:
+        """Removes the user from the queue, ``member`` is ``None`` if the user isn't in it."""
+        return self._submit(queue, _Request(user_id, None, joins=False))
+
+    def _submit(self, queue: Queue, request: _Request) -> MembershipResult:
+        with self._lock:
+            batch = self._batches.get(queue.queue_id)
+            leader = batch is None
+            if leader:
+                batch = _Batch(queue)
+                batch.previous = self._last_batches.get(queue.queue_id)
+                self._last_batches[queue.queue_id] = batch
+                # The batch is open for the other requests only while the previous one is being written
+                if batch.previous is not None:
+                    self._batches[queue.queue_id] = batch
+            batch.requests.append(request)
+            if len(batch.requests) >= self.max_batch_size and self._batches.get(queue.queue_id) is batch:
+                # The next request to the queue starts the new batch
+                del self._batches[queue.queue_id]
+
+        if leader:
+            if batch.previous is not None:
+                batch.previous.done.wait()
+                batch.previous = None
+                with self._lock:
+                    if self._batches.get(queue.queue_id) is batch:
+                        del self._batches[queue.queue_id]
+            try:
+                run_with_conflict_retry(lambda: self._write(batch), batch.chat_id)
+            except BaseException as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+                with self._lock:
+                    if self._last_batches.get(queue.queue_id) is batch:
+                        del self._last_batches[queue.queue_id]
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return request.result
+
+    def _write(self, batch: _Batch) -> None:
+        metrics.increment('membership_batches')
+        metrics.increment('membership_batch_requests', value=len(batch.requests))
+
+        session = Session(bind=get_engine(), expire_on_commit=False)
+        try:
+            queues = QueueRepository(session)
+            queue = queues.get(batch.queue_id)
+            if queue is None:
+                for request in batch.requests:
+                    request.result = MembershipResult(None, None, False)
+                return
+            # The queue is locked before the members are read, so the batches of the other processes
+            # (and '/skip_me', '/priority') wait or fail with the conflict instead of taking the same positions
+            queue = queues.lock(queue)
+
+            # The requests are applied in the order they were received, the consecutive joins are written together
+            members: List[Optional[QueueMember]] = []
+            left_before_turn = 0
+            for joins, requests in itertools.groupby(batch.requests, key=lambda request: request.joins):
+                requests = list(requests)
+                if joins:
+                    # The members, removed by the previous leaves, must be deleted before checking, who is present
+                    session.flush()
+                    members += queues.enqueue_many(queue, [(request.user_id, request.fullname)
+                                                           for request in requests])
+                    continue
+                for request in requests:
+                    member = queues.find_member(queue.queue_id, request.user_id)
+                    if member is not None:
+                        left_before_turn += member.user_order > queue.current_order
+                        queue = queues.dequeue(queue, member)
+                    members.append(member)
+
+            self.touch_queue(session, queue, left_before_turn)
+            session.commit()
+        finally:
+            session.close()
+
+        message_editor = None
+        for request, member in zip(batch.requests, members):
+            if member is not None and message_editor is None:
+                message_editor = request
+            request.result = MembershipResult(member, queue, request is message_editor)
+
+
+__all__ = [
+    'MembershipBatcher',
+    'MembershipResult'
+]
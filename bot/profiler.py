@@ -0,0 +1,177 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains the :class:`UpdateProfiler` class, that profiles the processing of the updates
+in production for a limited number of updates or time, and sends the report to the admin.
+
+The profiler is started by the '/profile' command of the admin. While it's disabled,
+``Dispatcher.process_update`` is not wrapped at all, so there is no overhead.
+
+Examples:
+    >>> from bot.profiler import update_profiler
+    >>>
+    >>> update_profiler.start(dispatcher, report_chat_id=ADMIN_ID, max_updates=100, max_seconds=60)
+"""
+import cProfile
+import io
+import pstats
+import threading
+import time
+from datetime import datetime
+from functools import partial
+from typing import Optional, Union
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import Dispatcher
+
+from app_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+REPORT_FUNCTIONS = 40
+"""The number of the hottest functions in each section of the report."""
+
+
+class UpdateProfiler:
+    """
+    Wraps ``Dispatcher.process_update`` with :mod:`cProfile` until the limit of updates or time is reached.
+
+    Each update is profiled by its own profiler, so the updates, processed concurrently in the web threads,
+    are profiled too. The results are aggregated and sent as the text document.
+
+    Note:
+        The handlers, run asynchronously by the dispatcher workers (``run_async``), are not profiled.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._dispatcher: Optional[Dispatcher] = None
+        self._stats: Optional[pstats.Stats] = None
+        self._report_chat_id: Optional[Union[int, str]] = None
+        self._max_updates = 0
+        self._deadline = 0.0
+        self._started_at: Optional[datetime] = None
+        self._updates = 0
+        self._update_seconds = 0.0
+        self._timer: Optional[threading.Timer] = None
+
+    @property
+    def running(self) -> bool:
+        """``True`` if the updates are being profiled."""
+        return self._dispatcher is not None
+
+    def start(self, dispatcher: Dispatcher, report_chat_id: Union[int, str],
+              max_updates: int = 100, max_seconds: float = 60) -> bool:
+        """
+        Starts profiling the updates, processed by the ``dispatcher``.
+
+        Args:
+            dispatcher: the dispatcher, which ``process_update`` is profiled.
+            report_chat_id: the chat, the report is sent to.
+            max_updates: the number of the updates to profile.
+            max_seconds: the maximum duration of the profiling, the report is sent after it,
+                even if fewer updates were processed.
+        Returns:
+            ``False`` if the profiler is already running.
+        """
+        with self._lock:
+            if self.running:
+                return False
+            self._dispatcher = dispatcher
+            self._stats = pstats.Stats()
+            self._report_chat_id = report_chat_id
+            self._max_updates = max_updates
+            self._deadline = time.monotonic() + max_seconds
+            self._started_at = datetime.now()
+            self._updates = 0
+            self._update_seconds = 0.0
+            self._timer = threading.Timer(max_seconds, self.stop)
+            self._timer.daemon = True
+            self._timer.start()
+            # The instance attribute shadows the method of the class, until it's deleted in ``stop``
+            dispatcher.process_update = partial(self._process_update, dispatcher)
+        logger.info(f'Started profiling the next {max_updates} updates or {max_seconds} seconds.')
+        return True
+
+    def stop(self) -> bool:
+        """
+        Stops profiling and sends the report in the background thread,
+        so the update, that reached the limit, isn't delayed by the sending.
+
+        Returns:
+            ``False`` if the profiler wasn't running.
+        """
+        with self._lock:
+            if not self.running:
+                return False
+            dispatcher = self._dispatcher
+            del dispatcher.process_update
+            self._dispatcher = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            report = self._build_report()
+            report_chat_id = self._report_chat_id
+            filename = f'profile_{self._started_at:%Y%m%d_%H%M%S}.txt'
+            caption = (f'Profiled {self._updates} updates, {self._update_seconds:.2f} s in total '
+                       f'({self._update_seconds / self._updates * 1000:.1f} ms per update).'
+                       if self._updates else 'No updates were profiled.')
+            self._stats = None
+
+        logger.info(f'Stopped profiling: {caption}')
+
+        def send_report():
+            try:
+                dispatcher.bot.send_document(chat_id=report_chat_id, document=io.BytesIO(report.encode()),
+                                             filename=filename, caption=caption)
+            except TelegramError as e:
+                logger.exception(f'ERROR when sending the profiling report: {e}')
+
+        threading.Thread(target=send_report, name='profiling_report', daemon=True).start()
+        return True
+
+    def _process_update(self, dispatcher: Dispatcher, update: Union[Update, object]) -> None:
+        # The method of the class, the attribute of the dispatcher is this wrapper
+        process_update = type(dispatcher).process_update
+        if self._dispatcher is not dispatcher:
+            # The profiler was stopped, after the wrapper was got by the caller
+            return process_update(dispatcher, update)
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profile.runcall(process_update, dispatcher, update)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                if self._stats is not None:
+                    self._stats.add(profile)
+                    self._updates += 1
+                    self._update_seconds += elapsed
+                    limit_reached = self._updates >= self._max_updates or time.monotonic() >= self._deadline
+                else:
+                    limit_reached = False
+            if limit_reached:
+                self.stop()
+
+    def _build_report(self) -> str:
+        stream = io.StringIO()
+        stream.write(f'Profiling started at {self._started_at:%Y-%m-%d %H:%M:%S}, '
+                     f'{self._updates} updates, {self._update_seconds:.3f} s\n\n')
+        if self._updates:
+            stats = self._stats
+            stats.stream = stream
+            stream.write('=== By the total time in the function ===\n')
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(REPORT_FUNCTIONS)
+            stream.write('=== By the cumulative time ===\n')
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_FUNCTIONS)
+        return stream.getvalue()
+
+
+update_profiler = UpdateProfiler()
+
+__all__ = [
+    'UpdateProfiler',
+    'update_profiler'
+]
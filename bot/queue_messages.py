@@ -0,0 +1,110 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module finds the queue by the message, the command replied to.
+
+Each message, the bot sends for the queue (the list of the members and the notification about the turn),
+is remembered in the 'queue_message' table, so the replies to the older copies of the list
+(e.g. after it was resent by '/show_members') are resolved too. The recently used messages
+are cached in memory.
+
+Examples:
+    >>> queue = find_queue_by_message(QueueRepository(session), chat_id, replied_message_id)
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app_logging import get_logger
+from bot.cache import LRUCache
+from sql import get_engine
+from sql.domain import Queue, QueueMessage
+from sql.repository import QueueRepository
+
+
+logger = get_logger(__name__)
+
+QUEUE_MESSAGE_RETENTION_DAYS = 30
+"""How long the messages of the queues are kept in DB. The current list of the members is found without it."""
+
+# (chat_id, message_id) -> queue_id
+_queue_ids = LRUCache('queue_messages', maxsize=10000)
+
+
+def find_queue_by_message(queues: QueueRepository, chat_id: int, message_id: int) -> Optional[Queue]:
+    """
+    Returns the queue, the message was sent for, ``None`` if the message isn't known or the queue was deleted.
+
+    Args:
+        queues: the repository to read the queue with.
+        chat_id: the id of the chat with the message.
+        message_id: the id of the message.
+    """
+    key = (chat_id, message_id)
+    queue_id = _queue_ids.get(key)
+    if queue_id is None:
+        queue_id = queues.find_id_by_message(chat_id, message_id)
+        if queue_id is None:
+            # The current list of the members of the queue, that could be sent before the messages were remembered
+            queue = queues.find_by_message(chat_id, message_id)
+            if queue is not None:
+                _queue_ids.set(key, queue.queue_id)
+            return queue
+        _queue_ids.set(key, queue_id)
+
+    queue = queues.get(queue_id)
+    if queue is None:
+        _queue_ids.pop(key)
+    return queue
+
+
+def remember_message(chat_id: int, message_id: int, queue_id: int, session: Optional[Session] = None) -> None:
+    """
+    Remembers, that the message was sent for the queue.
+
+    Args:
+        chat_id: the id of the chat with the message.
+        message_id: the id of the message.
+        queue_id: the id of the queue.
+        session: the session to add the message in, the caller commits it.
+            If ``None``, the message is written in its own transaction, failures are only logged.
+    """
+    if session is not None:
+        QueueRepository(session).add_message(chat_id, message_id, queue_id)
+    else:
+        try:
+            with get_engine().begin() as connection:
+                connection.execute(QueueMessage.__table__.insert().values(
+                    chat_id=chat_id, message_id=message_id, queue_id=queue_id, created_at=datetime.now()))
+        except SQLAlchemyError as e:
+            logger.warning(f'Cannot remember the message({message_id}) of the queue({queue_id}): {e}')
+            return
+    _queue_ids.set((chat_id, message_id), queue_id)
+
+
+def prune() -> int:
+    """
+    Deletes the messages older than ``QUEUE_MESSAGE_RETENTION_DAYS`` from DB.
+    Called by the ``bot.scheduler`` periodically.
+
+    Returns:
+        the number of the deleted rows.
+    """
+    cutoff = datetime.now() - timedelta(days=QUEUE_MESSAGE_RETENTION_DAYS)
+    table = QueueMessage.__table__
+    try:
+        with get_engine().begin() as connection:
+            deleted = connection.execute(table.delete().where(table.c.created_at < cutoff)).rowcount
+    except SQLAlchemyError as e:
+        logger.exception(f'ERROR when deleting the old queue messages: {e}')
+        return 0
+    logger.info(f'Deleted {deleted} old queue messages.')
+    return deleted
+
+
+__all__ = [
+    'find_queue_by_message',
+    'remember_message',
+    'prune'
+]
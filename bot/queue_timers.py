@@ -0,0 +1,159 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains the :class:`QueueTimers` class, that fires due queue timers and reminders.
+
+The timers are not stored as separate jobs. Instead, each :class:`Queue` keeps its own
+``next_due_at`` and ``reminder_due_at`` columns (indexed), which are polled on every tick,
+so the number of the active queues doesn't affect the scheduler and the timers survive restarts.
+"""
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import and_
+from telegram import Bot
+from telegram.error import TelegramError
+
+from app_logging import get_logger
+from app_logging.metrics import metrics
+from bot.concurrency import run_with_conflict_retry
+from bot.handlers.command_handlers import advance_queue
+from bot.language import get_chat_language
+from localization.catalog import DEFAULT_LANGUAGE
+from localization.replies import next_soon_notify
+from sql import create_session
+from sql.replica import set_current_chat
+from sql.domain import *
+
+
+logger = get_logger(__name__)
+
+
+class QueueTimers:
+    """
+    Polls the due-time index of the queues and processes the due events in batches.
+
+    Note:
+        The due rows are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` and cleared in the same transaction,
+        so when several workers run the scheduler, each event is processed only once.
+    """
+
+    def __init__(self, bot: Bot, batch_size: int = 100, max_batches_per_tick: int = 10) -> None:
+        """
+        Args:
+            bot: the bot used to send the messages.
+            batch_size: the number of the due events, claimed in one transaction.
+            max_batches_per_tick: the number of the batches processed in one tick,
+                the rest of the events will be processed on the next tick.
+        """
+        self.bot = bot
+        self.batch_size = batch_size
+        self.max_batches_per_tick = max_batches_per_tick
+
+    def tick(self) -> None:
+        """Processes all due reminders and timers. Called by the ``bot.scheduler`` periodically."""
+        now = datetime.now()
+        try:
+            for _ in range(self.max_batches_per_tick):
+                if self._process_reminders(now) < self.batch_size:
+                    break
+            for _ in range(self.max_batches_per_tick):
+                if self._process_due_queues(now) < self.batch_size:
+                    break
+        except Exception as e:
+            logger.exception(f'ERROR when processing the queue timers: {e}')
+
+    def _process_reminders(self, now: datetime) -> int:
+        """
+        Sends the reminders to the members, whose turn is coming soon.
+
+        Returns:
+            the number of the processed reminders.
+        """
+        session = create_session()
+        rows: List[Tuple] = (
+            session
+                .query(Queue.queue_id, Queue.chat_id, Queue.name, Queue.next_due_at,
+                       QueueMember.user_id, QueueMember.fullname)
+                .outerjoin(QueueMember, and_(QueueMember.queue_id == Queue.queue_id,
+                                             QueueMember.user_order == Queue.current_order + 1))
+                .filter(Queue.reminder_due_at <= now)
+                .order_by(Queue.reminder_due_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True, of=Queue)
+                .all()
+        )
+        if not rows:
+            return 0
+
+        (session
+         .query(Queue)
+         .filter(Queue.queue_id.in_([row.queue_id for row in rows]))
+         .update({Queue.reminder_due_at: None}, synchronize_session=False))
+        session.commit()
+
+        for row in rows:
+            # Nobody to remind or the queue is already overdue (e.g. the bot was down)
+            if row.user_id is None or row.next_due_at is None or row.next_due_at <= now:
+                continue
+            minutes = max(1, round((row.next_due_at - now).total_seconds() / 60))
+            try:
+                self.bot.send_message(chat_id=row.chat_id,
+                                      **next_soon_notify(row.fullname, row.user_id, row.name, minutes,
+                                                         lang=get_chat_language(row.chat_id) or DEFAULT_LANGUAGE))
+                metrics.increment('queue_timer_reminders_sent')
+            except TelegramError as e:
+                logger.warning(f'Cannot send the reminder for the queue({row.queue_id}): {e}')
+
+        logger.info(f'Processed {len(rows)} due reminders.')
+        return len(rows)
+
+    def _process_due_queues(self, now: datetime) -> int:
+        """
+        Moves the queues, that weren't active for the specified time, to the next member.
+
+        Returns:
+            the number of the processed queues.
+        """
+        session = create_session()
+        rows: List[Tuple] = (
+            session
+                .query(Queue.queue_id, Queue.chat_id)
+                .filter(Queue.next_due_at <= now)
+                .order_by(Queue.next_due_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+        )
+        if not rows:
+            return 0
+
+        # The timer is restarted by the ``advance_queue``, if there are members left
+        (session
+         .query(Queue)
+         .filter(Queue.queue_id.in_([row.queue_id for row in rows]))
+         .update({Queue.next_due_at: None, Queue.reminder_due_at: None}, synchronize_session=False))
+        session.commit()
+
+        for queue_id, chat_id in rows:
+            try:
+                run_with_conflict_retry(lambda: self._advance(queue_id, chat_id), chat_id)
+                metrics.increment('queue_timer_advances')
+            except Exception as e:
+                logger.exception(f'ERROR when moving the queue({queue_id}) by the timer: {e}')
+
+        logger.info(f'Processed {len(rows)} due queue timers.')
+        return len(rows)
+
+    def _advance(self, queue_id: int, chat_id: int) -> None:
+        # The changes of the queue are registered for the chat, so the queue message is built from the primary DB
+        set_current_chat(chat_id)
+        session = create_session()
+        queue: Queue = session.query(Queue).get(queue_id)
+        # The queue could be deleted after it was claimed
+        if queue is not None:
+            advance_queue(queue, chat_id, self.bot, notify_end=False)
+
+
+__all__ = [
+    'QueueTimers'
+]
@@ -0,0 +1,75 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""This module contains the background scheduler, that runs the periodic jobs of the bot."""
+from datetime import datetime
+from typing import Optional
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from pytz import utc
+from telegram import Bot
+
+from app_logging import get_logger
+from bot.constants import SCHEDULER_TICK_SECONDS
+from bot.maintenance import StaleDataCollector
+from bot.queue_messages import prune as prune_queue_messages
+from bot.queue_timers import QueueTimers
+from bot.update_deduplication import update_deduplicator
+from sql.event_log import maintain_partitions
+
+
+logger = get_logger(__name__)
+
+_scheduler: Optional[BackgroundScheduler] = None
+
+
+def start_scheduler(bot: Bot) -> BackgroundScheduler:
+    """
+    Creates and starts the background scheduler, if it wasn't started before.
+
+    Registered jobs:
+        * ``queue_timers`` - every ``SCHEDULER_TICK_SECONDS`` fires the due queue timers and reminders.
+        * ``stale_data_collector`` - once a day deletes the abandoned queues and chats.
+        * ``event_log_partitions`` - once a day creates the next and drops the old partitions of the event log.
+        * ``processed_updates`` - once an hour deletes the old ids of the processed updates.
+        * ``queue_messages`` - once a day deletes the old messages of the queues.
+
+    Args:
+        bot: the bot used by the jobs to send the messages.
+    Returns:
+        the started scheduler.
+    """
+    global _scheduler
+    if _scheduler is not None:
+        return _scheduler
+
+    _scheduler = BackgroundScheduler(timezone=utc)
+    queue_timers = QueueTimers(bot)
+    # The tick is skipped if the previous one is still running, the missed ticks are merged into one
+    _scheduler.add_job(queue_timers.tick, 'interval', seconds=SCHEDULER_TICK_SECONDS,
+                       id='queue_timers', max_instances=1, coalesce=True)
+    _scheduler.add_job(StaleDataCollector(bot).run, 'interval', hours=24,
+                       id='stale_data_collector', max_instances=1, coalesce=True)
+    # Also run at the startup, so the partition for the current month surely exists
+    _scheduler.add_job(maintain_partitions, 'interval', hours=24, next_run_time=datetime.now(utc),
+                       id='event_log_partitions', max_instances=1, coalesce=True)
+    _scheduler.add_job(update_deduplicator.prune, 'interval', hours=1,
+                       id='processed_updates', max_instances=1, coalesce=True)
+    _scheduler.add_job(prune_queue_messages, 'interval', hours=24,
+                       id='queue_messages', max_instances=1, coalesce=True)
+    _scheduler.start()
+    logger.info(f'Scheduler started with the tick of {SCHEDULER_TICK_SECONDS} seconds.')
+    return _scheduler
+
+
+def shutdown_scheduler() -> None:
+    """Stops the scheduler, waiting for the running jobs to finish."""
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown()
+        _scheduler = None
+        logger.info('Scheduler stopped.')
+
+
+__all__ = [
+    'start_scheduler',
+    'shutdown_scheduler'
+]
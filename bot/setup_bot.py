@@ -3,12 +3,17 @@
 
 import logging
 
-from telegram import Bot, Update, BotCommand
-from telegram.ext import Updater, MessageHandler, Filters, CommandHandler, CallbackContext, ConversationHandler
+from telegram import Update, BotCommand
+from telegram.ext import (
+    Updater, MessageHandler, Filters, CommandHandler, CallbackContext, ConversationHandler, TypeHandler,
+    CallbackQueryHandler
+)
 
 import app_logging
 from bot.chat_type_accepted import private_only_handler
-from bot.constants import BOT_TOKEN, BOT_VERSION
+from bot.command_router import CommandRouter
+from bot.constants import BOT_TOKEN, BOT_VERSION, TELEGRAM_POOL_SIZE
+from bot.handlers.admin_handlers import profile_command, diag_command
 from bot.handlers.chat_status_handlers import (
     new_group_member_handler, left_group_member_handler, group_migrated_handler,
     new_group_created_handler
@@ -21,15 +26,21 @@ from bot.handlers.command_handlers import (
     help_command,
     about_me_command,
     unsupported_command_handler, add_me_command, remove_me_command, skip_me_command, next_command, notify_all_command,
-    show_members_command
+    show_members_command, auto_next_command, my_position_command, priority_command,
+    show_queues_page_callback, SHOW_QUEUES_CALLBACK_PATTERN
 )
 from bot.handlers.error_handler import error_handler
+from bot.scheduler import start_scheduler
+from bot.telegram_client import create_bot
+from bot.update_deduplication import update_deduplicator
 from bot.handlers.report_handler import report_command, DESCRIPTION, description_handler, \
     send_without_description_handler, cancel_handler, cancel_keyboard_button, without_description_keyboard_button
 from sql import get_tables, get_database_revision
+from sql.replica import set_current_chat
 
 
-bot = Bot(BOT_TOKEN)
+# The only bot in the app, shared by the dispatcher, the handlers, the scheduler and the logging
+bot = create_bot(BOT_TOKEN, pool_size=TELEGRAM_POOL_SIZE)
 
 # Registering logger here
 app_logging.register_bot(bot)
@@ -42,6 +53,7 @@ def setup():
     Checking the connectivity with the database.
 
     Registered all handlers (for commands)
+    Starts the background scheduler for the queue timers.
 
     Returns:
         dispatcher and updater
@@ -49,25 +61,46 @@ def setup():
     logger.info(f'Bot version: {BOT_VERSION}')
     logger.info(f"\n\tDB revision: {get_database_revision()}; \n\ttables: {get_tables()}")
     logger.info("Setting up bot...")
-    updater = Updater(BOT_TOKEN, use_context=True)
+    # The updates are processed synchronously in the web threads (or in the dispatcher thread, when polling),
+    # the only worker is kept for the asynchronous handlers, so the pool is not reserved for the idle threads
+    updater = Updater(bot=bot, use_context=True, workers=1)
     dispatcher = updater.dispatcher
 
-    # Registering commands handlers here #
-    dispatcher.add_handler(CommandHandler('start', start_command))
-
-    dispatcher.add_handler(CommandHandler('create_queue', create_queue_command))
-    dispatcher.add_handler(CommandHandler('delete_queue', delete_queue_command))
-    dispatcher.add_handler(CommandHandler('show_queues', show_queues_command))
-    dispatcher.add_handler(CommandHandler('notify_all', notify_all_command))
-
-    dispatcher.add_handler(CommandHandler('add_me', add_me_command))
-    dispatcher.add_handler(CommandHandler('remove_me', remove_me_command))
-    dispatcher.add_handler(CommandHandler('skip_me', skip_me_command))
-    dispatcher.add_handler(CommandHandler('next', next_command))
-    dispatcher.add_handler(CommandHandler('show_members', show_members_command))
+    # Skipping the updates redelivered by Telegram before any other handler is checked
+    dispatcher.add_handler(update_deduplicator.create_handler(), group=-1)
+    # The writes of the handlers are registered for the chat of the update, to read it from the primary DB after them
+    dispatcher.add_handler(TypeHandler(Update, _set_current_chat), group=-2)
 
-    dispatcher.add_handler(CommandHandler('help', help_command))
-    dispatcher.add_handler(CommandHandler('about_me', about_me_command))
+    # Registering commands handlers here #
+    # The commands are routed by one handler through the dict, instead of checking a CommandHandler per command
+    router = CommandRouter(dispatcher.bot, unknown_command_callback=unsupported_command_handler,
+                           passthrough=['report'])
+    router.add_command('start', start_command)
+
+    router.add_command('create_queue', create_queue_command)
+    router.add_command('delete_queue', delete_queue_command)
+    router.add_command('show_queues', show_queues_command)
+    router.add_command('notify_all', notify_all_command)
+
+    router.add_command('add_me', add_me_command)
+    router.add_command('remove_me', remove_me_command)
+    router.add_command('skip_me', skip_me_command)
+    router.add_command('next', next_command)
+    router.add_command('show_members', show_members_command)
+    router.add_command('my_position', my_position_command)
+    router.add_command('auto_next', auto_next_command)
+    router.add_command('priority', priority_command)
+
+    router.add_command('help', help_command)
+    router.add_command('about_me', about_me_command)
+
+    # The commands of the admin, not shown in the commands list
+    router.add_command('profile', profile_command)
+    router.add_command('diag', diag_command)
+    dispatcher.add_handler(router)
+
+    # Handler for the buttons switching the pages of the '/show_queues' message
+    dispatcher.add_handler(CallbackQueryHandler(show_queues_page_callback, pattern=SHOW_QUEUES_CALLBACK_PATTERN))
 
     # Registering conversation handlers here
 
@@ -93,15 +126,14 @@ def setup():
     dispatcher.add_handler(MessageHandler(Filters.status_update.migrate, group_migrated_handler))
     dispatcher.add_handler(MessageHandler(Filters.status_update.chat_created, new_group_created_handler))
 
-    # Handlers for unsupported messages and commands.
-    dispatcher.add_handler(MessageHandler(Filters.command & (Filters.regex(rf'.*@{bot.username}')
-                                                             | Filters.regex(r'/\w+$')), unsupported_command_handler))
+    # Handler for unsupported messages (the unsupported commands are handled by the router).
     dispatcher.add_handler(MessageHandler(Filters.all & Filters.chat_type.private, unexpected_message))
 
     # Handle for errors
     dispatcher.add_error_handler(error_handler)
 
     _update_command_list()
+    start_scheduler(dispatcher.bot)
 
     return dispatcher, updater
 
@@ -118,6 +150,9 @@ def _update_command_list():
     next - <queue name> Notifies next person in the queue and moves queue down
     show_queues - Shows all created queues
     show_members - <queue name> Resends queue message
+    my_position - <queue name> Shows how long you will wait for your turn
+    auto_next - <minutes> <queue name> Moves the queue automatically after minutes without activity
+    priority - <level> [user id] <queue name> Moves the member to the priority lane of the queue (admins only)
     notify_all - Enables\\disables pinning the queues
     help - Shows description
     about_me - Detailed info about the bot
@@ -133,6 +168,11 @@ def _update_command_list():
     logger.info('The commands list was updated.')
 
 
+# noinspection PyUnusedLocal
+def _set_current_chat(update: Update, context: CallbackContext):
+    set_current_chat(update.effective_chat.id if update.effective_chat else None)
+
+
 # noinspection PyUnusedLocal
 @private_only_handler
 def unexpected_message(update: Update, context: CallbackContext):
@@ -0,0 +1,224 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module creates the single :class:`telegram.Bot` shared by the whole app.
+
+The dispatcher, the handlers, the scheduler jobs, the ``BotCachingHandler`` and the startup code
+use the same bot, so all requests to Telegram go through one pool of the keep-alive connections.
+
+Examples:
+    >>> from bot.telegram_client import create_bot
+    >>>
+    >>> bot = create_bot(BOT_TOKEN, pool_size=TELEGRAM_POOL_SIZE)
+    >>> updater = Updater(bot=bot, use_context=True, workers=1)
+"""
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+from telegram import Bot
+from telegram.error import NetworkError
+from telegram.utils.request import Request
+from telegram.vendor.ptb_urllib3.urllib3 import Timeout
+from telegram.vendor.ptb_urllib3.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from app_logging import get_logger
+from app_logging.metrics import metrics
+from bot.deadline import MIN_CALL_TIMEOUT, current_deadline, record_overrun
+
+
+logger = get_logger(__name__)
+
+DEFAULT_TIMEOUTS = (3.05, 10.0)
+"""The (connect, read) timeouts in seconds for the methods, not listed in ``METHOD_TIMEOUTS``."""
+METHOD_TIMEOUTS: Dict[str, Tuple[float, float]] = {
+    # The checks done in the middle of the command handling must fail fast
+    'getChatMember': (3.05, 5.0),
+    'getChatMembersCount': (3.05, 5.0),
+    'deleteMessage': (3.05, 5.0),
+    'pinChatMessage': (3.05, 5.0),
+    'unpinChatMessage': (3.05, 5.0),
+    # Called once at the startup, when Telegram could be slow to answer
+    'getMe': (5.0, 15.0),
+    'setWebhook': (5.0, 15.0),
+    'getWebhookInfo': (5.0, 15.0),
+    'setMyCommands': (5.0, 15.0),
+}
+"""The (connect, read) timeouts in seconds by the name of the Bot API method."""
+POOL_TIMEOUT = 10.0
+"""How long (in seconds) the request waits for the free connection, when all of them are in use."""
+
+
+class _PoolStats:
+    """The statistics of the connection pool, published as the ``telegram_pool`` gauge."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.size = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.requests = 0
+        self.new_connections = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def record_wait(self) -> None:
+        with self._lock:
+            self.waiting += 1
+
+    def record_get(self, waited: float) -> None:
+        with self._lock:
+            self.waiting -= 1
+            self.in_use += 1
+            self.requests += 1
+            # Getting the idle connection takes microseconds, the longer time means the pool was exhausted
+            if waited > 0.001:
+                self.waits += 1
+                self.wait_seconds += waited
+
+    def record_failed_get(self) -> None:
+        with self._lock:
+            self.waiting -= 1
+
+    def record_put(self) -> None:
+        with self._lock:
+            self.in_use -= 1
+
+    def record_new_connection(self) -> None:
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            reused = self.requests - self.new_connections
+            return {
+                'size': self.size,
+                'in_use': self.in_use,
+                # The requests, waiting for the free connection (the depth of the outgoing queue)
+                'waiting': self.waiting,
+                'requests': self.requests,
+                'reused': reused,
+                'new_connections': self.new_connections,
+                'hit_rate': round(reused / self.requests, 3) if self.requests else None,
+                'waits': self.waits,
+                'wait_seconds': round(self.wait_seconds, 3),
+            }
+
+
+_pool_stats = _PoolStats()
+metrics.register_gauge('telegram_pool', _pool_stats.snapshot)
+
+
+class _InstrumentedPoolMixin:
+    """Measures how the connections are taken from the pool."""
+
+    def _get_conn(self, timeout=None):
+        start = time.monotonic()
+        _pool_stats.record_wait()
+        try:
+            # noinspection PyUnresolvedReferences
+            conn = super()._get_conn(timeout)
+        except Exception:
+            _pool_stats.record_failed_get()
+            raise
+        _pool_stats.record_get(time.monotonic() - start)
+        return conn
+
+    def _put_conn(self, conn):
+        _pool_stats.record_put()
+        # noinspection PyUnresolvedReferences
+        return super()._put_conn(conn)
+
+    def _new_conn(self):
+        # Called, when the pool has no idle connection (or it was dropped by the server)
+        _pool_stats.record_new_connection()
+        # noinspection PyUnresolvedReferences
+        return super()._new_conn()
+
+
+class _InstrumentedHTTPConnectionPool(_InstrumentedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _InstrumentedHTTPSConnectionPool(_InstrumentedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class PooledRequest(Request):
+    """
+    :class:`telegram.utils.request.Request` with the bounded pool of the connections
+    and the connect and read timeouts chosen by the Bot API method, but not longer than the remaining budget
+    of the update (see ``bot.deadline``).
+
+    Note:
+        When all connections are in use, the request waits up to ``POOL_TIMEOUT`` seconds for the free one,
+        instead of opening the extra connection, that would be closed right after the request.
+    """
+
+    def __init__(self, pool_size: int) -> None:
+        """
+        Args:
+            pool_size: the number of the keep-alive connections, should match the number of the threads,
+                sending the requests concurrently.
+        """
+        super().__init__(con_pool_size=pool_size, connect_timeout=DEFAULT_TIMEOUTS[0],
+                         read_timeout=DEFAULT_TIMEOUTS[1])
+        # Not available for the App Engine and the proxy managers, they use their own pools
+        if hasattr(self._con_pool, 'pool_classes_by_scheme'):
+            self._con_pool.connection_pool_kw['block'] = True
+            self._con_pool.pool_classes_by_scheme = {
+                'http': _InstrumentedHTTPConnectionPool,
+                'https': _InstrumentedHTTPSConnectionPool
+            }
+        _pool_stats.size = pool_size
+
+    def _request_wrapper(self, *args: Any, **kwargs: Any) -> bytes:
+        # The url is '<base_url>/<method>'
+        api_method = args[1].rsplit('/', 1)[-1]
+        connect_timeout, read_timeout = METHOD_TIMEOUTS.get(api_method, DEFAULT_TIMEOUTS)
+        timeout = kwargs.get('timeout')
+        if timeout is not None:
+            # The read timeout passed explicitly to the method (e.g. the long polling) is kept
+            read_timeout = timeout.read_timeout
+        pool_timeout = kwargs.get('pool_timeout', POOL_TIMEOUT)
+
+        # The request, sent while processing the update, must not outlive the budget of the update
+        deadline = current_deadline()
+        limited = False
+        if deadline is not None:
+            budget = deadline.call_timeout(api_method)
+            # The call, started after the budget was used up, is already recorded as the overrun
+            limited = MIN_CALL_TIMEOUT < budget < max(connect_timeout, read_timeout, pool_timeout)
+            connect_timeout, read_timeout, pool_timeout = (min(connect_timeout, budget), min(read_timeout, budget),
+                                                           min(pool_timeout, budget))
+        kwargs['timeout'] = Timeout(connect=connect_timeout, read=read_timeout)
+        kwargs['pool_timeout'] = pool_timeout
+
+        metrics.increment('telegram_requests', api_method)
+        try:
+            return super()._request_wrapper(*args, **kwargs)
+        except NetworkError:
+            # Timed out (or waited for the free connection) for the rest of the budget
+            if limited and deadline.expired:
+                record_overrun(api_method)
+            raise
+
+
+def create_bot(token: str, pool_size: int) -> Bot:
+    """
+    Creates the bot, that sends all requests through the :class:`PooledRequest`.
+
+    Args:
+        token: the token of the bot.
+        pool_size: the number of the keep-alive connections to Telegram.
+    Returns:
+        the bot to be shared by the whole app.
+    """
+    logger.info(f'Creating the bot with the pool of {pool_size} connections.')
+    return Bot(token, request=PooledRequest(pool_size))
+
+
+__all__ = [
+    'PooledRequest',
+    'create_bot',
+    'METHOD_TIMEOUTS'
+]
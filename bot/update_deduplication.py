@@ -0,0 +1,142 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains the :class:`UpdateDeduplicator` class, that skips the updates redelivered by Telegram.
+
+Telegram resends the update, if the webhook didn't answer in time, so the commands like '/next' or '/add_me'
+could be executed twice. Each ``update_id`` is accepted only once: the recent ids are kept in memory,
+and all ids are claimed in the 'processed_update' table, so the duplicates are caught across the workers
+and the restarts.
+
+Examples:
+    >>> dispatcher.add_handler(update_deduplicator.create_handler(), group=-1)
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from telegram import Update
+from telegram.ext import CallbackContext, DispatcherHandlerStop, TypeHandler
+
+from app_logging import get_logger
+from app_logging.metrics import metrics
+from bot.cache import LRUCache
+from sql import get_engine
+from sql.domain import ProcessedUpdate
+
+
+logger = get_logger(__name__)
+
+PROCESSED_UPDATE_RETENTION_HOURS = 48
+"""How long the ids of the processed updates are kept in DB. Telegram stops redelivering in 24 hours."""
+
+
+class UpdateDeduplicator:
+    """
+    Claims the ``update_id`` of each update, the update is processed only by the first claim.
+
+    Note:
+        The update is claimed before it's processed, so if the processing fails, the redelivered copy
+        is skipped as well. Running the command at most once is preferred to running it twice.
+        If DB is unavailable, only the in-memory window is used.
+    """
+
+    def __init__(self, window_size: int = 10000) -> None:
+        """
+        Args:
+            window_size: the number of the recent update ids, remembered in memory.
+        """
+        self._recent = LRUCache('processed_updates', maxsize=window_size)
+
+    def claim(self, update_id: int) -> bool:
+        """
+        Marks the update as processed.
+
+        Args:
+            update_id: the id of the update.
+        Returns:
+            ``True`` if the update is seen for the first time, ``False`` if it's the duplicate.
+        """
+        if update_id in self._recent:
+            metrics.increment('update_duplicates', 'memory')
+            return False
+        self._recent.set(update_id, True)
+
+        try:
+            claimed = self._claim_in_db(update_id)
+        except SQLAlchemyError as e:
+            logger.warning(f'Cannot claim the update({update_id}) in DB: {e}')
+            metrics.increment('update_dedup_db_errors')
+            return True
+
+        if not claimed:
+            metrics.increment('update_duplicates', 'db')
+        return claimed
+
+    def release(self, update_id: int) -> None:
+        """
+        Forgets the claim of the update, so it will be processed again, e.g. when it's replayed from
+        the ``bot.update_journal`` or redelivered by Telegram after the processing was interrupted.
+        """
+        self._recent.pop(update_id)
+        table = ProcessedUpdate.__table__
+        try:
+            with get_engine().begin() as connection:
+                connection.execute(table.delete().where(table.c.update_id == update_id))
+        except SQLAlchemyError as e:
+            logger.warning(f'Cannot release the update({update_id}) in DB: {e}')
+            metrics.increment('update_dedup_db_errors')
+
+    def create_handler(self) -> TypeHandler:
+        """
+        Returns the handler, that stops the processing of the duplicated updates.
+        It must be added to the group, that goes before all other handlers.
+        """
+        return TypeHandler(Update, self._stop_duplicate)
+
+    def prune(self) -> int:
+        """
+        Deletes the ids of the updates older than ``PROCESSED_UPDATE_RETENTION_HOURS`` from DB.
+        Called by the ``bot.scheduler`` periodically.
+
+        Returns:
+            the number of the deleted rows.
+        """
+        cutoff = datetime.now() - timedelta(hours=PROCESSED_UPDATE_RETENTION_HOURS)
+        table = ProcessedUpdate.__table__
+        try:
+            with get_engine().begin() as connection:
+                deleted = connection.execute(table.delete().where(table.c.processed_at < cutoff)).rowcount
+        except SQLAlchemyError as e:
+            logger.exception(f'ERROR when deleting the old processed updates: {e}')
+            return 0
+        logger.info(f'Deleted {deleted} old processed updates.')
+        return deleted
+
+    # noinspection PyUnusedLocal
+    def _stop_duplicate(self, update: Update, context: CallbackContext):
+        if not self.claim(update.update_id):
+            logger.info(f'Skipped the duplicated update({update.update_id}).')
+            raise DispatcherHandlerStop()
+
+    @staticmethod
+    def _claim_in_db(update_id: int) -> bool:
+        engine = get_engine()
+        values = {'update_id': update_id, 'processed_at': datetime.now()}
+        with engine.begin() as connection:
+            if engine.dialect.name == 'postgresql':
+                statement = pg_insert(ProcessedUpdate.__table__).values(**values).on_conflict_do_nothing()
+                return connection.execute(statement).rowcount == 1
+            try:
+                connection.execute(ProcessedUpdate.__table__.insert().values(**values))
+            except IntegrityError:
+                return False
+            return True
+
+
+update_deduplicator = UpdateDeduplicator()
+"""The deduplicator shared by the whole app."""
+
+__all__ = [
+    'UpdateDeduplicator',
+    'update_deduplicator'
+]
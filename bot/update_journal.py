@@ -0,0 +1,224 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains the :class:`UpdateJournal` class, the append-only local journal of the updates,
+which processing was started, but not finished.
+
+The journal is the directory with the JSONL segment files. Each line is either
+``{"b": <update_id>, "u": <update>}`` (the processing began) or ``{"d": <update_id>}`` (it's done).
+The lines are written to the file immediately, and ``fsync`` is called by the background thread
+at most every ``fsync_interval`` seconds, so the updates don't wait for the disk one by one.
+
+Each worker process writes its own segment and holds the lock on it. On the startup, the segments
+not locked by the running workers are read, and the updates without the "done" line are returned to be replayed.
+
+Examples:
+    >>> journal = UpdateJournal(UPDATE_JOURNAL_DIR)
+    >>> pending = journal.open()
+    >>> journal.begin(update_json['update_id'], update_json)
+    >>> journal.done(update_json['update_id'])
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, BinaryIO, Dict, List, Optional
+
+from app_logging import get_logger
+from app_logging.metrics import metrics
+
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # The segments are not locked on Windows, so only one process should use the journal there
+    fcntl = None
+
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+except ImportError:  # pragma: no cover
+    def _dumps(value: Any) -> bytes:
+        return json.dumps(value, separators=(',', ':')).encode()
+
+logger = get_logger(__name__)
+
+SEGMENT_PREFIX = 'updates-'
+SEGMENT_SUFFIX = '.jsonl'
+
+
+class UpdateJournal:
+    """
+    The write-ahead journal of the updates in processing.
+
+    Note:
+        The journal keeps the updates only on the local disk. On the platforms with the ephemeral file system
+        (e.g. Heroku dynos) the journal survives the restarts of the workers, but not the replacement of the dyno.
+    """
+
+    def __init__(self, directory: str, fsync_interval: float = 0.2, segment_max_bytes: int = 4 * 2 ** 20) -> None:
+        """
+        Args:
+            directory: the directory of the journal, created if it doesn't exist.
+            fsync_interval: how often (in seconds) the written lines are flushed to the disk.
+            segment_max_bytes: the size of the segment, after which the new segment is started,
+                containing only the updates still in processing.
+        """
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.segment_max_bytes = segment_max_bytes
+
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+        self._path: Optional[str] = None
+        self._size = 0
+        self._dirty = False
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        metrics.register_gauge('update_journal', lambda: {'pending': len(self._pending), 'segment_bytes': self._size})
+
+    def open(self) -> List[Dict[str, Any]]:
+        """
+        Recovers the unfinished updates from the segments of the stopped workers
+        and starts the new segment for this process.
+
+        Returns:
+            the unfinished updates in the order they were received. They are kept in the journal,
+            until they are marked with :meth:`done`.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        recovered: Dict[int, Dict[str, Any]] = {}
+        old_segments = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                path = os.path.join(self.directory, name)
+                segment = self._read_segment(path, recovered)
+                if segment is not None:
+                    old_segments.append(segment)
+
+        with self._lock:
+            self._pending = recovered
+            self._start_segment()
+        # The recovered updates are already in the new segment, so the old ones aren't needed
+        for path, file in old_segments:
+            os.remove(path)
+            file.close()
+
+        self._thread = threading.Thread(target=self._run_fsync, name='update-journal-fsync', daemon=True)
+        self._thread.start()
+        if recovered:
+            logger.warning(f'Recovered {len(recovered)} unfinished updates from the journal.')
+        return list(recovered.values())
+
+    def begin(self, update_id: int, update: Dict[str, Any]) -> None:
+        """Records, that the processing of the update began."""
+        with self._lock:
+            self._pending[update_id] = update
+            self._write(b'{"b":%d,"u":%s}\n' % (update_id, _dumps(update)))
+
+    def done(self, update_id: int) -> None:
+        """Records, that the update was processed (or failed), so it isn't replayed."""
+        with self._lock:
+            if self._pending.pop(update_id, None) is None:
+                return
+            self._write(b'{"d":%d}\n' % update_id)
+            if self._file is not None and self._size > self.segment_max_bytes:
+                self._rotate()
+
+    @property
+    def pending(self) -> List[int]:
+        """The ids of the updates, which processing isn't finished."""
+        with self._lock:
+            return list(self._pending)
+
+    def sync(self) -> None:
+        """Flushes the written lines to the disk."""
+        with self._lock:
+            self._sync()
+
+    def close(self) -> None:
+        """Flushes the journal to the disk and closes the segment. The unfinished updates are kept in it."""
+        self._closed.set()
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+    def _write(self, line: bytes) -> None:
+        if self._file is None:
+            return
+        self._file.write(line)
+        # Passing the line to OS, so it isn't lost, if only the process is killed
+        self._file.flush()
+        self._size += len(line)
+        self._dirty = True
+
+    def _sync(self) -> None:
+        if self._dirty and self._file is not None:
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def _start_segment(self) -> None:
+        """Starts the new segment with the pending updates, must be called with the lock held."""
+        self._path = os.path.join(self.directory, f'{SEGMENT_PREFIX}{time.time_ns()}-{os.getpid()}{SEGMENT_SUFFIX}')
+        self._file = open(self._path, 'ab')
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._size = 0
+        for update_id, update in self._pending.items():
+            self._write(b'{"b":%d,"u":%s}\n' % (update_id, _dumps(update)))
+        self._sync()
+
+    def _rotate(self) -> None:
+        old_path, old_file = self._path, self._file
+        self._start_segment()
+        os.remove(old_path)
+        old_file.close()
+
+    @staticmethod
+    def _read_segment(path: str, recovered: Dict[int, Dict[str, Any]]) -> Optional[tuple]:
+        """
+        Reads the unfinished updates from the segment of the stopped worker to ``recovered``.
+
+        Returns:
+            the path and the locked file of the segment, or ``None`` if the segment is used by the running worker.
+        """
+        file = open(path, 'rb')
+        if fcntl is not None:
+            try:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                file.close()
+                return None
+            # The segment could be recovered and removed by another worker, while the lock was acquired
+            if os.fstat(file.fileno()).st_nlink == 0:
+                file.close()
+                return None
+
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # The last line could be written partially, when the process was killed
+                logger.warning(f'Skipped the broken line in the journal segment {path}.')
+                continue
+            if 'b' in record:
+                recovered[record['b']] = record['u']
+            elif 'd' in record:
+                recovered.pop(record['d'], None)
+        return path, file
+
+    def _run_fsync(self) -> None:
+        while not self._closed.wait(self.fsync_interval):
+            try:
+                self.sync()
+            except (OSError, ValueError) as e:
+                logger.warning(f'Cannot sync the update journal: {e}')
+
+
+__all__ = [
+    'UpdateJournal'
+]
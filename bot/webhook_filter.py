@@ -0,0 +1,136 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains the :class:`UpdatePrefilter` class, that drops the irrelevant updates
+before :class:`telegram.Update` objects are built for them.
+
+Most of the updates in the groups are the ordinary messages, that no handler reacts to.
+The raw body of the webhook request is parsed by the fast JSON parser (``orjson``, if installed),
+and only the updates, that could be handled, are passed to ``telegram.Update.de_json``.
+
+Examples:
+    >>> prefilter = UpdatePrefilter(bot.id, secret_token=WEBHOOK_SECRET)
+    >>> if prefilter.check_secret(request.headers.get(SECRET_TOKEN_HEADER)):
+    ...     update_json = prefilter.parse(request.get_data())
+"""
+import hmac
+import json
+from typing import Any, Dict, Iterable, Optional
+
+from telegram.ext import ConversationHandler
+
+from app_logging import get_logger
+from app_logging.metrics import metrics
+
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover
+    orjson = None
+    _loads = json.loads
+
+logger = get_logger(__name__)
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+"""The header, Telegram sends the secret token (set with ``setWebhook``) in."""
+
+_STATUS_UPDATE_KEYS = ('new_chat_members', 'left_chat_member', 'migrate_to_chat_id', 'migrate_from_chat_id',
+                       'group_chat_created', 'supergroup_chat_created')
+
+
+class UpdatePrefilter:
+    """
+    Checks the raw updates and drops the messages, that can't be handled by the bot.
+
+    The message is passed further, if it's:
+        * a command (starts with the ``bot_command`` entity);
+        * a status update (members joined or left, the group was created or migrated);
+        * a reply to the message of the bot (e.g. with the queue);
+        * sent to the private chat;
+        * sent by the user, who is in the middle of the conversation (e.g. '/report').
+
+    All other kinds of updates (edited or channel posts, callback queries, etc.) are passed as well.
+
+    The dropped updates are counted in the ``webhook_dropped`` metric by the reason.
+    """
+
+    def __init__(self, bot_id: int, secret_token: Optional[str] = None,
+                 conversation_handlers: Iterable[ConversationHandler] = ()) -> None:
+        """
+        Args:
+            bot_id: the id of the bot, to recognize the replies to its messages.
+            secret_token: the secret token, set for the webhook, ``None`` if the secret isn't checked.
+            conversation_handlers: the handlers, which states accept the messages without the commands.
+        """
+        self.bot_id = bot_id
+        self.secret_token = secret_token
+        self.conversation_handlers = list(conversation_handlers)
+        if orjson is None:
+            logger.warning('orjson is not installed, the updates are parsed by the json module.')
+
+    def check_secret(self, secret_token: Optional[str]) -> bool:
+        """
+        Returns:
+            ``True`` if the secret token, received in the ``SECRET_TOKEN_HEADER``, is valid
+            (or the secret token isn't set for the webhook).
+        """
+        if self.secret_token is None:
+            return True
+        if secret_token is not None and hmac.compare_digest(secret_token, self.secret_token):
+            return True
+        metrics.increment('webhook_dropped', 'invalid_secret')
+        return False
+
+    def parse(self, body: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Parses the raw update and checks, if it could be handled.
+
+        Args:
+            body: the body of the webhook request.
+        Returns:
+            the parsed update, ready for ``telegram.Update.de_json``, or ``None``, if the update is dropped.
+        """
+        try:
+            update = _loads(body)
+        except ValueError:
+            metrics.increment('webhook_dropped', 'invalid_json')
+            return None
+        if not isinstance(update, dict):
+            metrics.increment('webhook_dropped', 'invalid_json')
+            return None
+
+        message = update.get('message') or update.get('edited_message')
+        if message is not None and not self._is_relevant(message):
+            metrics.increment('webhook_dropped', 'group_message')
+            return None
+
+        metrics.increment('webhook_accepted')
+        return update
+
+    def _is_relevant(self, message: Dict[str, Any]) -> bool:
+        chat = message.get('chat') or {}
+        if chat.get('type') == 'private':
+            return True
+
+        entities = message.get('entities')
+        if entities and entities[0].get('type') == 'bot_command' and entities[0].get('offset') == 0:
+            return True
+
+        for key in _STATUS_UPDATE_KEYS:
+            if key in message:
+                return True
+
+        reply_to = message.get('reply_to_message')
+        if reply_to is not None and (reply_to.get('from') or {}).get('id') == self.bot_id:
+            return True
+
+        user_id = (message.get('from') or {}).get('id')
+        key = (chat.get('id'), user_id)
+        return any(key in handler.conversations for handler in self.conversation_handlers)
+
+
+__all__ = [
+    'UpdatePrefilter',
+    'SECRET_TOKEN_HEADER'
+]
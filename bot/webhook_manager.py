@@ -0,0 +1,215 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains the :class:`WebhookManager` class, that registers the webhook of the bot
+and monitors the backlog of the pending updates.
+
+Examples:
+    >>> manager = WebhookManager(bot, WEBHOOK_URL, allowed_updates=get_allowed_updates(dispatcher),
+    ...                          max_connections=WEB_CONCURRENCY * WEB_THREADS, secret_token=WEBHOOK_SECRET)
+    >>> manager.ensure_registered()
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from telegram import Bot
+from telegram.error import TelegramError
+from telegram.ext import (
+    CallbackQueryHandler, CommandHandler, ConversationHandler, Dispatcher, Handler, MessageHandler, TypeHandler
+)
+
+from app_logging import get_logger
+from app_logging.metrics import metrics
+from bot.command_router import CommandRouter
+from sql import create_session, get_engine
+from sql.domain import BotSetting
+
+
+logger = get_logger(__name__)
+
+MAX_CONNECTIONS_LIMIT = 100
+"""The maximum value of ``max_connections``, allowed by Telegram."""
+BACKLOG_WARNING_THRESHOLD = 100
+"""The number of the pending updates, the warning is logged after."""
+
+_MESSAGE_UPDATES = ['message', 'edited_message']
+# The update types, the handlers of the given class are checked for.
+# The message handlers of the bot don't handle the channel posts, so they aren't requested.
+_HANDLER_UPDATE_TYPES = [
+    (CommandRouter, _MESSAGE_UPDATES),
+    (CommandHandler, _MESSAGE_UPDATES),
+    (MessageHandler, _MESSAGE_UPDATES),
+    (CallbackQueryHandler, ['callback_query']),
+]
+
+
+def get_allowed_updates(dispatcher: Dispatcher) -> Optional[List[str]]:
+    """
+    Returns the update types, the registered handlers of the ``dispatcher`` could handle.
+
+    Note:
+        The :class:`telegram.ext.TypeHandler` handlers are skipped, they are used to check all updates
+        (e.g. for the duplicates), not to handle some of them.
+
+    Returns:
+        the sorted list of the update types,
+        or ``None`` (all types), if there is the handler of the unknown class.
+    """
+    allowed: Set[str] = set()
+    for handlers in dispatcher.handlers.values():
+        for handler in handlers:
+            update_types = _get_handler_update_types(handler)
+            if update_types is None:
+                logger.warning(f'Cannot find the update types for the handler {handler}, all types are allowed.')
+                return None
+            allowed.update(update_types)
+    return sorted(allowed)
+
+
+def _get_handler_update_types(handler: Handler) -> Optional[Set[str]]:
+    if isinstance(handler, TypeHandler):
+        return set()
+    if isinstance(handler, ConversationHandler):
+        update_types = set()
+        nested = list(handler.entry_points) + list(handler.fallbacks)
+        for state_handlers in handler.states.values():
+            nested.extend(state_handlers)
+        for nested_handler in nested:
+            nested_types = _get_handler_update_types(nested_handler)
+            if nested_types is None:
+                return None
+            update_types.update(nested_types)
+        return update_types
+    for handler_class, update_types in _HANDLER_UPDATE_TYPES:
+        if isinstance(handler, handler_class):
+            return set(update_types)
+    return None
+
+
+class WebhookManager:
+    """
+    Registers the webhook only when its config (url, allowed updates, max connections, secret) was changed.
+
+    The hash of the registered config is stored in the 'bot_setting' table,
+    so the workers, started after the first one, don't call 'setWebhook' again.
+
+    The latest webhook info (the number of the pending updates, the last error) is published
+    as the ``webhook`` gauge, it's refreshed by the ``bot.scheduler``.
+    """
+
+    def __init__(self, bot: Bot, url: str, allowed_updates: Optional[Iterable[str]] = None,
+                 max_connections: int = 40, secret_token: Optional[str] = None) -> None:
+        """
+        Args:
+            bot: the bot to register the webhook for.
+            url: the url of the webhook.
+            allowed_updates: the update types, Telegram should send, ``None`` for all types.
+            max_connections: the maximum number of the concurrent requests to the webhook.
+            secret_token: the token, Telegram should send in the ``X-Telegram-Bot-Api-Secret-Token`` header.
+        """
+        self.bot = bot
+        self.url = url
+        self.allowed_updates = sorted(allowed_updates) if allowed_updates is not None else None
+        self.max_connections = max(1, min(max_connections, MAX_CONNECTIONS_LIMIT))
+        self.secret_token = secret_token
+        self._info: Dict[str, Any] = {}
+
+        metrics.register_gauge('webhook', lambda: self._info)
+
+    @property
+    def config_hash(self) -> str:
+        """The hash of the webhook config. The secret token is included only as its hash."""
+        config = {
+            'url': self.url,
+            'allowed_updates': self.allowed_updates,
+            'max_connections': self.max_connections,
+            'secret_token': hashlib.sha256(self.secret_token.encode()).hexdigest() if self.secret_token else None,
+        }
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+    def ensure_registered(self) -> bool:
+        """
+        Sets the webhook, if its config was changed or the webhook url is different from the expected one.
+
+        Returns:
+            ``True`` if the webhook was set.
+        """
+        config_hash = self.config_hash
+        session = create_session()
+        setting: Optional[BotSetting] = session.query(BotSetting).get(BotSetting.WEBHOOK_CONFIG_HASH)
+        session.close()
+        webhook_url = self.refresh_info().get('url')
+        if setting is not None and setting.value == config_hash and webhook_url == self.url:
+            logger.info('The webhook config is not changed.')
+            return False
+
+        self.bot.set_webhook(self.url, max_connections=self.max_connections, allowed_updates=self.allowed_updates,
+                             api_kwargs={'secret_token': self.secret_token} if self.secret_token else None)
+        self._save_config_hash(config_hash)
+        logger.info(f'The webhook was set: url={self.url}, max_connections={self.max_connections}, '
+                    f'allowed_updates={self.allowed_updates}')
+        self.refresh_info()
+        return True
+
+    @staticmethod
+    def _save_config_hash(config_hash: str) -> None:
+        # Each worker registers the webhook at the startup, so the row could be inserted by several of them at once
+        engine = get_engine()
+        table = BotSetting.__table__
+        values = {'key': BotSetting.WEBHOOK_CONFIG_HASH, 'value': config_hash, 'updated_at': datetime.now()}
+        update = table.update().where(table.c.key == values['key']).values(value=values['value'],
+                                                                           updated_at=values['updated_at'])
+        if engine.dialect.name == 'postgresql':
+            statement = pg_insert(table).values(**values)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.key],
+                set_={'value': statement.excluded.value, 'updated_at': statement.excluded.updated_at})
+            with engine.begin() as connection:
+                connection.execute(statement)
+            return
+
+        with engine.begin() as connection:
+            if connection.execute(update).rowcount:
+                return
+        try:
+            with engine.begin() as connection:
+                connection.execute(table.insert().values(**values))
+        except IntegrityError:
+            # Inserted by another worker in the meantime
+            with engine.begin() as connection:
+                connection.execute(update)
+
+    def refresh_info(self) -> Dict[str, Any]:
+        """
+        Requests the webhook info from Telegram and publishes it to the ``webhook`` gauge.
+        Called by the ``bot.scheduler`` periodically.
+
+        Returns:
+            the webhook info, or the previous one, if the request failed.
+        """
+        try:
+            info = self.bot.get_webhook_info()
+        except TelegramError as e:
+            logger.warning(f'Cannot get the webhook info: {e}')
+            return self._info
+
+        self._info = {
+            'url': info.url,
+            'pending_update_count': info.pending_update_count,
+            'max_connections': info.max_connections,
+            'allowed_updates': info.allowed_updates,
+            'last_error_date': info.last_error_date,
+            'last_error_message': info.last_error_message,
+        }
+        if info.pending_update_count > BACKLOG_WARNING_THRESHOLD:
+            logger.warning(f'There are {info.pending_update_count} pending updates in the webhook queue.')
+        return self._info
+
+
+__all__ = [
+    'WebhookManager',
+    'get_allowed_updates'
+]
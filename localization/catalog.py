@@ -0,0 +1,141 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains the classes of the message catalog, compiled once at the startup.
+
+* ``static_reply`` - the static reply, built once and shared by all calls.
+* :class:`Template` - the dynamic reply, parsed once and rendered with the given values.
+* :class:`Catalog` - the replies for all languages with the fallback to the default one.
+
+Examples:
+    >>> catalog = Catalog({'en': {
+    ...     'hello': Template('Hello, *{name!e}*\\!', parse_mode=ParseMode.MARKDOWN_V2),
+    ...     'bye': static_reply('Bye.')
+    ... }})
+    >>> catalog.get('hello', 'uk').render(name='Vlad')
+    {'parse_mode': 'MarkdownV2', 'text': 'Hello, *Vlad*\\\\!'}
+    >>> catalog.get('bye')
+    mappingproxy({'text': 'Bye.'})
+"""
+import html
+from string import Formatter
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
+
+from telegram import ParseMode
+
+
+DEFAULT_LANGUAGE = 'en'
+
+# The same characters, as escaped by ``telegram.utils.helpers.escape_markdown``,
+# but translated in one pass instead of compiling the regular expression on each call
+_MARKDOWN_ESCAPE_TABLE = str.maketrans({char: '\\' + char for char in r'_*`['})
+_MARKDOWN_V2_ESCAPE_TABLE = str.maketrans({char: '\\' + char for char in r'_*[]()~`>#+-=|{}.!'})
+
+
+def static_reply(text: str, **options) -> Mapping[str, Any]:
+    """
+    Creates the immutable static reply.
+
+    Args:
+        text: the text of the reply.
+        options: other arguments of the ``send_message`` method (e.g. ``parse_mode``).
+    Returns:
+        the read-only mapping, that can be unpacked by the ****** operator.
+    """
+    return MappingProxyType({'text': text, **options})
+
+
+class Template:
+    """
+    The dynamic reply, parsed once to the list of the literals and the fields.
+
+    The fields use the :meth:`str.format` syntax with the additional conversions:
+
+    * ``!e`` - escapes the value for the ``parse_mode`` of the template.
+    * ``!c`` - capitalizes the value.
+    """
+
+    __slots__ = ('source', '_literals', '_fields', '_options')
+
+    def __init__(self, source: str, **options) -> None:
+        """
+        Args:
+            source: the text of the reply with the fields in the :meth:`str.format` syntax.
+            options: other arguments of the ``send_message`` method (e.g. ``parse_mode``).
+        """
+        self.source = source
+        self._options = options
+
+        escape = self._get_escape(options.get('parse_mode'))
+        self._literals: List[str] = []
+        # (index in the literals list, field name, converter)
+        self._fields: List[Tuple[int, str, Optional[Callable[[str], str]]]] = []
+        for literal, field_name, format_spec, conversion in Formatter().parse(source):
+            if literal:
+                self._literals.append(literal)
+            if field_name is None:
+                continue
+            if format_spec:
+                raise ValueError(f'Format specs are not supported in templates: {source!r}')
+            converter = {None: None, 'e': escape, 'c': str.capitalize, 's': None}[conversion]
+            self._fields.append((len(self._literals), field_name, converter))
+            # Placeholder for the value, replaced in the ``text`` method
+            self._literals.append('')
+
+    def text(self, **values) -> str:
+        """Returns the text of the template with the given ``values`` inserted."""
+        parts = self._literals.copy()
+        for index, field_name, converter in self._fields:
+            value = str(values[field_name])
+            parts[index] = converter(value) if converter else value
+        return ''.join(parts)
+
+    def render(self, **values) -> Dict[str, Any]:
+        """Returns the reply with the text of the template, that can be unpacked by the ****** operator."""
+        return {**self._options, 'text': self.text(**values)}
+
+    @staticmethod
+    def _get_escape(parse_mode: Optional[str]) -> Callable[[str], str]:
+        if parse_mode == ParseMode.MARKDOWN_V2:
+            return lambda value: value.translate(_MARKDOWN_V2_ESCAPE_TABLE)
+        if parse_mode == ParseMode.MARKDOWN:
+            return lambda value: value.translate(_MARKDOWN_ESCAPE_TABLE)
+        if parse_mode == ParseMode.HTML:
+            return html.escape
+        return str
+
+
+CatalogEntry = Union[Mapping[str, Any], Template]
+
+
+class Catalog:
+    """The replies for all supported languages. Missing replies are taken from the ``DEFAULT_LANGUAGE``."""
+
+    def __init__(self, replies: Dict[str, Dict[str, CatalogEntry]]) -> None:
+        """
+        Args:
+            replies: the language code -> the reply key -> ``static_reply`` or :class:`Template`.
+        """
+        default = replies[DEFAULT_LANGUAGE]
+        # Merging the fallback once, so the lookup is a single dict access
+        self._replies: Dict[str, Dict[str, CatalogEntry]] = {
+            lang: {**default, **lang_replies} for lang, lang_replies in replies.items()
+        }
+        self._default = self._replies[DEFAULT_LANGUAGE]
+
+    @property
+    def languages(self) -> Tuple[str, ...]:
+        """The codes of the supported languages."""
+        return tuple(self._replies)
+
+    def get(self, key: str, lang: str = DEFAULT_LANGUAGE) -> Any:
+        """Returns the reply for the ``key`` in the ``lang`` or in the ``DEFAULT_LANGUAGE``, if not supported."""
+        return self._replies.get(lang, self._default)[key]
+
+
+__all__ = [
+    'DEFAULT_LANGUAGE',
+    'static_reply',
+    'Template',
+    'Catalog'
+]
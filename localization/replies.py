@@ -3,8 +3,13 @@
 """
 In this module defines all text constants used by the bot to create text replies.
 
-All functions returns :class:`dict`, that contains arguments, needed to display message correctly,
-like ``parse_mode`` or ``disable_web_page_preview``.
+All functions returns :class:`dict` (or the read-only mapping for the static replies),
+that contains arguments, needed to display message correctly, like ``parse_mode`` or ``disable_web_page_preview``.
+
+The replies are compiled once to the message catalog (see ``localization.catalog``):
+the static replies are prebuilt, and the dynamic ones are parsed to the templates,
+so only the values are inserted on each call.
+The replies missing in the requested language are taken from the English catalog.
 
 Examples:
     >>> bot.send_message(**create_queue_exist(queue_name='name', lang='en'))
@@ -12,354 +17,465 @@ Examples:
 See Also:
     :class:`telegram.bot.Bot`
 """
-from typing import List
+from datetime import datetime
+from typing import List, Optional, TYPE_CHECKING
 
 from telegram import ParseMode
-from telegram.utils.helpers import escape_markdown
 
 from app_logging import get_logger
+from localization.catalog import Catalog, Template, static_reply
+
+if TYPE_CHECKING:
+    from sql.repository import QueueSummary
 
 
 logger = get_logger(__name__)
 
+_en = {
+    'private_unaccepted': static_reply(
+        'Add me to the group first.)\n\n'
+        'Type /help for more information.'),
+
+    'start_message_private': Template(
+        "Hello, {fullname}!\n"
+        "This bot helps you to create and manage queues in your group. Just add it to the group and type \n"
+        "/create_queue <queue name> \n"
+        "command.\n"
+        "\n"
+        "To see the help type /help\n"
+        "To the the detailed info about the bot type /about_me."),
+
+    'start_message_chat': Template(
+        'Hello, [{fullname}](tg://user?id={user_id})\! \n'
+        'I\'ve already here and waiting for your commands\.😉\n\n'
+        'If you are a little bit perplexed, don\'t worry, type /help to get the short instruction\.🤗😌',
+        parse_mode=ParseMode.MARKDOWN_V2),
+
+    'create_queue_exist': Template(
+        "Sorry, but the queue with the given name *{queue_name!e}* already exists\.",
+        parse_mode=ParseMode.MARKDOWN_V2),
+
+    'create_queue_empty_name': static_reply(
+        'Queue name cannot be empty. '
+        'To create a new queue, type \n'
+        '`/create_queue <name>`.',
+        parse_mode=ParseMode.MARKDOWN),
+
+    'no_rights_to_pin_message': static_reply(
+        "I have no rights to pin this message.😢😒\n"
+        "Give me this permission or ask your admin to pin manually."),
+
+    'no_rights_to_unpin_message': static_reply(
+        "I would unpin that queue with pleasure, but you didn't give me the necessary rights.😢😒\n"
+        "Give me this permission or ask your admin to unpin manually."),
+
+    'delete_queue_empty_name': static_reply(
+        'Queue name cannot be empty. '
+        'To delete the queue, type \n'
+        '`/delete_queue <name>`.',
+        parse_mode=ParseMode.MARKDOWN),
+
+    'queue_not_exist': Template(
+        "Sorry, but the queue with the given name *{queue_name}* doesn't exist.",
+        parse_mode=ParseMode.MARKDOWN),
+
+    'deleted_queue_message': static_reply("The queue was deleted."),
+
+    'show_queues_header': Template("Active Queues:\n\n", parse_mode=ParseMode.MARKDOWN_V2),
+    'show_queues_line': Template('• *{queue_name!e}* — turn {current_order} of {members_count}, '
+                                 'last activity {last_activity!e} ago\n', parse_mode=ParseMode.MARKDOWN_V2),
+    'show_queues_page': Template('\n_Page {page} of {pages}_', parse_mode=ParseMode.MARKDOWN_V2),
+
+    'show_queue_members_header': Template("*{queue_name!e}*\n\n", parse_mode=ParseMode.MARKDOWN_V2),
+    'show_queue_members_empty': Template('No members here yet\.', parse_mode=ParseMode.MARKDOWN_V2),
+    'show_queue_members_title': Template("Members:\n", parse_mode=ParseMode.MARKDOWN_V2),
+    'show_queue_members_line': Template('{index}\. {member_name!e}\n', parse_mode=ParseMode.MARKDOWN_V2),
+    'show_queue_members_current_line': Template('{index}\. *{member_name!e}*\n', parse_mode=ParseMode.MARKDOWN_V2),
+    'show_queue_members_turn_time': Template("\n_⏱ About {duration!e} per turn_", parse_mode=ParseMode.MARKDOWN_V2),
+
+    'show_queues_message_empty': static_reply(
+        "There no queues in this chat created yet.\n\n"
+        "To create a queue, type\n"
+        "`/create_queue <name>`",
+        parse_mode=ParseMode.MARKDOWN),
+
+    'command_empty_queue_name': Template(
+        "You must specify a queue name or reply to the message with the queue.\n"
+        "Usage: `/{command_name} <name>`",
+        parse_mode=ParseMode.MARKDOWN),
+
+    'already_in_the_queue': static_reply("You are already in this queue."),
+
+    'not_in_the_queue_yet': static_reply("You haven't been registered in this queue yet."),
+
+    'cannot_skip': static_reply(
+        "You are alone or the last one in this queue, so, there no sense in the skip command..."),
+
+    'next_reached_queue_end': static_reply("The queue has reached the end."),
+
+    'next_member_notify': Template(
+        "[{fullname!c}](tg://user?id={user_id}), "
+        "your turn has come in the queue *{queue_name}*\!",
+        parse_mode=ParseMode.MARKDOWN_V2),
+
+    'reply_to_wrong_message_message': static_reply(
+        'You must reply to the message, contains queue members, to make the command works without arguments.\n'
+        '_Note_: the queue must be active (not deleted).',
+        parse_mode=ParseMode.MARKDOWN),
+
+    'notify_all_disabled_message': static_reply(
+        'The messages with new queues *will not* be pinned more.\n\n'
+        '_And members in this chat will not be notified when a new queue will be created..._',
+        parse_mode=ParseMode.MARKDOWN),
+
+    'notify_all_enabled_message': static_reply(
+        'The messages with new queues *will be* pinned!\n\n',
+        parse_mode=ParseMode.MARKDOWN),
+
+    'about_me_message': static_reply(
+        "Having troubles with managing queues in your group? Want to make queues maximum honest and objective? "
+        "Well, this is the decision!\n "
+        "I'm QueueBot and I'll help you to do all stuff related to queues and managing them."
+        "\n\n"
+        "Just add me to the group and type \n"
+        "/create_queue &lt;queue name&gt; \n"
+        "command to create a queue. You can also type give me the rights to pin the messages"
+        " before creating any queue to notify "
+        "group members when some queue was created. This will help them to be in touch and don't miss the new "
+        "queues, they could want to participate in.\n "
+        "You can then add yourself to the created queue by typing\n"
+        "/add_me &lt;queue name&gt; \n"
+        "command. \n"
+        "And, at the end, type \n"
+        "/next &lt;queue name&gt; \n"
+        "command to notify a group member, whose turn came and move the queue further.\n"
+        "\n"
+        "My creator said that he will be very thankful for your feedback, any suggestions are welcomed and bug "
+        "reports are priceless!\n "
+        "\n"
+        "Bot version: unreleased.\n"
+        "Developer: @l3_l_a_cl\n"
+        "Github repository: <a href='https://github.com/BlaD200/QueueTGBot'>link</a>\n",
+        parse_mode=ParseMode.HTML, disable_web_page_preview=True),
+
+    'help_message_private': static_reply(
+        "Add this bot to the group and type\n"
+        "/create\_queue <queue name> \n"
+        "command to create a queue. You _should_ also give this bot the rights to *pin* the messages "
+        "before creating any queue to notify group members when some queue was created. "
+        "You can then add yourself to the created queue by typing\n"
+        "/add\_me <queue name> \n"
+        "command. \n"
+        "And, in the end, type \n"
+        "/next <queue name> \n"
+        "command to notify a group member, whose turn came and move the queue further.\n"
+        "For your comfort, you can reply with command add\_me, remove\_me, skip\_me, next, and show\_members to "
+        "the message with queue and don't type the name by hand.)☺\n"
+        "\n"
+        "You can also type '/' to see all available commands.\n",
+        parse_mode=ParseMode.MARKDOWN),
+
+    'help_message_in_chat': static_reply(
+        'Alright, I\'ve already in the group.🥳\n'
+        'Now, give me the rights to *pin* the messages, so your group members will be *notified* '
+        'when the queue will be created!'
+        '\n\n'
+        'Done? Amazing!) To create a new queue send \n'
+        '/create\_queue <queue name> \n'
+        'command. And don\'t forget to type the future queue\'s *name*.)👍 '
+        '\n\n'
+        'Next step is to become the *participant* in the created queue.✅ '
+        'To do this, just reply to the message, with the corresponding queue, '
+        'with the /add\_me command. (You can also leave the queue by sending /remove\_me command) '
+        '\n\n'
+        'And the last important thing: when the time comes, to move your queue further, '
+        'just reply to the queue with the /next command, and the next member will be notified, '
+        'so no one will skip their turn!💪'
+        '\n\n'
+        'So simple, yes?) Well, good luck, _and let there be only honest queues._😎😎',
+        parse_mode=ParseMode.MARKDOWN),
+
+    'unknown_command': static_reply(
+        "Unknown command. \n"
+        "To see the help type /help or type '/' to see the hints for commands, "
+        "press tab and complete selected command by adding required arguments."),
+
+    'unimplemented_command': static_reply(
+        "This command hasn't been implemented yet.😔😔\n"
+        "Type /about_me to contact the developer."),
+
+    'unexpected_error': static_reply("Something went wrong...😢😢"),
+
+    'auto_next_usage': static_reply(
+        "To move the queue automatically after some minutes without activity, "
+        "reply to the message with the queue or specify its name:\n"
+        "`/auto_next <minutes> <queue name>`\n\n"
+        "Send `/auto_next 0 <queue name>` to disable it.",
+        parse_mode=ParseMode.MARKDOWN),
+
+    'auto_next_enabled_message': Template(
+        "The queue *{queue_name!e}* will move to the next member "
+        "after {minutes} minutes without activity\.",
+        parse_mode=ParseMode.MARKDOWN_V2),
+
+    'auto_next_disabled_message': Template(
+        "The queue *{queue_name!e}* will not move automatically anymore\.",
+        parse_mode=ParseMode.MARKDOWN_V2),
+
+    'priority_usage': Template(
+        "The admins of the chat could move the member, who missed the turn (e.g. because of the technical problems), "
+        "to the priority lane. Reply to the message of the member or specify his user id:\n"
+        "`/priority <level from 0 to {max_priority}> [user id] <queue name>`\n\n"
+        "The members with the higher level go first. Send `/priority 0 <queue name>` "
+        "(or reply with `/priority 0` to the message with the queue) to return to the usual order.",
+        parse_mode=ParseMode.MARKDOWN),
+
+    'priority_admins_only': static_reply("Only the admins of the chat can set the priority of the members."),
+
+    'priority_member_not_in_queue': static_reply("This user isn't waiting for the turn in this queue."),
+
+    'priority_set_message': Template(
+        "Your priority in the queue *{queue_name!e}* is {priority} now, "
+        "there are {members_ahead} turns before yours\.",
+        parse_mode=ParseMode.MARKDOWN_V2),
+
+    'priority_set_for_member_message': Template(
+        "The priority of {fullname!e} in the queue *{queue_name!e}* is {priority} now, "
+        "there are {members_ahead} turns before the turn\.",
+        parse_mode=ParseMode.MARKDOWN_V2),
+
+    'next_soon_notify': Template(
+        "[{fullname!e}](tg://user?id={user_id}), "
+        "you are next in the queue *{queue_name!e}* in about {minutes} minutes\!",
+        parse_mode=ParseMode.MARKDOWN_V2),
+
+    'my_position_message': Template(
+        "There are {members_ahead} turns before yours in the queue *{queue_name!e}*\.",
+        parse_mode=ParseMode.MARKDOWN_V2),
+    'my_position_eta': Template(
+        "\nYour turn will come in about {duration!e}\.",
+        parse_mode=ParseMode.MARKDOWN_V2),
+    'my_position_no_eta': Template(
+        "\nThere is not enough history in this queue to estimate the waiting time yet\.",
+        parse_mode=ParseMode.MARKDOWN_V2),
+
+    'my_position_reached': Template(
+        "Your turn in the queue *{queue_name!e}* has already come\.",
+        parse_mode=ParseMode.MARKDOWN_V2),
+
+    'duration_less_than_minute': Template('less than a minute'),
+    'duration_minutes': Template('{minutes} min'),
+    'duration_hours': Template('{hours} h'),
+}
+
+_catalog = Catalog({
+    'en': _en
+})
+
+
+def get_supported_languages():
+    """Returns the codes of the languages, the replies are translated to."""
+    return _catalog.languages
+
 
 def private_unaccepted(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = (f'Add me to the group first.)\n\n'
-                'Type /help for more information.')
-    else:
-        text = "TODO"
-    return {'text': text}
+    return _catalog.get('private_unaccepted', lang)
 
 
 def start_message_private(fullname: str, lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = (f"Hello, {fullname}!\n"
-                f"This bot helps you to create and manage queues in your group. Just add it to the group and type \n"
-                f"/create_queue <queue name> \n"
-                f"command.\n"
-                f"\n"
-                f"To see the help type /help\n"
-                f"To the the detailed info about the bot type /about_me.")
-    else:
-        text = "TODO"
-    return {'text': text}
+    return _catalog.get('start_message_private', lang).render(fullname=fullname)
 
 
 def start_message_chat(fullname: str, user_id: str, lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = (f'Hello, [{fullname}](tg://user?id={user_id})\! \n'
-                'I\'ve already here and waiting for your commands\.😉\n\n'
-                'If you are a little bit perplexed, don\'t worry, type /help to get the short instruction\.🤗😌')
-    else:
-        text = "TODO"
-    return {'text': text, 'parse_mode': ParseMode.MARKDOWN_V2}
+    return _catalog.get('start_message_chat', lang).render(fullname=fullname, user_id=user_id)
 
 
 def create_queue_exist(queue_name: str, lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = f"Sorry, but the queue with the given name *{escape_markdown(queue_name, 2)}* already exists\."
-    else:
-        text = "TODO"
-    return {'text': text, 'parse_mode': ParseMode.MARKDOWN_V2}
+    return _catalog.get('create_queue_exist', lang).render(queue_name=queue_name)
 
 
 def create_queue_empty_name(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = ('Queue name cannot be empty. '
-                'To create a new queue, type \n'
-                '`/create_queue <name>`.')
-    else:
-        text = "TODO"
-    return {'text': text, 'parse_mode': ParseMode.MARKDOWN}
+    return _catalog.get('create_queue_empty_name', lang)
 
 
 def no_rights_to_pin_message(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = "I have no rights to pin this message.😢😒\n" \
-               "Give me this permission or ask your admin to pin manually."
-    else:
-        text = "TODO"
-    return {'text': text}
+    return _catalog.get('no_rights_to_pin_message', lang)
 
 
 def no_rights_to_unpin_message(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = "I would unpin that queue with pleasure, but you didn't give me the necessary rights.😢😒\n" \
-               "Give me this permission or ask your admin to unpin manually."
-    else:
-        text = "TODO"
-    return {'text': text}
+    return _catalog.get('no_rights_to_unpin_message', lang)
 
 
 def delete_queue_empty_name(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = ('Queue name cannot be empty. '
-                'To delete the queue, type \n'
-                '`/delete_queue <name>`.')
-    else:
-        text = "TODO"
-    return {'text': text, 'parse_mode': ParseMode.MARKDOWN}
+    return _catalog.get('delete_queue_empty_name', lang)
 
 
 def queue_not_exist(queue_name: str, lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = f"Sorry, but the queue with the given name *{queue_name}* doesn't exist."
-    else:
-        text = "TODO"
-    return {'text': text, 'parse_mode': ParseMode.MARKDOWN}
+    return _catalog.get('queue_not_exist', lang).render(queue_name=queue_name)
 
 
 def deleted_queue_message(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = "The queue was deleted."
-    else:
-        text = "TODO"
-    return {'text': text}
+    return _catalog.get('deleted_queue_message', lang)
+
+
+def show_queues_message(queues: List['QueueSummary'], page: int = 0, pages: int = 1,
+                        now: Optional[datetime] = None, lang: str = 'en'):
+    """
+    Args:
+        queues: the queues on the page (:class:`sql.repository.QueueSummary`).
+        page: the number of the page, starting from 0.
+        pages: the total number of the pages, the number of the page is shown only if there are several pages.
+        now: the time, the last activity in the queues is counted to.
+    """
+    now = now or datetime.now()
+    line = _catalog.get('show_queues_line', lang)
+    text = _catalog.get('show_queues_header', lang).text() + ''.join(
+        [line.text(queue_name=queue.name, current_order=queue.current_order, members_count=queue.members_count,
+                   last_activity=_format_minutes((now - queue.last_activity_at).total_seconds() / 60, lang))
+         for queue in queues])
+    if pages > 1:
+        text += _catalog.get('show_queues_page', lang).text(page=page + 1, pages=pages)
+    return {'text': text, 'parse_mode': ParseMode.MARKDOWN_V2}
 
 
-def show_queues_message(queues: List[str], lang: str = 'en'):
-    queue_names_formatted_list = [f'• *{queue_name}*\n' for queue_name in queues]
-    text: str
-    if lang == 'en':
-        text = ("Active Queues:\n\n"
-                f"{''.join(queue_names_formatted_list)}")
-    else:
-        text = "TODO"
-    return {'text': text, 'parse_mode': ParseMode.MARKDOWN}
-
-
-def show_queue_members(queue_name: str, members: List[str] = None, current_member: int = 0, lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        if not members:
-            queue_members_formatted = 'No members here yet\.'
-        else:
-            queue_members_formatted = "Members:\n" + (
-                ''.join(
-                    [f'{i}\. '
-                     f'{(lambda member: member if i != current_member else f"*{member}*")(escape_markdown(member_name, 2))}'
-                     f'\n'
-                     for (i, member_name) in enumerate(members)]))
-        queue_name_escaped = escape_markdown(queue_name, 2)
-        text = (f"*{queue_name_escaped}*\n\n"
-                f"{queue_members_formatted}")
+def show_queue_members(queue_name: str, members: List[str] = None, current_member: int = 0,
+                       turn_minutes: Optional[float] = None, lang: str = 'en'):
+    text = _catalog.get('show_queue_members_header', lang).text(queue_name=queue_name)
+    if not members:
+        text += _catalog.get('show_queue_members_empty', lang).text()
     else:
-        text = "TODO"
+        line = _catalog.get('show_queue_members_line', lang)
+        current_line = _catalog.get('show_queue_members_current_line', lang)
+        text += _catalog.get('show_queue_members_title', lang).text() + ''.join(
+            [(current_line if i == current_member else line).text(index=i, member_name=member_name)
+             for (i, member_name) in enumerate(members)])
+        if turn_minutes is not None:
+            text += _catalog.get('show_queue_members_turn_time', lang).text(
+                duration=_format_minutes(turn_minutes, lang))
     return {'text': text, 'parse_mode': ParseMode.MARKDOWN_V2}
 
 
 def show_queues_message_empty(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = ("There no queues in this chat created yet.\n\n"
-                "To create a queue, type\n"
-                "`/create_queue <name>`")
-    else:
-        text = "TODO"
-    return {'text': text, 'parse_mode': ParseMode.MARKDOWN}
+    return _catalog.get('show_queues_message_empty', lang)
 
 
 def command_empty_queue_name(command_name: str, lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = ("You must specify a queue name or reply to the message with the queue.\n"
-                f"Usage: `/{command_name} <name>`")
-    else:
-        text = "TODO"
-    return {'text': text, 'parse_mode': ParseMode.MARKDOWN}
+    return _catalog.get('command_empty_queue_name', lang).render(command_name=command_name)
 
 
 def already_in_the_queue(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = "You are already in this queue."
-    else:
-        text = "TODO"
-    return {'text': text}
+    return _catalog.get('already_in_the_queue', lang)
 
 
 def not_in_the_queue_yet(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = "You haven't been registered in this queue yet."
-    else:
-        text = "TODO"
-    return {'text': text}
+    return _catalog.get('not_in_the_queue_yet', lang)
 
 
 def cannot_skip(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = "You are alone or the last one in this queue, so, there no sense in the skip command..."
-    else:
-        text = "TODO"
-    return {'text': text}
+    return _catalog.get('cannot_skip', lang)
 
 
 def next_reached_queue_end(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = "The queue has reached the end."
-    else:
-        text = "TODO"
-    return {'text': text}
+    return _catalog.get('next_reached_queue_end', lang)
 
 
 def next_member_notify(fullname: str, user_id: int, queue_name: str, lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = f"[{fullname.capitalize()}](tg://user?id={user_id}), " \
-               f"your turn has come in the queue *{queue_name}*\!"
-    else:
-        text = "TODO"
-    return {'text': text, 'parse_mode': ParseMode.MARKDOWN_V2}
+    return _catalog.get('next_member_notify', lang).render(fullname=fullname, user_id=user_id, queue_name=queue_name)
 
 
 def reply_to_wrong_message_message(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = 'You must reply to the message, contains queue members, to make the command works without arguments.\n' \
-               '_Note_: the queue must be active (not deleted).'
-    else:
-        text = "TODO"
-    return {'text': text, 'parse_mode': ParseMode.MARKDOWN}
+    return _catalog.get('reply_to_wrong_message_message', lang)
 
 
 def notify_all_disabled_message(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = 'The messages with new queues *will not* be pinned more.\n\n' \
-               '_And members in this chat will not be notified when a new queue will be created..._'
-    else:
-        text = "TODO"
-    return {'text': text, 'parse_mode': ParseMode.MARKDOWN}
+    return _catalog.get('notify_all_disabled_message', lang)
 
 
 def notify_all_enabled_message(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = 'The messages with new queues *will be* pinned!\n\n'
-    else:
-        text = "TODO"
-    return {'text': text, 'parse_mode': ParseMode.MARKDOWN}
+    return _catalog.get('notify_all_enabled_message', lang)
 
 
 def about_me_message(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = (
-            "Having troubles with managing queues in your group? Want to make queues maximum honest and objective? "
-            "Well, this is the decision!\n "
-            "I'm QueueBot and I'll help you to do all stuff related to queues and managing them."
-            "\n\n"
-            "Just add me to the group and type \n"
-            "/create_queue &lt;queue name&gt; \n"
-            "command to create a queue. You can also type give me the rights to pin the messages"
-            " before creating any queue to notify "
-            "group members when some queue was created. This will help them to be in touch and don't miss the new "
-            "queues, they could want to participate in.\n "
-            "You can then add yourself to the created queue by typing\n"
-            "/add_me &lt;queue name&gt; \n"
-            "command. \n"
-            "And, at the end, type \n"
-            "/next &lt;queue name&gt; \n"
-            "command to notify a group member, whose turn came and move the queue further.\n"
-            "\n"
-            "My creator said that he will be very thankful for your feedback, any suggestions are welcomed and bug "
-            "reports are priceless!\n "
-            "\n"
-            "Bot version: unreleased.\n"
-            "Developer: @l3_l_a_cl\n"
-            "Github repository: <a href='https://github.com/BlaD200/QueueTGBot'>link</a>\n")
-    else:
-        text = 'TODO'
-
-    return {'text': text, 'parse_mode': ParseMode.HTML, 'disable_web_page_preview': True}
+    return _catalog.get('about_me_message', lang)
 
 
 def help_message_private(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = ("Add this bot to the group and type\n"
-                "/create\_queue <queue name> \n"
-                "command to create a queue. You _should_ also give this bot the rights to *pin* the messages "
-                "before creating any queue to notify group members when some queue was created. "
-                "You can then add yourself to the created queue by typing\n"
-                "/add\_me <queue name> \n"
-                "command. \n"
-                "And, in the end, type \n"
-                "/next <queue name> \n"
-                "command to notify a group member, whose turn came and move the queue further.\n"
-                "For your comfort, you can reply with command add\_me, remove\_me, skip\_me, next, and show\_members to "
-                "the message with queue and don't type the name by hand.)☺\n"
-                "\n"
-                "You can also type '/' to see all available commands.\n")
-    else:
-        text = "TODO"
-    return {'text': text, 'parse_mode': ParseMode.MARKDOWN}
+    return _catalog.get('help_message_private', lang)
 
 
 def help_message_in_chat(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = ('Alright, I\'ve already in the group.🥳\n'
-                'Now, give me the rights to *pin* the messages, so your group members will be *notified* '
-                'when the queue will be created!'
-                '\n\n'
-                'Done? Amazing!) To create a new queue send \n'
-                '/create\_queue <queue name> \n'
-                'command. And don\'t forget to type the future queue\'s *name*.)👍 '
-                '\n\n'
-                'Next step is to become the *participant* in the created queue.✅ '
-                'To do this, just reply to the message, with the corresponding queue, '
-                'with the /add\_me command. (You can also leave the queue by sending /remove\_me command) '
-                '\n\n'
-                'And the last important thing: when the time comes, to move your queue further, '
-                'just reply to the queue with the /next command, and the next member will be notified, '
-                'so no one will skip their turn!💪'
-                '\n\n'
-                'So simple, yes?) Well, good luck, _and let there be only honest queues._😎😎')
-    else:
-        text = "TODO"
-    return {'text': text, 'parse_mode': ParseMode.MARKDOWN}
+    return _catalog.get('help_message_in_chat', lang)
 
 
 def unknown_command(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = ("Unknown command. \n"
-                "To see the help type /help or type '/' to see the hints for commands, "
-                "press tab and complete selected command by adding required arguments.")
-    else:
-        text = "TODO"
-    return {'text': text}
+    return _catalog.get('unknown_command', lang)
 
 
 def unimplemented_command(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = ("This command hasn't been implemented yet.😔😔\n"
-                "Type /about_me to contact the developer.")
-    else:
-        text = "TODO"
-    return {'text': text}
+    return _catalog.get('unimplemented_command', lang)
 
 
 def unexpected_error(lang: str = 'en'):
-    text: str
-    if lang == 'en':
-        text = "Something went wrong...😢😢"
+    return _catalog.get('unexpected_error', lang)
+
+
+def auto_next_usage(lang: str = 'en'):
+    return _catalog.get('auto_next_usage', lang)
+
+
+def auto_next_enabled_message(queue_name: str, minutes: int, lang: str = 'en'):
+    return _catalog.get('auto_next_enabled_message', lang).render(queue_name=queue_name, minutes=minutes)
+
+
+def auto_next_disabled_message(queue_name: str, lang: str = 'en'):
+    return _catalog.get('auto_next_disabled_message', lang).render(queue_name=queue_name)
+
+
+def priority_usage(max_priority: int, lang: str = 'en'):
+    return _catalog.get('priority_usage', lang).render(max_priority=max_priority)
+
+
+def priority_set_message(queue_name: str, priority: int, members_ahead: int, lang: str = 'en'):
+    return _catalog.get('priority_set_message', lang).render(queue_name=queue_name, priority=priority,
+                                                             members_ahead=members_ahead)
+
+
+def priority_set_for_member_message(fullname: str, queue_name: str, priority: int, members_ahead: int,
+                                    lang: str = 'en'):
+    return _catalog.get('priority_set_for_member_message', lang).render(
+        fullname=fullname, queue_name=queue_name, priority=priority, members_ahead=members_ahead)
+
+
+def priority_admins_only(lang: str = 'en'):
+    return _catalog.get('priority_admins_only', lang)
+
+
+def priority_member_not_in_queue(lang: str = 'en'):
+    return _catalog.get('priority_member_not_in_queue', lang)
+
+
+def next_soon_notify(fullname: str, user_id: int, queue_name: str, minutes: int, lang: str = 'en'):
+    return _catalog.get('next_soon_notify', lang).render(fullname=fullname, user_id=user_id,
+                                                         queue_name=queue_name, minutes=minutes)
+
+
+def my_position_message(queue_name: str, members_ahead: int, eta_minutes: Optional[float] = None, lang: str = 'en'):
+    text = _catalog.get('my_position_message', lang).text(queue_name=queue_name, members_ahead=members_ahead)
+    if eta_minutes is not None:
+        text += _catalog.get('my_position_eta', lang).text(duration=_format_minutes(eta_minutes, lang))
     else:
-        text = "TODO"
-    return {'text': text}
+        text += _catalog.get('my_position_no_eta', lang).text()
+    return {'text': text, 'parse_mode': ParseMode.MARKDOWN_V2}
+
+
+def my_position_reached(queue_name: str, lang: str = 'en'):
+    return _catalog.get('my_position_reached', lang).render(queue_name=queue_name)
+
+
+def _format_minutes(minutes: float, lang: str = 'en') -> str:
+    """Formats the estimated time, rounded to the reasonable precision."""
+    if minutes < 1:
+        return _catalog.get('duration_less_than_minute', lang).text()
+    if minutes < 90:
+        return _catalog.get('duration_minutes', lang).text(minutes=round(minutes))
+    return _catalog.get('duration_hours', lang).text(hours=f'{minutes / 60:.1f}')
@@ -2,21 +2,27 @@
 
 import json
 import logging
-from urllib.request import urlopen
 
 import telegram
 from flask import Flask, request
-from telegram.ext import Dispatcher
+from telegram.ext import Dispatcher, ConversationHandler
 
 import app_logging
-from bot.constants import WEBHOOK_URL, BOT_TOKEN
+from bot.constants import WEBHOOK_URL, WEBHOOK_SECRET, WEB_CONCURRENCY, WEB_THREADS
+from bot.deadline import update_deadline
+from bot.graceful_shutdown import graceful_shutdown
+from bot.scheduler import start_scheduler
 from bot.setup_bot import *
+from bot.webhook_filter import UpdatePrefilter, SECRET_TOKEN_HEADER
+from bot.webhook_manager import WebhookManager, get_allowed_updates
 
 
 app = Flask(__name__)
 
 # Declaring a global dispatcher
 dispatcher: Dispatcher
+# Declaring a global filter of the incoming updates
+prefilter: UpdatePrefilter
 
 # Registering logger here
 logger: logging.Logger = app_logging.get_logger(__name__)
@@ -29,9 +35,21 @@ def index():
 
 @app.route('/', methods=['Post'])
 def webhook():
-    json_request = request.get_json()
-    update = telegram.Update.de_json(json_request, dispatcher.bot)
-    dispatcher.process_update(update)
+    if not prefilter.check_secret(request.headers.get(SECRET_TOKEN_HEADER)):
+        logger.warning(f'Webhook request with the invalid secret token from {request.remote_addr}')
+        return json.dumps({'success': False}), 403, {'ContentType': 'application/json'}
+
+    # Telegram redelivers the update later, when it's processed by the restarted worker
+    if graceful_shutdown.draining:
+        return json.dumps({'success': False}), 503, {'ContentType': 'application/json'}
+
+    # The irrelevant updates are dropped before building the Update object
+    json_request = prefilter.parse(request.get_data())
+    if json_request is not None:
+        update = telegram.Update.de_json(json_request, dispatcher.bot)
+        # The requests to Telegram and DB, made by the handlers, get the rest of the budget as their timeout
+        with graceful_shutdown.track(json_request), update_deadline():
+            dispatcher.process_update(update)
     return json.dumps({'success': True}), 200, {'ContentType': 'application/json'}
 
 
@@ -39,12 +57,28 @@ def webhook():
 # Check, if bot correctly connect to Telegram API
 info = bot.get_me()
 logger.info(f'Bot info: {info}')
-logger.info(bot.get_webhook_info())
-
-if bot.get_webhook_info()['url'] != WEBHOOK_URL:
-    urlopen(f'https://api.telegram.org/bot{BOT_TOKEN}/setWebhook?url={WEBHOOK_URL}')
-
-logger.info(bot.get_webhook_info())
 
 dispatcher, _ = setup()
+
+# The updates, interrupted by the previous shutdown, are processed before the new ones
+if graceful_shutdown.open_journal():
+    graceful_shutdown.replay(dispatcher)
+graceful_shutdown.install()
+
+# Telegram sends only the updates, the registered handlers need,
+# and not more concurrent requests, than all workers can handle
+webhook_manager = WebhookManager(bot, WEBHOOK_URL,
+                                 allowed_updates=get_allowed_updates(dispatcher),
+                                 max_connections=WEB_CONCURRENCY * WEB_THREADS,
+                                 secret_token=WEBHOOK_SECRET)
+webhook_manager.ensure_registered()
+start_scheduler(bot).add_job(webhook_manager.refresh_info, 'interval', minutes=5,
+                             id='webhook_info', max_instances=1, coalesce=True, replace_existing=True)
+
+prefilter = UpdatePrefilter(
+    bot.id,
+    secret_token=WEBHOOK_SECRET,
+    conversation_handlers=[handler for handlers in dispatcher.handlers.values() for handler in handlers
+                           if isinstance(handler, ConversationHandler)]
+)
 logger.info('Started server with webhook')
@@ -1,13 +1,18 @@
 # Copyright (C) 2021 Vladyslav Synytsyn
 """This module contains functions to connect to DB and to get info about defined tables and DB's revision slug."""
 import logging
-from typing import List
+import threading
+import weakref
+from typing import Any, Dict, List
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base, DeclarativeMeta
 from sqlalchemy.orm import sessionmaker, Session, scoped_session
+from sqlalchemy.pool import QueuePool
 
 import app_logging
+from app_logging.metrics import metrics
 from sql.config import *
 
 
@@ -20,7 +25,10 @@ Base: DeclarativeMeta = declarative_base()
 
 _engine = None
 _Session = None
-_session = None
+
+# The sessions with the open DB transaction, published as the ``db_sessions`` gauge
+_sessions_in_transaction: 'weakref.WeakSet[Session]' = weakref.WeakSet()
+_sessions_lock = threading.Lock()
 
 
 def create_session() -> Session:
@@ -28,27 +36,75 @@ def create_session() -> Session:
     Initializing connection to DB, if not yet exist.
     Creates and returns the session object.
 
+    Note:
+        The session previously created in the same thread is closed.
+        Sessions of the other threads (e.g. ``bot.scheduler`` jobs) are not affected.
+
     Returns:
         Session: session object to performs operations in DB.
     """
-    global _engine, _Session, _session
+    global _engine, _Session
     if _engine is None:
         _engine = create_engine(sqlalchemy_url)
         Base.metadata.bind = _engine
         Base.metadata.create_all(_engine)
+        metrics.register_gauge('db_pool', lambda: get_pool_stats(_engine))
         logger.info('SQLAlchemy engine created')
     if _Session is None:
-        _Session = scoped_session(sessionmaker(bind=_engine))
+        # The objects are used by the handlers after the session was committed and closed,
+        # so their state (including the version of the queue) must not be expired on commit.
+        _Session = scoped_session(sessionmaker(bind=_engine, expire_on_commit=False))
         logger.info('Scoped session created')
 
-    if _session is None:
-        _session = _Session()
-    else:
-        _session.close()
-        logger.debug(f'The session was closed before creating a new one: {_session}.')
-        _session = _Session()
-    logger.debug(f'A new session was created: {_session}.')
-    return _session
+    # Closing the session of the current thread (if any) before creating a new one
+    _Session.remove()
+    session = _Session()
+    logger.debug(f'A new session was created: {session}.')
+    return session
+
+
+def get_engine() -> Engine:
+    """
+    Initializing connection to DB, if not yet exist.
+
+    Returns:
+        Engine: the engine, shared by all sessions.
+    """
+    if _engine is None:
+        create_session()
+    return _engine
+
+
+def get_pool_stats(engine: Engine) -> Dict[str, Any]:
+    """
+    Returns:
+        the size of the connection pool of the ``engine``, the number of the connections in use
+        and the number of the overflow connections (opened over the size).
+    """
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        return {'size': pool.size(), 'checked_out': pool.checkedout(), 'checked_in': pool.checkedin(),
+                'overflow': pool.overflow()}
+    # Other pools (e.g. for SQLite) don't count the connections
+    return {'status': pool.status()}
+
+
+@event.listens_for(Session, 'after_begin')
+def _on_session_begin(session: Session, transaction, connection) -> None:
+    with _sessions_lock:
+        _sessions_in_transaction.add(session)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _on_session_end(session: Session, transaction) -> None:
+    # Fired on commit, rollback and close (e.g. of the read-only sessions, that are never committed),
+    # the session is out of the transaction, when its outermost transaction ends
+    if transaction.parent is None:
+        with _sessions_lock:
+            _sessions_in_transaction.discard(session)
+
+
+metrics.register_gauge('db_sessions', lambda: {'in_transaction': len(_sessions_in_transaction)})
 
 
 def get_tables() -> List[str]:
@@ -88,6 +144,8 @@ def get_database_revision() -> str:
 
 __all__ = [
     'create_session',
+    'get_engine',
+    'get_pool_stats',
     'get_tables',
     'get_database_revision',
     'Base',
@@ -0,0 +1,32 @@
+"""created queue_event partitioned by month
+
+Revision ID: e5a9f27c41b6
+Revises: d47b0e93c5a8
+Create Date: 2026-10-19 12:41:08.716254
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a9f27c41b6'
+down_revision = 'd47b0e93c5a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Alembic can't generate the partitioned tables, the partitions are created by the sql.event_log module
+    op.execute('CREATE TABLE queue_event ('
+               'created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL, '
+               'queue_id INTEGER NOT NULL, '
+               'chat_id BIGINT NOT NULL, '
+               'user_id BIGINT, '
+               'event_type VARCHAR(16) NOT NULL'
+               ') PARTITION BY RANGE (created_at);')
+    op.execute('CREATE INDEX ix_queue_event_queue_id_created_at ON queue_event (queue_id, created_at);')
+
+
+def downgrade():
+    # Drops all partitions too
+    op.execute('DROP TABLE queue_event;')
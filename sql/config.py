@@ -11,3 +11,6 @@ db_port = getenv('DATABASE_PORT')
 db_name = getenv('DATABASE_NAME')
 
 db_url = getenv('DATABASE_URL')
+
+# The optional read replica, used by the read-only commands (see sql.replica)
+db_replica_url = getenv('DATABASE_REPLICA_URL')
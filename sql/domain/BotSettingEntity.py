@@ -0,0 +1,22 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""This module contains a class representation of the 'bot_setting' table in DB."""
+
+from datetime import datetime
+
+from sqlalchemy import Column, TIMESTAMP, VARCHAR, String
+
+from sql import Base
+
+
+class BotSetting(Base):
+    """The key-value storage for the state of the bot, shared by all workers (e.g. the webhook config hash)."""
+    __tablename__ = 'bot_setting'
+
+    WEBHOOK_CONFIG_HASH = 'webhook_config_hash'
+
+    key = Column(VARCHAR(64), primary_key=True)
+    value = Column(String, nullable=True)
+    updated_at = Column(TIMESTAMP, nullable=False, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self) -> str:
+        return f"BotSetting(key='{self.key}', value='{self.value}', updated_at={self.updated_at})"
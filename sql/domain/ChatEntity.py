@@ -15,6 +15,7 @@ class Chat(Base):
     chat_id = Column(BigInteger, primary_key=True, nullable=False, unique=True)
     name = Column(String, nullable=False)
     notify = Column(BOOLEAN, nullable=False, default=True)
+    language = Column(String(8), nullable=True)
 
     created_at = Column(TIMESTAMP, nullable=False, default=datetime.now())
 
@@ -26,4 +27,4 @@ class Chat(Base):
 
     def __repr__(self):
         return f"Chat(chat_id={self.chat_id}, name='{self.name}', " \
-               f"queue_ids={str(self.queue_ids)}, notify={self.notify})"
+               f"queue_ids={str(self.queue_ids)}, notify={self.notify}, language={self.language})"
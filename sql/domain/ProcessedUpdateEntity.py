@@ -0,0 +1,25 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""This module contains a class representation of the 'processed_update' table in DB."""
+
+from datetime import datetime
+
+from sqlalchemy import Column, TIMESTAMP, BigInteger
+
+from sql import Base
+
+
+class ProcessedUpdate(Base):
+    """
+    The ids of the updates received from Telegram, used to skip the redelivered updates.
+
+    Note:
+        Only the recent updates are kept, the older ones are deleted by the ``bot.scheduler``
+        (see ``bot.update_deduplication``).
+    """
+    __tablename__ = 'processed_update'
+
+    update_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    processed_at = Column(TIMESTAMP, nullable=False, default=datetime.now, index=True)
+
+    def __repr__(self) -> str:
+        return f'ProcessedUpdate(update_id={self.update_id}, processed_at={self.processed_at})'
@@ -3,7 +3,7 @@
 
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, TIMESTAMP, VARCHAR, ForeignKey, String, BigInteger
+from sqlalchemy import Column, Integer, TIMESTAMP, VARCHAR, ForeignKey, String, BigInteger, Float, Index, func
 from sqlalchemy.orm import relationship
 
 from sql import Base
@@ -16,8 +16,25 @@ class Queue(Base):
     name = Column(VARCHAR(255), nullable=False)
     current_order = Column(Integer, nullable=False, default=0)
     message_id_to_edit = Column(Integer)
+    # Incremented on every update of the row, used to detect lost updates (optimistic locking)
+    version = Column(Integer, nullable=False, server_default='1')
+
+    # The queue is moved to the next member automatically after this number of minutes without activity
+    auto_next_minutes = Column(Integer)
+    # Due-time index, polled by the ``bot.scheduler`` (NULL if the timer is disabled or already fired)
+    next_due_at = Column(TIMESTAMP, index=True)
+    reminder_due_at = Column(TIMESTAMP, index=True)
 
     created_at = Column(TIMESTAMP, nullable=False, default=datetime.now())
+    # Updated on every change of the queue or its members, used to find the abandoned queues
+    last_activity_at = Column(TIMESTAMP, nullable=False, default=datetime.now, server_default=func.now(), index=True)
+
+    # Running statistics, updated in O(1) on each '/next' and '/remove_me' and used to estimate the waiting time
+    next_interval_ewma = Column(Float)
+    wait_time_ewma = Column(Float)
+    last_next_at = Column(TIMESTAMP)
+    served_count = Column(Integer, nullable=False, default=0, server_default='0')
+    left_count = Column(Integer, nullable=False, default=0, server_default='0')
 
     chat_id = Column(BigInteger, ForeignKey('chat.chat_id', onupdate='CASCADE', ondelete='CASCADE'))
     chat = relationship(
@@ -28,23 +45,38 @@ class Queue(Base):
     members: list = relationship('QueueMember',
                                  cascade="all, delete, delete-orphan")
 
+    __mapper_args__ = {
+        'version_id_col': version
+    }
+
     def __repr__(self):
         return f"Queue(id={self.queue_id}, name='{self.name}', current_order={self.current_order}, " \
-               f"created_at={self.created_at}, message_id={self.message_id_to_edit})"
+               f"created_at={self.created_at}, message_id={self.message_id_to_edit}, version={self.version})"
 
 
 class QueueMember(Base):
     __tablename__ = 'queue_member'
 
     user_id = Column(BigInteger, nullable=False, primary_key=True)
+    # The position in the queue, the members are kept ordered by (priority DESC, time of joining)
     user_order = Column(Integer, nullable=False)
     fullname = Column(String, nullable=False)
+    joined_at = Column(TIMESTAMP, default=datetime.now)
+    # The members with the higher priority go before the members, who are waiting with the lower one
+    priority = Column(Integer, nullable=False, default=0, server_default='0')
 
     queue_id = Column(Integer, ForeignKey('queue.queue_id', ondelete='CASCADE'), primary_key=True)
 
+    __table_args__ = (
+        # The member at the position (e.g. the next one) is found without scanning the queue
+        Index('ix_queue_member_queue_id_user_order', 'queue_id', 'user_order'),
+        # The end of the priority lane, where the new member of this priority is placed
+        Index('ix_queue_member_queue_id_priority_user_order', 'queue_id', 'priority', 'user_order'),
+    )
+
     def __repr__(self) -> str:
         return f'QueueMember(queue_id={self.queue_id}, ' \
-               f'user_id={self.user_id}, user_order={self.user_order}, fullname={self.fullname})'
+               f'user_id={self.user_id}, user_order={self.user_order}, priority={self.priority}, fullname={self.fullname})'
 
     def __eq__(self, other):
         if type(other) is QueueMember:
@@ -0,0 +1,47 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""This module contains a class representation of the 'queue_event' table in DB."""
+
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, TIMESTAMP, BigInteger, VARCHAR, Index
+
+from sql import Base
+
+
+class QueueEvent(Base):
+    """
+    Append-only log of the changes in the queues.
+
+    Note:
+        The table is partitioned by month on ``created_at`` in PostgreSQL, so the old events are removed
+        by detaching and dropping the whole partition (see ``sql.event_log``). There is no foreign key
+        to the 'queue' table, the history is kept after the queue is deleted.
+    """
+    __tablename__ = 'queue_event'
+    __table_args__ = (
+        Index('ix_queue_event_queue_id_created_at', 'queue_id', 'created_at'),
+        {'postgresql_partition_by': 'RANGE (created_at)'}
+    )
+
+    CREATED = 'created'
+    DELETED = 'deleted'
+    JOINED = 'joined'
+    LEFT = 'left'
+    SKIPPED = 'skipped'
+    NEXT = 'next'
+
+    created_at = Column(TIMESTAMP, nullable=False, default=datetime.now)
+    queue_id = Column(Integer, nullable=False)
+    chat_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger)
+    event_type = Column(VARCHAR(16), nullable=False)
+
+    # The log doesn't need the primary key in DB (it would have to include the partition key anyway),
+    # but the mapper needs one to identify the loaded rows
+    __mapper_args__ = {
+        'primary_key': [created_at, queue_id, user_id, event_type]
+    }
+
+    def __repr__(self) -> str:
+        return f'QueueEvent(queue_id={self.queue_id}, chat_id={self.chat_id}, ' \
+               f'user_id={self.user_id}, event_type={self.event_type}, created_at={self.created_at})'
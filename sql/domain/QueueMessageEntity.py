@@ -0,0 +1,28 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""This module contains a class representation of the 'queue_message' table in DB."""
+
+from datetime import datetime
+
+from sqlalchemy import Column, TIMESTAMP, BigInteger, Integer, ForeignKey
+
+from sql import Base
+
+
+class QueueMessage(Base):
+    """
+    The messages, the bot sent for the queues (the lists of the members and the notifications),
+    used to find the queue by the message, the command replied to.
+
+    Note:
+        Only the recent messages are kept, the older ones are deleted by the ``bot.scheduler``
+        (see ``bot.queue_messages``).
+    """
+    __tablename__ = 'queue_message'
+
+    chat_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    message_id = Column(Integer, primary_key=True, autoincrement=False)
+    queue_id = Column(Integer, ForeignKey('queue.queue_id', ondelete='CASCADE'), nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False, default=datetime.now, index=True)
+
+    def __repr__(self) -> str:
+        return f'QueueMessage(chat_id={self.chat_id}, message_id={self.message_id}, queue_id={self.queue_id})'
@@ -1,3 +1,7 @@
 # Copyright (C) 2021 Vladyslav Synytsyn
 from sql.domain.ChatEntity import Chat
 from sql.domain.QueueEntity import Queue, QueueMember
+from sql.domain.QueueEventEntity import QueueEvent
+from sql.domain.ProcessedUpdateEntity import ProcessedUpdate
+from sql.domain.BotSettingEntity import BotSetting
+from sql.domain.QueueMessageEntity import QueueMessage
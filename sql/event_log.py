@@ -0,0 +1,210 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains the :class:`EventLog` class, that appends the queue events to DB in batches,
+and the functions to manage the monthly partitions of the 'queue_event' table.
+
+Examples:
+    >>> from sql.event_log import event_log
+    >>> from sql.domain import QueueEvent
+    >>>
+    >>> event_log.record(queue_id=1, chat_id=-100, user_id=42, event_type=QueueEvent.JOINED)
+"""
+import atexit
+import logging
+import threading
+from collections import deque
+from datetime import datetime, date
+from typing import Deque, Dict, Any, List, Optional
+
+from sqlalchemy import text
+
+import app_logging
+from app_logging.metrics import metrics
+from sql import get_engine
+from sql.domain import QueueEvent
+
+
+logger: logging.Logger = app_logging.get_logger(__name__)
+
+PARTITIONS_AHEAD = 2
+"""The number of the next months, the partitions are created for in advance."""
+RETENTION_MONTHS = 12
+"""The partitions older than this number of months are detached and dropped."""
+
+
+class EventLog:
+    """
+    Buffers the queue events in memory and writes them to DB with one multi-row INSERT.
+
+    The handlers only append the event to the buffer, the writing is done by the background thread
+    every ``flush_interval`` seconds, or as soon as ``batch_size`` events are buffered.
+
+    Note:
+        The events are lost if the process is killed before they are flushed,
+        they are flushed on the normal exit. If DB is unavailable, the oldest events
+        are dropped after the buffer reaches ``max_buffer_size``.
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 1.0, max_buffer_size: int = 10000) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._buffer: Deque[Dict[str, Any]] = deque(maxlen=max_buffer_size)
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+        metrics.register_gauge('event_log_buffered', lambda: len(self._buffer))
+
+    def record(self, queue_id: int, chat_id: int, user_id: Optional[int], event_type: str) -> None:
+        """
+        Appends the event to the buffer.
+
+        Args:
+            queue_id: the id of the queue.
+            chat_id: the id of the chat with the queue.
+            user_id: the id of the user, the event is related to.
+            event_type: one of the ``QueueEvent`` event types (e.g. ``QueueEvent.JOINED``).
+        """
+        with self._condition:
+            if self._thread is None:
+                self._start()
+            self._buffer.append({'queue_id': queue_id, 'chat_id': chat_id, 'user_id': user_id,
+                                 'event_type': event_type, 'created_at': datetime.now()})
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+
+    def flush(self) -> int:
+        """
+        Writes all buffered events to DB.
+
+        Returns:
+            the number of the written events.
+        """
+        with self._condition:
+            events: List[Dict[str, Any]] = list(self._buffer)
+            self._buffer.clear()
+        if not events:
+            return 0
+
+        try:
+            with get_engine().begin() as connection:
+                connection.execute(QueueEvent.__table__.insert(), events)
+            metrics.increment('event_log_written', value=len(events))
+        except Exception as e:
+            metrics.increment('event_log_dropped', value=len(events))
+            logger.exception(f'ERROR when writing {len(events)} queue events: {e}')
+            return 0
+        return len(events)
+
+    def _start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='event-log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if len(self._buffer) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+            self.flush()
+
+
+def _month_start(year: int, month: int) -> date:
+    # Normalizing the month out of the 1..12 range
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return date(year, month, 1)
+
+
+def _partition_name(month: date) -> str:
+    return f'{QueueEvent.__tablename__}_p{month:%Y%m}'
+
+
+def _get_partitions(connection) -> List[str]:
+    """Returns the names of the existing partitions of the 'queue_event' table."""
+    rows = connection.execute(text('SELECT child.relname FROM pg_inherits '
+                                   'JOIN pg_class parent ON pg_inherits.inhparent = parent.oid '
+                                   'JOIN pg_class child ON pg_inherits.inhrelid = child.oid '
+                                   'WHERE parent.relname = :table'), table=QueueEvent.__tablename__)
+    return [row[0] for row in rows]
+
+
+def ensure_partitions(today: Optional[date] = None) -> List[str]:
+    """
+    Creates the partitions of the 'queue_event' table for the current and ``PARTITIONS_AHEAD`` next months.
+
+    Note:
+        Does nothing, if DB is not PostgreSQL (the table is not partitioned there).
+
+    Returns:
+        the names of the created partitions.
+    """
+    engine = get_engine()
+    if engine.dialect.name != 'postgresql':
+        return []
+
+    today = today or date.today()
+    created = []
+    with engine.begin() as connection:
+        existing = set(_get_partitions(connection))
+        for i in range(PARTITIONS_AHEAD + 1):
+            month = _month_start(today.year, today.month + i)
+            name = _partition_name(month)
+            if name in existing:
+                continue
+            next_month = _month_start(month.year, month.month + 1)
+            connection.execute(text(f"CREATE TABLE {name} PARTITION OF {QueueEvent.__tablename__} "
+                                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"))
+            created.append(name)
+    if created:
+        logger.info(f'Created queue_event partitions: {created}')
+    return created
+
+
+def drop_old_partitions(today: Optional[date] = None) -> List[str]:
+    """
+    Detaches and drops the partitions of the 'queue_event' table older than ``RETENTION_MONTHS``.
+
+    Dropping the whole partition doesn't touch the rows one by one, so it's cheap
+    and doesn't bloat the table, unlike ``DELETE``.
+
+    Returns:
+        the names of the dropped partitions.
+    """
+    engine = get_engine()
+    if engine.dialect.name != 'postgresql':
+        return []
+
+    today = today or date.today()
+    oldest_kept = _partition_name(_month_start(today.year, today.month - RETENTION_MONTHS))
+    dropped = []
+    with engine.begin() as connection:
+        partitions = _get_partitions(connection)
+        # The names contain the month in the sortable 'YYYYMM' format
+        for name in sorted(partition for partition in partitions if partition < oldest_kept):
+            connection.execute(text(f'ALTER TABLE {QueueEvent.__tablename__} DETACH PARTITION {name}'))
+            connection.execute(text(f'DROP TABLE {name}'))
+            dropped.append(name)
+    if dropped:
+        logger.info(f'Dropped queue_event partitions: {dropped}')
+    return dropped
+
+
+def maintain_partitions() -> None:
+    """Creates the partitions for the next months and drops the old ones. Called by the ``bot.scheduler`` daily."""
+    try:
+        ensure_partitions()
+        drop_old_partitions()
+    except Exception as e:
+        logger.exception(f'ERROR when maintaining the queue_event partitions: {e}')
+
+
+event_log = EventLog()
+"""The event log shared by the whole app."""
+
+__all__ = [
+    'EventLog',
+    'event_log',
+    'ensure_partitions',
+    'drop_old_partitions',
+    'maintain_partitions'
+]
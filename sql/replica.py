@@ -0,0 +1,130 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module routes the read-only queries to the optional read replica of DB.
+
+The replica is used, if ``DATABASE_REPLICA_URL`` environment variable is set, otherwise all sessions
+go to the primary DB. To keep the read-your-writes consistency, the reads of the chat
+go to the primary DB for ``READ_YOUR_WRITES_SECONDS`` after the last write made for this chat.
+
+The writes are registered automatically on each commit of the primary session
+for the chat, set by ``set_current_chat`` in the current thread (the bot sets it for each update).
+
+Note:
+    The recent writes are tracked in the memory of the worker, so the read in another worker,
+    right after the write, could still see the replica lag.
+
+Examples:
+    Testing locally with two databases (the replica doesn't receive the writes here,
+    so the routing is seen by the outdated results)::
+
+        DATABASE_URL=sqlite:///primary.db DATABASE_REPLICA_URL=sqlite:///replica.db python -m bot.setup_bot
+
+    The number of the reads, sent to the replica and to the primary DB, is counted in the ``db_reads`` metric.
+
+    >>> session = create_read_session(chat_id)
+    >>> queues = session.query(Queue).filter(Queue.chat_id == chat_id).all()
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
+
+from app_logging import get_logger
+from app_logging.metrics import metrics
+from sql import create_session, get_pool_stats
+from sql.config import db_replica_url
+
+
+logger = get_logger(__name__)
+
+READ_YOUR_WRITES_SECONDS = 5
+"""How long (in seconds) after the write the reads of the chat go to the primary DB."""
+MAX_TRACKED_CHATS = 10000
+"""The maximum number of the chats with the recent writes, tracked in memory."""
+
+_replica_engine: Optional[Engine] = None
+_ReadSession = None
+
+_current = threading.local()
+_lock = threading.Lock()
+# chat_id -> the monotonic time, until which the reads go to the primary DB
+_recent_writes: Dict[int, float] = {}
+
+
+def set_current_chat(chat_id: Optional[int]) -> None:
+    """Sets the chat, the commits of the primary sessions in the current thread are registered for."""
+    _current.chat_id = chat_id
+
+
+def register_write(chat_id: int) -> None:
+    """Sends the reads of the chat to the primary DB for the next ``READ_YOUR_WRITES_SECONDS``."""
+    now = time.monotonic()
+    with _lock:
+        if len(_recent_writes) >= MAX_TRACKED_CHATS:
+            for expired in [key for key, until in _recent_writes.items() if until <= now]:
+                del _recent_writes[expired]
+            if len(_recent_writes) >= MAX_TRACKED_CHATS:
+                # Forgetting the oldest write, the dict keeps the insertion order
+                del _recent_writes[next(iter(_recent_writes))]
+        _recent_writes.pop(chat_id, None)
+        _recent_writes[chat_id] = now + READ_YOUR_WRITES_SECONDS
+
+
+def has_recent_write(chat_id: int) -> bool:
+    """Returns ``True`` if the write for the chat was made less than ``READ_YOUR_WRITES_SECONDS`` ago."""
+    until = _recent_writes.get(chat_id)
+    return until is not None and until > time.monotonic()
+
+
+def create_read_session(chat_id: Optional[int] = None) -> Session:
+    """
+    Creates the session for the read-only queries.
+
+    Note:
+        The objects, loaded by this session, must not be changed and committed.
+        The session previously created by this function in the same thread is closed.
+
+    Args:
+        chat_id: the chat, the data is read for, to check the recent writes.
+            If ``None``, the chat set by ``set_current_chat`` is used.
+    Returns:
+        the session of the replica, or the session of the primary DB, if the replica is not configured
+        or the chat has the recent writes.
+    """
+    if db_replica_url is None:
+        return create_session()
+    if chat_id is None:
+        chat_id = getattr(_current, 'chat_id', None)
+    if chat_id is not None and has_recent_write(chat_id):
+        metrics.increment('db_reads', 'primary')
+        return create_session()
+
+    global _replica_engine, _ReadSession
+    if _ReadSession is None:
+        _replica_engine = create_engine(db_replica_url)
+        metrics.register_gauge('db_replica_pool', lambda: get_pool_stats(_replica_engine))
+        _ReadSession = scoped_session(sessionmaker(bind=_replica_engine, expire_on_commit=False, autoflush=False))
+        logger.info('SQLAlchemy replica engine created')
+
+    metrics.increment('db_reads', 'replica')
+    _ReadSession.remove()
+    return _ReadSession()
+
+
+@event.listens_for(Session, 'after_commit')
+def _register_commit(session: Session) -> None:
+    chat_id = getattr(_current, 'chat_id', None)
+    if chat_id is not None and (_replica_engine is None or session.bind is not _replica_engine):
+        register_write(chat_id)
+
+
+__all__ = [
+    'create_read_session',
+    'set_current_chat',
+    'register_write',
+    'has_recent_write',
+    'READ_YOUR_WRITES_SECONDS'
+]
@@ -0,0 +1,438 @@
+# Copyright (C) 2021 Vladyslav Synytsyn
+"""
+This module contains :class:`QueueRepository` and :class:`ChatRepository` classes,
+that keep all operations with the queues, their members and the chats in one place.
+
+The queries are built once, when the module is imported, and their compiled form is cached:
+the ORM queries are the baked queries (``sqlalchemy.ext.baked``), and the Core statements
+are executed with the shared ``compiled_cache``. So the handlers don't pay for the query construction
+and the SQL compilation on every call.
+
+The members are kept in the order of their turns: by the priority (descending) and then by the time of joining.
+The order is maintained on the writes (the member is placed at the end of its priority lane), so the next member
+is always found by the index at ``current_order + 1``, without sorting the queue.
+
+Each change of the order of the members (and of the current position) starts with ``lock``,
+that increments the version of the queue in the transaction. So the concurrent changes of the same queue
+are serialized (on PostgreSQL the second one waits for the row lock) and the stale one fails
+with :class:`StaleDataError` instead of writing the positions, read before the other change.
+
+The ORM objects are loaded only for the rows, that are changed. The read-only paths
+(showing the queue, the position of the member, the member whose turn has come) select only
+the needed columns into the compact :class:`MemberRecord` tuples or plain values.
+
+Examples:
+    >>> from sql.repository import QueueRepository
+    >>>
+    >>> queues = QueueRepository(create_session())
+    >>> queue = queues.find_by_name(chat_id, 'Lab 1')
+    >>> member = queues.enqueue(queue, user_id, 'John Smith')
+    >>> queues.session.commit()
+"""
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, event, func, select
+from sqlalchemy.engine import ResultProxy
+from sqlalchemy.ext import baked
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.base import Executable
+
+from sql.domain import Chat, Queue, QueueMember, QueueMessage
+
+
+class MemberRecord(NamedTuple):
+    """The read-only projection of the :class:`QueueMember`, without the ORM state."""
+    user_id: int
+    fullname: str
+    user_order: int
+    joined_at: Optional[datetime]
+
+
+class QueueSummary(NamedTuple):
+    """The state of the queue, shown in the list of the queues of the chat."""
+    queue_id: int
+    name: str
+    members_count: int
+    current_order: int
+    last_activity_at: datetime
+
+
+_bakery = baked.bakery()
+# The compiled Core statements, the statement objects are the keys, so the cache doesn't grow
+_compiled_cache: Dict[Any, Any] = {}
+
+_queue_table = Queue.__table__
+_member_table = QueueMember.__table__
+_message_table = QueueMessage.__table__
+
+_queue_by_id = _bakery(lambda session: session.query(Queue))
+
+_queue_by_name = _bakery(lambda session: session.query(Queue))
+_queue_by_name += lambda query: query.filter(Queue.chat_id == bindparam('chat_id'),
+                                             Queue.name == bindparam('name'))
+
+_queue_by_message = _bakery(lambda session: session.query(Queue))
+_queue_by_message += lambda query: query.filter(Queue.chat_id == bindparam('chat_id'),
+                                                Queue.message_id_to_edit == bindparam('message_id'))
+
+_queues_by_chat = _bakery(lambda session: session.query(Queue))
+_queues_by_chat += lambda query: query.filter(Queue.chat_id == bindparam('chat_id'))
+
+_member_by_user = _bakery(lambda session: session.query(QueueMember))
+_member_by_user += lambda query: query.filter(QueueMember.queue_id == bindparam('queue_id'),
+                                              QueueMember.user_id == bindparam('user_id'))
+
+_member_by_order = _bakery(lambda session: session.query(QueueMember))
+_member_by_order += lambda query: query.filter(QueueMember.queue_id == bindparam('queue_id'),
+                                               QueueMember.user_order == bindparam('user_order'))
+
+_members_by_queue = _bakery(lambda session: session.query(QueueMember))
+_members_by_queue += lambda query: query.filter(QueueMember.queue_id == bindparam('queue_id'))
+_members_by_queue += lambda query: query.order_by(QueueMember.user_order)
+
+_chat_by_id = _bakery(lambda session: session.query(Chat))
+
+_queue_id_by_message = select([_message_table.c.queue_id]).where(
+    and_(_message_table.c.chat_id == bindparam('chat_id'), _message_table.c.message_id == bindparam('message_id')))
+
+# The total number of the queues is counted by the window function over the grouped rows,
+# so the page and the number of the pages are read in one query
+_queue_summaries = (select([_queue_table.c.queue_id, _queue_table.c.name,
+                            func.count(_member_table.c.user_id), _queue_table.c.current_order,
+                            _queue_table.c.last_activity_at,
+                            func.count().over()])
+                    .select_from(_queue_table.outerjoin(_member_table,
+                                                        _member_table.c.queue_id == _queue_table.c.queue_id))
+                    .where(_queue_table.c.chat_id == bindparam('chat_id'))
+                    .group_by(_queue_table.c.queue_id)
+                    .order_by(_queue_table.c.queue_id)
+                    .limit(bindparam('limit'))
+                    .offset(bindparam('offset')))
+
+_member_columns = [_member_table.c.user_id, _member_table.c.fullname,
+                   _member_table.c.user_order, _member_table.c.joined_at]
+_member_record_by_user = select(_member_columns).where(and_(_member_table.c.queue_id == bindparam('queue_id'),
+                                                            _member_table.c.user_id == bindparam('user_id')))
+_member_record_by_order = select(_member_columns).where(and_(_member_table.c.queue_id == bindparam('queue_id'),
+                                                             _member_table.c.user_order == bindparam('user_order')))
+_member_names = (select([_member_table.c.fullname])
+                 .where(_member_table.c.queue_id == bindparam('queue_id'))
+                 .order_by(_member_table.c.user_order))
+
+_queue_exists = select([func.count()]).where(and_(_queue_table.c.chat_id == bindparam('chat_id'),
+                                                   _queue_table.c.name == bindparam('name')))
+
+_members_of_users = select([_member_table.c.user_id]).where(
+    and_(_member_table.c.queue_id == bindparam('queue_id'),
+         _member_table.c.user_id.in_(bindparam('user_ids', expanding=True))))
+
+_last_member_order = (select([func.max(_member_table.c.user_order)])
+                      .where(_member_table.c.queue_id == bindparam('queue_id')))
+
+# The last position in the lane of the given priority (and the lanes of the higher priorities),
+# the member, whose priority is changed, is excluded
+_lane_last_order = (select([func.max(_member_table.c.user_order)])
+                    .where(and_(_member_table.c.queue_id == bindparam('queue_id'),
+                                _member_table.c.priority >= bindparam('priority'),
+                                _member_table.c.user_id != bindparam('user_id'))))
+
+# The members after the removed one are moved up by one position.
+# The names of the parameters must differ from the columns in the SET clause.
+_shift_members_up = (_member_table.update()
+                     .where(and_(_member_table.c.queue_id == bindparam('b_queue_id'),
+                                 _member_table.c.user_order > bindparam('b_removed_order')))
+                     .values(user_order=_member_table.c.user_order - 1))
+
+# The members from the position of the inserted one are moved down by one position
+_shift_members_down = (_member_table.update()
+                       .where(and_(_member_table.c.queue_id == bindparam('b_queue_id'),
+                                   _member_table.c.user_order >= bindparam('b_inserted_order'),
+                                   _member_table.c.user_id != bindparam('b_user_id')))
+                       .values(user_order=_member_table.c.user_order + 1))
+
+
+# The key in ``Session.info``: the queues, locked in the current transaction, by their ids
+_LOCKED_QUEUES = 'locked_queues'
+
+
+# noinspection PyUnusedLocal
+@event.listens_for(Session, 'after_transaction_end')
+def _forget_locked_queues(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop(_LOCKED_QUEUES, None)
+
+
+def _execute(session: Session, statement: Executable, params: Dict[str, Any]) -> ResultProxy:
+    """Executes the prebuilt Core statement in the transaction of the session, reusing its compiled form."""
+    connection = session.connection().execution_options(compiled_cache=_compiled_cache)
+    return connection.execute(statement, params)
+
+
+class QueueRepository:
+    """
+    The operations with the queues and their members.
+
+    Note:
+        The repository only changes the objects in the session, the caller commits the session.
+    """
+
+    def __init__(self, session: Session) -> None:
+        """
+        Args:
+            session: the session to run the queries in.
+        """
+        self.session = session
+
+    def get(self, queue_id: int) -> Optional[Queue]:
+        """Returns the queue by its id, ``None`` if it doesn't exist."""
+        return _queue_by_id(self.session).get(queue_id)
+
+    def find_by_name(self, chat_id: int, name: str) -> Optional[Queue]:
+        """Returns the queue of the chat with the given name, ``None`` if it doesn't exist."""
+        return _queue_by_name(self.session).params(chat_id=chat_id, name=name).first()
+
+    def find_by_message(self, chat_id: int, message_id: int) -> Optional[Queue]:
+        """Returns the queue, which members are shown in the message, ``None`` if there is no such queue."""
+        return _queue_by_message(self.session).params(chat_id=chat_id, message_id=message_id).first()
+
+    def find_id_by_message(self, chat_id: int, message_id: int) -> Optional[int]:
+        """
+        Returns the id of the queue, the message was sent for (see :class:`QueueMessage`),
+        ``None`` if the message isn't known.
+        """
+        return _execute(self.session, _queue_id_by_message, {'chat_id': chat_id, 'message_id': message_id}).scalar()
+
+    def add_message(self, chat_id: int, message_id: int, queue_id: int) -> None:
+        """Remembers, that the message was sent for the queue."""
+        self.session.add(QueueMessage(chat_id=chat_id, message_id=message_id, queue_id=queue_id))
+
+    def exists(self, chat_id: int, name: str) -> bool:
+        """Returns ``True`` if the chat already has the queue with the given name."""
+        return _execute(self.session, _queue_exists, {'chat_id': chat_id, 'name': name}).scalar() > 0
+
+    def list_by_chat(self, chat_id: int) -> List[Queue]:
+        """Returns all queues of the chat."""
+        return _queues_by_chat(self.session).params(chat_id=chat_id).all()
+
+    def list_summaries(self, chat_id: int, offset: int, limit: int) -> Tuple[List[QueueSummary], int]:
+        """
+        Returns the page of the queues of the chat with the number of their members,
+        in the order of their creation.
+
+        Returns:
+            the summaries of the queues on the page and the total number of the queues in the chat
+            (``0``, if the page is after the last one).
+        """
+        rows = _execute(self.session, _queue_summaries, {'chat_id': chat_id, 'offset': offset, 'limit': limit}).fetchall()
+        total = rows[0][-1] if rows else 0
+        return [QueueSummary._make(row[:-1]) for row in rows], total
+
+    def find_member(self, queue_id: int, user_id: int) -> Optional[QueueMember]:
+        """Returns the member of the queue, ``None`` if the user isn't in the queue."""
+        return _member_by_user(self.session).params(queue_id=queue_id, user_id=user_id).first()
+
+    def member_at(self, queue_id: int, user_order: int) -> Optional[QueueMember]:
+        """Returns the member at the given position of the queue, ``None`` if there is no such position."""
+        return _member_by_order(self.session).params(queue_id=queue_id, user_order=user_order).first()
+
+    def list_members(self, queue_id: int) -> List[QueueMember]:
+        """Returns the members of the queue in the order of their turns."""
+        return _members_by_queue(self.session).params(queue_id=queue_id).all()
+
+    def find_member_record(self, queue_id: int, user_id: int) -> Optional[MemberRecord]:
+        """The read-only version of :meth:`find_member`."""
+        row = _execute(self.session, _member_record_by_user, {'queue_id': queue_id, 'user_id': user_id}).first()
+        return MemberRecord._make(row) if row is not None else None
+
+    def member_record_at(self, queue_id: int, user_order: int) -> Optional[MemberRecord]:
+        """The read-only version of :meth:`member_at`."""
+        row = _execute(self.session, _member_record_by_order, {'queue_id': queue_id, 'user_order': user_order}).first()
+        return MemberRecord._make(row) if row is not None else None
+
+    def list_member_names(self, queue_id: int) -> List[str]:
+        """Returns the full names of the members of the queue in the order of their turns."""
+        return [fullname for fullname, in _execute(self.session, _member_names, {'queue_id': queue_id})]
+
+    def lock(self, queue: Queue) -> Queue:
+        """
+        Increments the version of the queue in the transaction of the session, before its members are reordered.
+        Called by each method, that changes the order, only the first call in the transaction writes to DB.
+
+        Note:
+            The members must be read after the lock, so they are not changed concurrently until the commit.
+
+        Returns:
+            the queue, attached to the session.
+        Raises:
+            StaleDataError: if the queue was changed after it was read.
+        """
+        locked: Dict[int, Queue] = self.session.info.setdefault(_LOCKED_QUEUES, {})
+        attached = locked.get(queue.queue_id)
+        if attached is None:
+            attached = self.session.merge(queue)
+            # The versioned UPDATE is flushed right away, so the row stays locked until the end of the transaction
+            attached.last_activity_at = datetime.now()
+            self.session.flush()
+            locked[queue.queue_id] = attached
+        return attached
+
+    def enqueue(self, queue: Queue, user_id: int, fullname: str, priority: int = 0) -> Optional[QueueMember]:
+        """
+        Adds the user to the end of the queue, or to the end of the priority lane,
+        before the waiting members with the lower priority.
+
+        Returns:
+            the new member, or ``None``, if the user is already in the queue.
+        """
+        queue = self.lock(queue)
+        if self.find_member(queue.queue_id, user_id) is not None:
+            return None
+        if priority == 0:
+            # All members have the priority not lower than the default one, so it's the end of the queue
+            user_order = (_execute(self.session, _last_member_order, {'queue_id': queue.queue_id}).scalar() or 0) + 1
+        else:
+            user_order = self._insert_position(queue, user_id, priority)
+        member = QueueMember(user_id=user_id, fullname=fullname, user_order=user_order, priority=priority,
+                             queue_id=queue.queue_id)
+        self.session.add(member)
+        return member
+
+    def enqueue_many(self, queue: Queue, users: List[Tuple[int, str]]) -> List[Optional[QueueMember]]:
+        """
+        Adds the users to the end of the queue in the given order with one multi-row INSERT.
+
+        Args:
+            queue: the queue to add the users to.
+            users: the ids and the full names of the users.
+        Returns:
+            the new members in the order of ``users``, ``None`` for the users, that are already in the queue
+            (or are repeated in ``users``).
+        """
+        if not users:
+            return []
+        queue = self.lock(queue)
+        present = {user_id for user_id, in _execute(self.session, _members_of_users,
+                                                    {'queue_id': queue.queue_id,
+                                                     'user_ids': [user_id for user_id, _ in users]})}
+        user_order = _execute(self.session, _last_member_order, {'queue_id': queue.queue_id}).scalar() or 0
+        joined_at = datetime.now()
+        members: List[Optional[QueueMember]] = []
+        for user_id, fullname in users:
+            if user_id in present:
+                members.append(None)
+                continue
+            present.add(user_id)
+            user_order += 1
+            members.append(QueueMember(user_id=user_id, fullname=fullname, user_order=user_order, priority=0,
+                                       joined_at=joined_at, queue_id=queue.queue_id))
+
+        rows = [{'user_id': member.user_id, 'fullname': member.fullname, 'user_order': member.user_order,
+                 'priority': 0, 'joined_at': joined_at, 'queue_id': queue.queue_id}
+                for member in members if member is not None]
+        if rows:
+            # The number of the rows varies, so the statement is not cached
+            self.session.connection().execute(_member_table.insert().values(rows))
+        return members
+
+    def set_priority(self, queue: Queue, member: QueueMember, priority: int) -> QueueMember:
+        """
+        Changes the priority of the waiting member and moves him to the end of the new priority lane.
+
+        Returns:
+            the member with the new position.
+        """
+        queue = self.lock(queue)
+        _execute(self.session, _shift_members_up,
+                 {'b_queue_id': queue.queue_id, 'b_removed_order': member.user_order})
+        member.user_order = self._insert_position(queue, member.user_id, priority)
+        member.priority = priority
+        self.session.add(member)
+        return member
+
+    def _insert_position(self, queue: Queue, user_id: int, priority: int) -> int:
+        """
+        Frees the position after the last waiting member with the same or higher priority
+        and returns it. The row of the ``user_id`` is not moved.
+        """
+        lane_last_order = _execute(self.session, _lane_last_order,
+                                   {'queue_id': queue.queue_id, 'priority': priority, 'user_id': user_id}).scalar()
+        # The members, whose turn has already come, stay before the current position regardless of their priority
+        user_order = max(lane_last_order or 0, queue.current_order) + 1
+        _execute(self.session, _shift_members_down,
+                 {'b_queue_id': queue.queue_id, 'b_inserted_order': user_order, 'b_user_id': user_id})
+        return user_order
+
+    def dequeue(self, queue: Queue, member: QueueMember) -> Queue:
+        """
+        Removes the member from the queue and moves up the members after him.
+
+        If the member was before the current position (or at it), the current position is moved up as well,
+        so '/next' still moves to the first member, whose turn hasn't come yet.
+
+        Returns:
+            the queue, attached to the session.
+        """
+        queue = self.lock(queue)
+        if member.user_order <= queue.current_order:
+            queue.current_order = queue.current_order - 1
+        self.session.delete(member)
+        _execute(self.session, _shift_members_up, {'b_queue_id': queue.queue_id, 'b_removed_order': member.user_order})
+        return queue
+
+    def swap_with_next(self, queue: Queue, member: QueueMember) -> Optional[QueueMember]:
+        """
+        Swaps the member with the next one in the queue.
+
+        If the next member has the lower priority, the given member moves to his priority lane,
+        so the members are still ordered by their priorities.
+
+        Returns:
+            the next member (now before the given one), or ``None``, if the member is the last one.
+        """
+        queue = self.lock(queue)
+        next_member = self.member_at(queue.queue_id, member.user_order + 1)
+        if next_member is not None:
+            member.user_order = member.user_order + 1
+            next_member.user_order = next_member.user_order - 1
+            member.priority = min(member.priority, next_member.priority)
+            self.session.add_all([member, next_member])
+        return next_member
+
+    def advance(self, queue: Queue) -> Tuple[Queue, Optional[MemberRecord]]:
+        """
+        Moves the queue to the next member.
+
+        Returns:
+            the queue, attached to the session, and the member, whose turn has come,
+            or the unchanged queue and ``None``, if the end of the queue was reached.
+        """
+        queue = self.lock(queue)
+        member = self.member_record_at(queue.queue_id, queue.current_order + 1)
+        if member is None:
+            return queue, None
+        queue.current_order = member.user_order
+        return queue, member
+
+
+class ChatRepository:
+    """The operations with the chats."""
+
+    def __init__(self, session: Session) -> None:
+        """
+        Args:
+            session: the session to run the queries in.
+        """
+        self.session = session
+
+    def get(self, chat_id: int) -> Optional[Chat]:
+        """Returns the chat by its id, ``None`` if it isn't stored in DB."""
+        return _chat_by_id(self.session).get(chat_id)
+
+
+__all__ = [
+    'QueueRepository',
+    'ChatRepository',
+    'MemberRecord',
+    'QueueSummary'
+]